@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest offline: reproduce velas OHLCV guardadas con las estrategias de
+STRATEGY_MAP y los filtros SL/TP/TS del worker.
+
+Ejemplo:
+    python -m backtest --csv btc_1m.csv --strategies ema_cross --filters sl,tp,ts
+    python -m backtest.optimizer --csv btc_1m.csv --strategies ema_cross --filters sl,ts --method random
+"""
+from .data import load_ohlcv_csv, synthetic_ohlcv, ohlcv_frame
+from .engine import run_backtest, prepare_frame, BacktestResult
+
+__all__ = ['run_backtest', 'prepare_frame', 'BacktestResult', 'load_ohlcv_csv', 'synthetic_ohlcv', 'ohlcv_frame']
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+CLI del backtest (sin GUI ni exchange).
+
+Ejemplo:
+    python -m backtest --csv btc_1m.csv --strategies ema_cross,rsi --filters sl,tp,ts --trades-out trades.csv
+    python -m backtest --synthetic 525600 --strategies ema_cross --filters sl,ts   # Un año de velas 1m sintéticas
+"""
+import argparse
+import sys
+
+from .cli import add_common_args, load_params, load_frame, parse_filters, parse_strategies, backtest_kwargs
+from .engine import run_backtest
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest de estrategias sobre velas OHLCV guardadas.")
+    add_common_args(parser)
+    parser.add_argument("--reference", action="store_true", help="Camino lento vela a vela con las funciones reales (validación)")
+    parser.add_argument("--trades-out", default=None, help="Guardar las operaciones en CSV")
+    parser.add_argument("--equity-out", default=None, help="Guardar la curva de equity en CSV")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        config = load_params(args.config)
+    except (ValueError, TypeError) as e:
+        print(f"❌ Configuración inválida: {e}"); return 2
+    strategies, filters = parse_strategies(args.strategies), parse_filters(args.filters)
+    if not strategies: print("⚠️ Sin estrategias: no habrá operaciones.")
+
+    df = load_frame(args)
+    print(f"📈 {len(df)} velas ({df.index[0]} -> {df.index[-1]}) | estrategias: {', '.join(strategies) or '-'} | "
+          f"filtros: {', '.join(k for k, v in filters.items() if v) or '-'}")
+    result = run_backtest(df, strategies, filters, config, fast=not args.reference, **backtest_kwargs(args))
+    print(f"✅ {result.summary()}")
+    if args.trades_out: result.trades.to_csv(args.trades_out, index=False); print(f"💾 Operaciones: {args.trades_out}")
+    if args.equity_out: result.equity.to_csv(args.equity_out); print(f"💾 Equity: {args.equity_out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import os
+
+from utils.config_manager import DEFAULT_CONFIG, DEFAULT_CONFIG_PATH, load_config, build_bot_params
+
+from .data import load_ohlcv_csv, synthetic_ohlcv
+
+# --- Argumentos comunes de las herramientas de backtest (python -m backtest, optimizer, walk_forward) ---
+
+VALID_FILTERS = ("sl", "tp", "ts")
+
+
+def parse_list(text):
+    return [item.strip() for item in str(text or "").split(",") if item.strip()]
+
+
+def add_common_args(parser):
+    """Fuente de velas, config, estrategias, filtros y costes."""
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="CSV con timestamp, open, high, low, close, volume")
+    source.add_argument("--synthetic", type=int, help="Número de velas sintéticas (pruebas sin datos)")
+    source.add_argument("--store", metavar="SYMBOL", help="Símbolo del histórico local (core.ohlcv_store)")
+    parser.add_argument("--exchange", default="binanceusdm", help="Exchange del histórico local (con --store)")
+    parser.add_argument("--timeframe", default="1m", help="Timeframe del histórico local (con --store)")
+    parser.add_argument("--start", default=None, help="Fecha de inicio del histórico local (con --store)")
+    parser.add_argument("--end", default=None, help="Fecha de fin, exclusiva (con --store)")
+    parser.add_argument("--store-dir", default=None, help="Raíz del histórico local (por defecto la de core.ohlcv_store)")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, help="Ruta de config_bot.json (si no existe: valores por defecto)")
+    parser.add_argument("--strategies", default="", help="Estrategias separadas por comas, en orden de prioridad (claves de STRATEGY_MAP)")
+    parser.add_argument("--filters", default="", help="Filtros activos separados por comas: sl,tp,ts")
+    parser.add_argument("--balance", type=float, default=1000.0, help="Balance inicial en USDT")
+    parser.add_argument("--fee", type=float, default=0.0004, help="Comisión por lado (ratio, 0.0004 = 0.04%%)")
+    parser.add_argument("--slippage-bps", type=float, default=0.0, help="Deslizamiento por ejecución en puntos básicos")
+    parser.add_argument("--intrabar", choices=("auto", "on", "off"), default="auto",
+                        help="SL/TP con máximos/mínimos de la vela (auto = según 'protective_orders')")
+    return parser
+
+
+def load_params(path):
+    """Parámetros del worker (build_bot_params) desde config_bot.json; valores por defecto si no existe."""
+    cfg = load_config(config_path=path) if os.path.exists(path) else dict(DEFAULT_CONFIG)
+    return build_bot_params(cfg)
+
+
+def load_frame(args):
+    if args.store:
+        from core.ohlcv_store import OHLCVStore, DEFAULT_STORE_DIR
+        df = OHLCVStore(args.store_dir or DEFAULT_STORE_DIR).read(args.exchange, args.store, args.timeframe, args.start, args.end)
+        if df.empty: raise SystemExit(f"❌ Sin velas de {args.store} {args.timeframe} ({args.exchange}) en el histórico local.")
+        return df
+    return load_ohlcv_csv(args.csv) if args.csv else synthetic_ohlcv(args.synthetic)
+
+
+def parse_filters(text):
+    return {key: key in parse_list(str(text or "").lower()) for key in VALID_FILTERS}
+
+
+def parse_strategies(text):
+    """Lista de estrategias; carga 'custom' en STRATEGY_MAP si se pide (como el worker)."""
+    strategies = parse_list(text)
+    if 'custom' in strategies:
+        from strategies import load_dynamic_custom_strategy
+        load_dynamic_custom_strategy()
+    return strategies
+
+
+def backtest_kwargs(args):
+    """Argumentos de coste de run_backtest desde la línea de comandos."""
+    return {'initial_balance': args.balance, 'fee_rate': args.fee, 'slippage_bps': args.slippage_bps,
+            'intrabar': None if args.intrabar == "auto" else args.intrabar == "on"}
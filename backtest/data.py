@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+import pandas as pd
+
+# --- Datos de velas para el backtest ---
+# Mismo formato que get_ohlcv (core/exchange_utils): índice 'timestamp' UTC
+# y columnas open, high, low, close, volume.
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def ohlcv_frame(rows):
+    """DataFrame estándar desde velas ccxt [[ts_ms, o, h, l, c, v], ...]."""
+    df = pd.DataFrame(rows, columns=['timestamp'] + OHLCV_COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
+    return df.set_index('timestamp').astype(float)
+
+
+def load_ohlcv_csv(path):
+    """
+    Lee velas de un CSV con columnas timestamp (ms o fecha), open, high,
+    low, close, volume. Devuelve el DataFrame ordenado y sin duplicados.
+    """
+    df = pd.read_csv(path)
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    missing = [c for c in ['timestamp'] + OHLCV_COLUMNS if c not in df.columns]
+    if missing: raise ValueError(f"CSV {path}: faltan columnas {missing}")
+    stamps = df['timestamp']
+    if pd.api.types.is_numeric_dtype(stamps): df['timestamp'] = pd.to_datetime(stamps, unit='ms', utc=True)
+    else: df['timestamp'] = pd.to_datetime(stamps, utc=True)
+    df = df.set_index('timestamp')[OHLCV_COLUMNS].astype(float)
+    return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+def synthetic_ohlcv(n, timeframe_ms=60_000, start_price=100.0, volatility=0.002, seed=0, start_ms=1_600_000_000_000):
+    """Velas sintéticas (paseo log-normal con semilla), para pruebas y benchmarks sin datos guardados."""
+    rng = np.random.default_rng(seed)
+    closes = start_price * np.exp(np.cumsum(rng.normal(0.0, volatility, n)))
+    opens = np.concatenate(([start_price], closes[:-1]))
+    wick = np.abs(rng.normal(0.0, volatility / 2, (2, n)))
+    highs = np.maximum(opens, closes) * (1 + wick[0])
+    lows = np.minimum(opens, closes) * (1 - wick[1])
+    volume = rng.uniform(10, 1000, n)
+    index = pd.to_datetime(start_ms + np.arange(n, dtype=np.int64) * int(timeframe_ms), unit='ms', utc=True)
+    return pd.DataFrame({'open': opens, 'high': highs, 'low': lows, 'close': closes, 'volume': volume},
+                        index=pd.Index(index, name='timestamp'))
+
+
+def share_ohlcv(df, directory):
+    """
+    Copia las velas a `directory` como .npy (valores float64 + timestamps en
+    ns) para abrirlas con memmap desde otros procesos sin serializar el
+    DataFrame. Devuelve el directorio (lo que se pasa a open_shared_ohlcv).
+    """
+    os.makedirs(directory, exist_ok=True)
+    values = np.lib.format.open_memmap(os.path.join(directory, 'values.npy'), mode='w+', dtype=np.float64, shape=(len(df), len(OHLCV_COLUMNS)))
+    values[:] = df[OHLCV_COLUMNS].to_numpy(dtype=np.float64); values.flush(); del values
+    np.save(os.path.join(directory, 'timestamps.npy'), df.index.values.astype('datetime64[ns]').astype(np.int64) if isinstance(df.index, pd.DatetimeIndex) else np.arange(len(df), dtype=np.int64))
+    return directory
+
+
+def open_shared_ohlcv(directory, start=None, stop=None):
+    """DataFrame de las velas [start:stop] guardadas con share_ohlcv (lectura por memmap: solo se cargan esas filas)."""
+    values = np.load(os.path.join(directory, 'values.npy'), mmap_mode='r')
+    stamps = np.load(os.path.join(directory, 'timestamps.npy'), mmap_mode='r')
+    window = slice(start, stop)
+    index = pd.DatetimeIndex(pd.to_datetime(np.asarray(stamps[window]), utc=True), name='timestamp')
+    return pd.DataFrame(np.array(values[window]), columns=OHLCV_COLUMNS, index=index)
+
+
+def shared_length(directory):
+    """Número de velas guardadas con share_ohlcv (sin cargarlas)."""
+    return int(np.load(os.path.join(directory, 'values.npy'), mmap_mode='r').shape[0])
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from strategies import STRATEGY_MAP, BATCH_STRATEGY_MAP, active_requirements
+from strategies.indicator_cache import cached_indicator
+from strategies.requirements import default_requirements, merge_requirements
+from core.stop_loss import execute_stop_loss
+from core.auto_profit import execute_auto_profit
+from core.trailing_stop import execute_trailing_stop
+from utils.state_manager import DEFAULT_TS_STATE
+
+from .signals import strategy_signals
+
+# --- Motor de backtest ---
+# Reproduce velas guardadas con las mismas reglas que BotWorker:
+#   - En cada cierre de vela: con posición, SL -> TP -> TS y luego inversión;
+#     sin posición, la primera estrategia activa con señal abre (a cierre).
+#   - Tras un cierre por SL/TP/TS no se entra en la misma vela; la inversión
+#     cierra y abre en la misma vela.
+#   - Tamaño como calculate_order_size (trade_pct del balance x apalancamiento)
+#     y PNL% sobre margen como get_position_status.
+#   - Margen aislado: con PNL% <= -100% la posición se liquida ('liquidación')
+#     y ninguna operación pierde más que su margen (PNL neto >= -margen).
+# Camino rápido (por defecto): indicadores una vez sobre toda la historia,
+# señales en arrays y salidas buscadas por bloques con NumPy (el TS es el
+# máximo acumulado del PNL). Camino de referencia (fast=False): vela a vela
+# con las funciones reales de strategies/ y core/ (lento, para validar).
+
+TRADE_COLUMNS = ['entry_time', 'exit_time', 'side', 'entry_price', 'exit_price', 'contracts',
+                 'pnl', 'pnl_pct', 'fees', 'strategy', 'reason', 'bars']
+MIN_CONTRACTS = 0.001
+LIQUIDATION_PNL = -1.0 # PNL% sobre margen (ratio) al que se pierde todo el margen
+_FIRST_CHUNK = 512 # Velas por bloque al buscar la salida (se dobla en cada bloque)
+
+
+def backtest_requirements(config, strategies=None):
+    """Indicadores de siempre del worker (EMAs, filtro opcional, RSI) más lo que declaren `strategies`."""
+    return merge_requirements([default_requirements(config), active_requirements(strategies, config)])
+
+
+def indicator_lookback(config, strategies=None):
+    """Velas necesarias para que los indicadores sean válidos (como _determine_ohlcv_limit, sin el margen)."""
+    return backtest_requirements(config, strategies)['lookback']
+
+
+def prepare_frame(df, config, strategies=None):
+    """
+    Indicadores (backtest_requirements) calculados una sola vez sobre toda
+    la historia a través de la caché de indicadores (las formas por lotes
+    que los piden, p.ej. rsi_original, no los repiten).
+    """
+    out = df.copy()
+    for col, (name, period) in backtest_requirements(config, strategies)['indicators'].items():
+        out[col] = cached_indicator(out, name, period, config)
+    return out
+
+
+def _risk_params(config, filters):
+    """Umbrales como ratios de PNL (None = filtro inactivo), con los mismos mínimos que stop_loss / auto_profit / trailing_stop."""
+    def _pct(key):
+        try: value = abs(float(config.get(key, 0.0) or 0.0))
+        except (TypeError, ValueError): return None
+        return value if value > 0.001 else None
+    sl, tp = _pct('stop_loss'), _pct('auto_profit')
+    ts_trigger, ts_dist = _pct('trailing_trigger'), _pct('trailing_stop')
+    return {
+        'sl': sl / 100.0 if filters.get('sl') and sl else None,
+        'tp': tp / 100.0 if filters.get('tp') and tp else None,
+        'ts': (ts_trigger / 100.0, ts_dist / 100.0) if filters.get('ts') and ts_trigger and ts_dist else None,
+    }
+
+
+def _order_contracts(balance, config, price):
+    """calculate_order_size sin logs: margen = balance x trade_pct%, x apalancamiento, truncado a 3 decimales."""
+    leverage, trade_pct = float(config.get('leverage', 10)), float(config.get('trade_pct', 1.0))
+    if price <= 0 or leverage <= 0 or balance <= 0 or trade_pct <= 0: return 0.0
+    raw = balance * trade_pct / 100.0 * leverage / price
+    if raw < MIN_CONTRACTS: return 0.0
+    return int(raw * 1000) / 1000
+
+
+def _trade_result(entry, exit_price, contracts, direction, leverage, fee_rate):
+    """(pnl, comisiones, margen) de una operación; el PNL neto no baja de -margen (margen aislado)."""
+    margin = entry * contracts / leverage
+    fees = (entry + exit_price) * contracts * fee_rate
+    pnl = max((exit_price - entry) * contracts * direction, fees - margin)
+    return pnl, fees, margin
+
+
+def collect_signals(df, strategies, config):
+    """
+    Arrays combinados en el orden de `strategies`: lado de entrada (1/-1/0),
+    estrategia que entra e inversiones. Las salidas 'close' se ignoran, como en el worker.
+    """
+    n = len(df)
+    entry_side = np.zeros(n, dtype=np.int8)
+    entry_strategy = np.full(n, -1, dtype=np.int16)
+    invert_long, invert_short = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+    slow = []
+    for k in reversed(range(len(strategies))): # La primera estrategia de la lista gana
+        name = strategies[k]
+        if name not in BATCH_STRATEGY_MAP and name in STRATEGY_MAP: slow.append(name)
+        signals = strategy_signals(name, df, config, indicator_lookback(config, strategies) + 50)
+        if signals is None:
+            print(f"⚠️ Backtest: estrategia '{name}' no encontrada en STRATEGY_MAP. Ignorada.")
+            continue
+        hit = signals.long | signals.short
+        entry_side[hit] = np.where(signals.long[hit], 1, -1)
+        entry_strategy[hit] = k
+        invert_long |= signals.invert_long; invert_short |= signals.invert_short
+    if slow: print(f"ℹ️ Backtest: {', '.join(slow)} sin versión vectorizada (evaluadas vela a vela).")
+    return entry_side, entry_strategy, invert_long, invert_short
+
+
+class BacktestResult:
+    """Operaciones, curva de equity y estadísticas de un backtest."""
+    def __init__(self, trades, equity, stats, config):
+        self.trades = trades
+        self.equity = equity
+        self.stats = stats
+        self.config = config
+
+    def summary(self):
+        s = self.stats
+        return (f"{s['trades']} operaciones | retorno {s['total_return_pct']:.2f}% | balance {s['final_balance']:.2f} | "
+                f"acierto {s['win_rate_pct']:.1f}% | PF {s['profit_factor']:.2f} | DD máx {s['max_drawdown_pct']:.2f}% | "
+                f"{s['bars']} velas en {s['elapsed_s']:.2f}s")
+
+    def __repr__(self):
+        return f"BacktestResult({self.summary()})"
+
+
+def _stats(trades, equity, initial_balance, bars, elapsed):
+    pnl = trades['pnl'].to_numpy() - trades['fees'].to_numpy() if len(trades) else np.zeros(0)
+    wins, losses = pnl[pnl > 0].sum(), -pnl[pnl < 0].sum()
+    values = equity.to_numpy()
+    peak = np.maximum.accumulate(values) if len(values) else values
+    drawdown = ((peak - values) / peak).max() * 100 if len(values) else 0.0
+    final = float(values[-1]) if len(values) else initial_balance
+    return {
+        'initial_balance': initial_balance, 'final_balance': final,
+        'total_return_pct': (final / initial_balance - 1) * 100 if initial_balance else 0.0,
+        'trades': int(len(trades)), 'win_rate_pct': float((pnl > 0).mean() * 100) if len(pnl) else 0.0,
+        'profit_factor': float(wins / losses) if losses > 0 else (math.inf if wins > 0 else 0.0),
+        'avg_trade_pct': float(trades['pnl_pct'].mean() * 100) if len(trades) else 0.0,
+        'max_drawdown_pct': float(drawdown), 'fees': float(trades['fees'].sum()) if len(trades) else 0.0,
+        'exposure_pct': float(trades['bars'].sum() / bars * 100) if bars and len(trades) else 0.0,
+        'bars': int(bars), 'elapsed_s': elapsed,
+    }
+
+
+def _equity_curve(close, trades, initial_balance):
+    """Balance realizado + PNL no realizado de la posición abierta en cada vela (por tramos, sin bucle por vela)."""
+    n = len(close)
+    equity = np.full(n, float(initial_balance))
+    balance = float(initial_balance)
+    last = 0
+    for t in trades:
+        i, k = t['_i'], t['_k']
+        equity[last:i] = balance
+        direction = 1 if t['side'] == 'long' else -1
+        entry_fee = t['entry_price'] * t['contracts'] * t['_fee_rate']
+        unrealized = (close[i:k] - t['entry_price']) * t['contracts'] * direction
+        equity[i:k] = balance - entry_fee + np.maximum(unrealized, entry_fee - t['_margin'])
+        balance += t['pnl'] - t['fees']
+        equity[k] = balance; last = k + 1
+    equity[last:] = balance
+    return equity
+
+
+def _find_exit(j, direction, entry, arrays, risk, leverage, invert, intrabar):
+    """
+    Primera vela > j en la que la posición se cierra: (índice, razón, precio base) o None.
+    SL/TP/TS/inversión se evalúan por bloques con NumPy en el orden del worker.
+    """
+    open_, high, low, close = arrays
+    n = len(close)
+    sl, tp, ts = risk['sl'], risk['tp'], risk['ts']
+    peak_carry, active_carry = -np.inf, False
+    start, size = j + 1, _FIRST_CHUNK
+    while start < n:
+        stop = min(n, start + size)
+        seg = slice(start, stop)
+        pnl = direction * (close[seg] - entry) / entry * leverage
+        adverse = direction * (((low[seg] if direction == 1 else high[seg]) if intrabar else close[seg]) - entry) / entry * leverage
+        liq_hit = adverse <= LIQUIDATION_PNL
+        hits = invert[seg] | liq_hit
+        sl_hit = tp_hit = ts_hit = None
+        if sl is not None:
+            sl_hit = adverse <= -sl
+            hits |= sl_hit
+        if tp is not None:
+            favour = (high[seg] if direction == 1 else low[seg]) if intrabar else close[seg]
+            tp_hit = direction * (favour - entry) / entry * leverage >= tp
+            hits |= tp_hit
+        if ts is not None:
+            trigger, ratio = ts
+            peak = np.maximum.accumulate(np.concatenate(([peak_carry], pnl)))
+            prev_peak, peak = peak[:-1], peak[1:]
+            active = peak >= trigger
+            prev_active = np.concatenate(([active_carry], active[:-1]))
+            # Igual que execute_trailing_stop: un nuevo pico (ya activo) nunca cierra; si no, cierra con PNL <= pico x ratio
+            ts_hit = active & (pnl <= peak * ratio) & ~(prev_active & (pnl > prev_peak))
+            hits |= ts_hit
+            peak_carry, active_carry = peak[-1], bool(active[-1])
+        if hits.any():
+            offset = int(np.argmax(hits)); k = start + offset
+            if sl_hit is not None and sl_hit[offset]:
+                if not intrabar: return k, 'stop-loss', close[k]
+                level = entry * (1 - direction * sl / leverage)
+                return k, 'stop-loss', (min(open_[k], level) if direction == 1 else max(open_[k], level)) # Con hueco: a la apertura
+            if liq_hit[offset]:
+                if not intrabar: return k, 'liquidación', close[k]
+                level = entry * (1 + direction * LIQUIDATION_PNL / leverage)
+                return k, 'liquidación', (min(open_[k], level) if direction == 1 else max(open_[k], level))
+            if tp_hit is not None and tp_hit[offset]:
+                if not intrabar: return k, 'auto-profit', close[k]
+                level = entry * (1 + direction * tp / leverage)
+                return k, 'auto-profit', (max(open_[k], level) if direction == 1 else min(open_[k], level))
+            if ts_hit is not None and ts_hit[offset]: return k, 'trailing-stop', close[k]
+            return k, 'inversion', close[k]
+        start, size = stop, size * 2
+    return None
+
+
+def _run_fast(df, strategies, risk, config, initial_balance, fee_rate, slippage, intrabar, warmup):
+    open_, high, low, close = (df[c].to_numpy(dtype=float) for c in ('open', 'high', 'low', 'close'))
+    arrays = (open_, high, low, close)
+    n = len(close)
+    entry_side, entry_strategy, invert_long, invert_short = collect_signals(df, strategies, config)
+    entry_side[:warmup] = 0
+    entries = np.flatnonzero(entry_side)
+    leverage = float(config.get('leverage', 10)) or 1.0
+
+    trades, balance, i = [], float(initial_balance), warmup
+    forced = None # (índice, lado, estrategia) tras una inversión: abrir en la misma vela
+    while balance > 0:
+        if forced is not None:
+            j, direction, strat_idx = forced; forced = None
+        else:
+            pos = np.searchsorted(entries, i)
+            if pos >= len(entries): break
+            j = int(entries[pos]); direction = int(entry_side[j]); strat_idx = int(entry_strategy[j])
+        entry = close[j] * (1 + direction * slippage)
+        contracts = _order_contracts(balance, config, entry)
+        if contracts <= 0: i = j + 1; continue
+        found = _find_exit(j, direction, entry, arrays, risk, leverage, invert_long if direction == 1 else invert_short, intrabar)
+        if found is None: k, reason, base = n - 1, 'fin de datos', close[n - 1]
+        else: k, reason, base = found
+        exit_price = base * (1 - direction * slippage)
+        pnl, fees, margin = _trade_result(entry, exit_price, contracts, direction, leverage, fee_rate)
+        trades.append({'_i': j, '_k': k, '_fee_rate': fee_rate, '_margin': margin, 'side': 'long' if direction == 1 else 'short',
+                       'entry_price': entry, 'exit_price': exit_price, 'contracts': contracts, 'pnl': pnl,
+                       'pnl_pct': max(direction * (exit_price - entry) / entry * leverage, LIQUIDATION_PNL), 'fees': fees,
+                       'strategy': strategies[strat_idx] if strat_idx >= 0 else '', 'reason': reason, 'bars': k - j})
+        balance += pnl - fees
+        if found is None: break
+        if reason == 'inversion': forced = (k, -direction, strat_idx)
+        else: i = k + 1 # Tras SL/TP/TS no se entra en la misma vela
+    return trades
+
+
+def _run_reference(df, strategies, filters, config, initial_balance, fee_rate, slippage, warmup):
+    """Vela a vela con las funciones reales (crecimiento de la ventana como en vivo). Lento: para validar."""
+    close = df['close'].to_numpy(dtype=float)
+    leverage = float(config.get('leverage', 10)) or 1.0
+    trades, balance = [], float(initial_balance)
+    position, ts_state = None, DEFAULT_TS_STATE.copy()
+
+    def _open(i, side, strat):
+        direction = 1 if side == 'long' else -1
+        entry = close[i] * (1 + direction * slippage)
+        contracts = _order_contracts(balance, config, entry)
+        if contracts <= 0: return None
+        return {'side': side, 'entry_price': entry, 'contracts': contracts, 'i': i, 'strategy': strat}
+
+    def _close(i, reason):
+        direction = 1 if position['side'] == 'long' else -1
+        exit_price = close[i] * (1 - direction * slippage)
+        entry, contracts = position['entry_price'], position['contracts']
+        pnl, fees, margin = _trade_result(entry, exit_price, contracts, direction, leverage, fee_rate)
+        trades.append({'_i': position['i'], '_k': i, '_fee_rate': fee_rate, '_margin': margin, 'side': position['side'], 'entry_price': entry,
+                       'exit_price': exit_price, 'contracts': contracts, 'pnl': pnl,
+                       'pnl_pct': max(direction * (exit_price - entry) / entry * leverage, LIQUIDATION_PNL), 'fees': fees,
+                       'strategy': position['strategy'], 'reason': reason, 'bars': i - position['i']})
+        return pnl - fees
+
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        for i in range(warmup, len(close)):
+            if balance <= 0: break
+            window, price = df.iloc[:i + 1], close[i]
+            if position is not None:
+                direction = 1 if position['side'] == 'long' else -1
+                info = dict(position, pnl_pct=direction * (price - position['entry_price']) / position['entry_price'] * leverage)
+                reason = None
+                if filters.get('sl') and execute_stop_loss(None, info, price, config) is True: reason = 'stop-loss'
+                elif info['pnl_pct'] <= LIQUIDATION_PNL: reason = 'liquidación' # Margen aislado agotado (lo cierra el exchange)
+                elif filters.get('tp') and execute_auto_profit(None, info, price, config) is True: reason = 'auto-profit'
+                elif filters.get('ts'):
+                    ts_state, should_close, _ = execute_trailing_stop(None, info, price, ts_state, config)
+                    if should_close: reason = 'trailing-stop'
+                if reason:
+                    balance += _close(i, reason); position = None; ts_state = DEFAULT_TS_STATE.copy()
+                    continue
+                for k, name in enumerate(strategies):
+                    fn = STRATEGY_MAP.get(name)
+                    try: signal = fn(window, position=info, config=config) if fn else None
+                    except Exception: signal = None
+                    if signal and signal.get('action') == 'invertir_posicion':
+                        new_side = 'short' if position['side'] == 'long' else 'long'
+                        balance += _close(i, 'inversion'); ts_state = DEFAULT_TS_STATE.copy()
+                        position = _open(i, new_side, position['strategy'])
+                        break
+                continue
+            for name in strategies:
+                fn = STRATEGY_MAP.get(name)
+                try: signal = fn(window, position=None, config=config) if fn else None
+                except Exception: signal = None
+                if signal and signal.get('action') in ('long', 'short'):
+                    position = _open(i, signal['action'], name)
+                    if position is not None: ts_state = DEFAULT_TS_STATE.copy(); break
+        if position is not None: balance += _close(len(close) - 1, 'fin de datos')
+    return trades
+
+
+def run_backtest(df, strategies, filters, config, initial_balance=1000.0, fee_rate=0.0004, slippage_bps=0.0,
+                 intrabar=None, fast=True, indicators=True):
+    """
+    Backtest de `strategies` (claves de STRATEGY_MAP, en orden de prioridad)
+    con los filtros {'sl','tp','ts'} sobre velas OHLCV. `intrabar` evalúa
+    SL/TP con máximos y mínimos de la vela (como órdenes en el exchange); por
+    defecto sigue 'protective_orders'. Devuelve un BacktestResult.
+    """
+    started = time.perf_counter()
+    strategies, filters = list(strategies or []), dict(filters or {})
+    if df is None or df.empty: raise ValueError("Backtest sin velas.")
+    frame = prepare_frame(df, config, strategies) if indicators else df
+    if intrabar is None: intrabar = bool(config.get('protective_orders', False))
+    slippage = float(slippage_bps) / 10000.0
+    warmup = min(len(frame), indicator_lookback(config, strategies))
+    if fast:
+        trades = _run_fast(frame, strategies, _risk_params(config, filters), config, initial_balance, fee_rate, slippage, intrabar, warmup)
+    else:
+        trades = _run_reference(frame, strategies, filters, config, initial_balance, fee_rate, slippage, warmup)
+
+    close = frame['close'].to_numpy(dtype=float)
+    equity = pd.Series(_equity_curve(close, trades, initial_balance), index=frame.index, name='equity')
+    index = frame.index
+    table = pd.DataFrame([dict({k: v for k, v in t.items() if not k.startswith('_')},
+                               entry_time=index[t['_i']], exit_time=index[t['_k']]) for t in trades],
+                         columns=TRADE_COLUMNS)
+    stats = _stats(table, equity, initial_balance, len(frame), time.perf_counter() - started)
+    return BacktestResult(table, equity, stats, dict(config))
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Optimizador de parámetros sobre velas guardadas (rejilla o búsqueda
+aleatoria) en un pool de procesos, con parada temprana por successive
+halving: todos los candidatos se prueban con la primera parte del
+histórico y solo el mejor 1/eta pasa al siguiente tramo, hasta el
+histórico completo.
+
+Ejemplo:
+    python -m backtest.optimizer --csv btc_1m.csv --strategies ema_cross --filters sl,ts --method random --samples 300 --out ranking.csv
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .cli import add_common_args, load_params, load_frame, parse_filters, parse_strategies, backtest_kwargs
+from .engine import run_backtest, prepare_frame
+
+# Valores por defecto a explorar (mismas unidades que config_bot.json: PNL% sobre margen)
+PARAM_SPACE = {
+    "ema_fast": [3, 5, 8, 12, 20],
+    "ema_slow": [10, 15, 21, 30, 50, 100],
+    "rsi_threshold": ["70 / 30", "75 / 25", "80 / 20", "85 / 25", "85 / 15"],
+    "stop_loss": [10, 20, 30, 50, 75, 100],
+    "trailing_trigger": [10, 15, 25, 40, 60],
+    "trailing_stop": [20, 30, 50, 70],
+}
+DEFAULT_RUNGS = (0.25, 0.5, 1.0) # Fracciones del histórico de cada tramo de successive halving
+INDICATOR_KEYS = ('ema_fast', 'ema_slow', 'ema_filter_period', 'ema_use_trend_filter', 'rsi_use_trend_filter', 'rsi_period')
+_FRAME_CACHE_SIZE = 4
+
+_WORKER = {} # Estado de cada proceso del pool (velas, estrategias, config base)
+
+
+def valid_params(params):
+    """Descarta combinaciones sin sentido (EMA rápida >= lenta)."""
+    fast, slow = params.get('ema_fast'), params.get('ema_slow')
+    return fast is None or slow is None or int(fast) < int(slow)
+
+
+def grid_candidates(space):
+    """Todas las combinaciones válidas de `space` ({clave: [valores]})."""
+    keys = list(space)
+    combos = (dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys)))
+    return [c for c in combos if valid_params(c)]
+
+
+def random_candidates(space, samples, seed=0):
+    """Hasta `samples` combinaciones válidas distintas elegidas al azar (con semilla)."""
+    rng, keys = random.Random(seed), list(space)
+    total = math.prod(len(space[k]) for k in keys)
+    seen, out = set(), []
+    for _ in range(samples * 20):
+        if len(out) >= samples or len(seen) >= total: break
+        combo = tuple(rng.randrange(len(space[k])) for k in keys)
+        if combo in seen: continue
+        seen.add(combo)
+        params = {k: space[k][i] for k, i in zip(keys, combo)}
+        if valid_params(params): out.append(params)
+    return out
+
+
+def score(stats, metric='total_return_pct', min_trades=5):
+    """Valor a maximizar; -inf con menos de `min_trades` operaciones (resultado no significativo)."""
+    if stats is None or stats.get('trades', 0) < min_trades: return -math.inf
+    value = stats.get(metric)
+    if metric == 'max_drawdown_pct' and value is not None: value = -value # Menos drawdown = mejor
+    return float(value) if value is not None and not math.isnan(value) else -math.inf
+
+
+def _init_worker(df, strategies, filters, base_config, run_kwargs):
+    _WORKER.update(df=df, strategies=strategies, filters=filters, base_config=base_config,
+                   run_kwargs=run_kwargs, frames=OrderedDict())
+
+
+def _frame_for(config):
+    """Indicadores sobre TODO el histórico (son causales: el prefijo vale para cualquier tramo), con caché LRU por periodos."""
+    key = tuple(config.get(k) for k in INDICATOR_KEYS)
+    frames = _WORKER['frames']
+    if key in frames:
+        frames.move_to_end(key); return frames[key]
+    frame = prepare_frame(_WORKER['df'], config, _WORKER['strategies'])
+    frames[key] = frame
+    if len(frames) > _FRAME_CACHE_SIZE: frames.popitem(last=False)
+    return frame
+
+
+def _evaluate(task):
+    """(índice, params, velas) -> (índice, stats o None). Se ejecuta en un proceso del pool."""
+    idx, params, bars = task
+    config = dict(_WORKER['base_config'], **params)
+    try:
+        frame = _frame_for(config)
+        result = run_backtest(frame.iloc[:bars], _WORKER['strategies'], _WORKER['filters'], config,
+                              indicators=False, **_WORKER['run_kwargs'])
+        return idx, result.stats
+    except Exception as e:
+        print(f"⚠️ Optimizer: error con {params}: {e}")
+        return idx, None
+
+
+def _indicator_order(candidates, indices):
+    """Agrupa las tareas por periodos de indicadores para aprovechar la caché de cada proceso."""
+    return sorted(indices, key=lambda i: tuple(str(candidates[i].get(k)) for k in INDICATOR_KEYS))
+
+
+def optimize(df, strategies, filters, base_config, candidates, metric='total_return_pct', min_trades=5,
+             rungs=DEFAULT_RUNGS, eta=3, workers=None, log=print, **run_kwargs):
+    """
+    Successive halving de `candidates` (lista de dicts de parámetros). Cada
+    tramo usa las primeras `rung x len(df)` velas; pasan ceil(n/eta). Devuelve
+    un DataFrame ordenado (mejor primero) con parámetros, tramo alcanzado,
+    puntuación y estadísticas del último tramo evaluado. workers=0 evalúa
+    en el propio proceso (p.ej. dentro de un proceso de walk_forward).
+    """
+    if not candidates: raise ValueError("Optimizer sin candidatos.")
+    rungs = sorted({min(1.0, max(0.01, float(r))) for r in (rungs or (1.0,))} | {1.0})
+    workers = (os.cpu_count() or 1) if workers is None else int(workers)
+    results = {i: {'rung': 0, 'bars': 0, 'score': -math.inf, 'stats': None} for i in range(len(candidates))}
+    alive = list(range(len(candidates)))
+    started = time.perf_counter()
+    initargs = (df, list(strategies), dict(filters), dict(base_config), run_kwargs)
+    if workers > 0: pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+    else: _init_worker(*initargs); pool = contextlib.nullcontext()
+    with pool:
+        for level, fraction in enumerate(rungs, start=1):
+            bars = max(2, int(len(df) * fraction))
+            tasks = [(i, candidates[i], bars) for i in _indicator_order(candidates, alive)]
+            if workers > 0: evaluated = pool.map(_evaluate, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+            else: evaluated = map(_evaluate, tasks)
+            for idx, stats in evaluated:
+                results[idx].update(rung=level, bars=bars, stats=stats, score=score(stats, metric, min_trades))
+            alive.sort(key=lambda i: results[i]['score'], reverse=True)
+            log(f"🔎 Tramo {level}/{len(rungs)}: {len(tasks)} candidatos x {bars} velas | mejor {metric}="
+                f"{results[alive[0]]['score']:.4g} | {time.perf_counter() - started:.1f}s")
+            if level < len(rungs): alive = alive[:max(1, math.ceil(len(alive) / eta))]
+
+    rows = []
+    for i, res in results.items():
+        row = dict(candidates[i], rung=res['rung'], bars=res['bars'], score=res['score'])
+        row.update({k: v for k, v in (res['stats'] or {}).items() if k not in ('elapsed_s', 'bars', 'initial_balance')})
+        rows.append(row)
+    table = pd.DataFrame(rows).sort_values(['rung', 'score'], ascending=[False, False]).reset_index(drop=True)
+    table.index = table.index + 1; table.index.name = 'rank'
+    return table
+
+
+def save_results(table, path):
+    """Ranking a CSV (o JSON si la extensión es .json)."""
+    if str(path).lower().endswith('.json'): table.reset_index().to_json(path, orient='records', indent=2)
+    else: table.to_csv(path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Optimizador de parámetros (rejilla / aleatorio + successive halving).")
+    add_common_args(parser)
+    parser.add_argument("--method", choices=("grid", "random"), default="random", help="Rejilla completa o muestras aleatorias")
+    parser.add_argument("--samples", type=int, default=256, help="Candidatos de la búsqueda aleatoria")
+    parser.add_argument("--space", default=None, help="JSON {clave: [valores]} que sustituye/añade claves a PARAM_SPACE")
+    parser.add_argument("--metric", default="total_return_pct", help="Estadística a maximizar (total_return_pct, profit_factor, max_drawdown_pct...)")
+    parser.add_argument("--min-trades", type=int, default=5, help="Mínimo de operaciones para puntuar un candidato")
+    parser.add_argument("--rungs", default=",".join(str(r) for r in DEFAULT_RUNGS), help="Fracciones del histórico por tramo (1 = sin parada temprana)")
+    parser.add_argument("--eta", type=float, default=3, help="Pasa 1/eta de los candidatos a cada tramo")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto todos los núcleos)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de la búsqueda aleatoria")
+    parser.add_argument("--out", default="optimizer_results.csv", help="Ranking en CSV o JSON")
+    parser.add_argument("--top", type=int, default=10, help="Filas del ranking a mostrar")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        config = load_params(args.config)
+    except (ValueError, TypeError) as e:
+        print(f"❌ Configuración inválida: {e}"); return 2
+    strategies, filters = parse_strategies(args.strategies), parse_filters(args.filters)
+    space = dict(PARAM_SPACE)
+    if args.space:
+        with open(args.space, 'r', encoding='utf-8') as f: space.update(json.load(f))
+    candidates = grid_candidates(space) if args.method == "grid" else random_candidates(space, args.samples, args.seed)
+    df = load_frame(args)
+    print(f"📈 {len(df)} velas | {len(candidates)} candidatos ({args.method}) | procesos: {args.workers or os.cpu_count()}")
+    table = optimize(df, strategies, filters, config, candidates, metric=args.metric, min_trades=args.min_trades,
+                     rungs=[float(r) for r in args.rungs.split(",") if r.strip()], eta=args.eta, workers=args.workers,
+                     **backtest_kwargs(args))
+    save_results(table, args.out)
+    with pd.option_context('display.max_columns', 20, 'display.width', 200):
+        print(table.head(args.top).to_string())
+    print(f"💾 Ranking: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
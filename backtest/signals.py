@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import os
+
+import numpy as np
+
+from strategies import STRATEGY_MAP, BATCH_STRATEGY_MAP
+from strategies.batch import BatchSignals, empty_batch
+
+# --- Señales de estrategia para toda la historia ---
+# Las estrategias con forma por lotes (BATCH_STRATEGY_MAP, ver
+# strategies/batch.py) se evalúan en una pasada NumPy. El resto (p.ej.
+# 'custom' sin strategy_custom_batch) se evalúa vela a vela con la función
+# real (lento). `batch_mismatches` comprueba que ambas formas coinciden.
+
+Signals = BatchSignals # Alias histórico del backtest
+
+
+def strategy_signals(name, df, config, lookback=None):
+    """BatchSignals de la estrategia `name`; None si no existe en STRATEGY_MAP ni BATCH_STRATEGY_MAP."""
+    batch_fn = BATCH_STRATEGY_MAP.get(name)
+    if batch_fn is not None: return batch_fn(df, config)
+    if name in STRATEGY_MAP: return per_bar_signals(STRATEGY_MAP[name], df, config, lookback)
+    return None
+
+
+def per_bar_signals(strategy_func, df, config, lookback=None):
+    """
+    Camino lento: llama a la función real vela a vela sin posición y con
+    posición long / short. `lookback` limita la ventana a las últimas velas
+    (la que vería el worker); None = todo el histórico hasta la vela.
+    Los print() de la estrategia se descartan.
+    """
+    n = len(df)
+    out = empty_batch(n)
+    lookback = max(2, int(lookback)) if lookback else None
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        for i in range(n):
+            window = df.iloc[(max(0, i + 1 - lookback) if lookback else 0):i + 1]
+            try:
+                signal = strategy_func(window, position=None, config=config)
+                action = signal.get('action') if signal else None
+                if action == 'long': out.long[i] = True
+                elif action == 'short': out.short[i] = True
+                for side, exits, inverts in (('long', out.exit_long, out.invert_long), ('short', out.exit_short, out.invert_short)):
+                    signal = strategy_func(window, position={'side': side}, config=config)
+                    action = signal.get('action') if signal else None
+                    if action == 'close': exits[i] = True
+                    elif action == 'invertir_posicion': inverts[i] = True
+            except Exception:
+                continue # Como el worker: un error de la estrategia no detiene el resto
+    return out
+
+
+def batch_mismatches(name, df, config):
+    """
+    Compara la forma por lotes con la función por vela sobre ventanas
+    crecientes (df.iloc[:i+1]). Devuelve {campo: [índices distintos]}
+    (vacío si coinciden). O(n²): para validar con pocas velas.
+    """
+    batch = BATCH_STRATEGY_MAP[name](df, config)
+    reference = per_bar_signals(STRATEGY_MAP[name], df, config)
+    diffs = {}
+    for field in BatchSignals._fields:
+        bad = np.flatnonzero(np.asarray(getattr(batch, field), dtype=bool) != getattr(reference, field))
+        if len(bad): diffs[field] = bad.tolist()
+    return diffs
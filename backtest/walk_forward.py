@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Validación walk-forward: para cada estrategia se optimizan los parámetros
+(PARAM_SPACE, claves de DEFAULT_CONFIG) en una ventana in-sample y el
+mejor juego se puntúa en la ventana out-of-sample siguiente; las ventanas
+avanzan de `out_sample` en `out_sample` velas. Cada (estrategia, ventana)
+es independiente y se ejecuta en un proceso; todos leen la misma copia de
+las velas en disco por memmap (share_ohlcv) en lugar de recibir el
+DataFrame serializado.
+
+Ejemplo:
+    python -m backtest.walk_forward --csv btc_1m.csv --filters sl,ts --in-sample 40000 --out-sample 10000 --samples 60
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from strategies import STRATEGY_MAP
+from utils.config_manager import DEFAULT_CONFIG
+
+from .cli import add_common_args, load_params, load_frame, parse_filters, parse_strategies, backtest_kwargs
+from .data import share_ohlcv, open_shared_ohlcv, shared_length
+from .engine import run_backtest, prepare_frame, indicator_lookback
+from .optimizer import PARAM_SPACE, DEFAULT_RUNGS, grid_candidates, random_candidates, optimize, score
+
+_SHARED = {} # Estado de cada proceso del pool (directorio memmap y parámetros comunes)
+
+
+def rolling_windows(n_bars, in_sample, out_sample, step=None):
+    """[(inicio_is, fin_is, fin_oos), ...] con índices de vela; la última ventana OOS puede ser más corta."""
+    step = int(step or out_sample)
+    windows, start = [], 0
+    while start + in_sample < n_bars:
+        is_end = start + in_sample
+        windows.append((start, is_end, min(n_bars, is_end + out_sample)))
+        start += step
+    return windows
+
+
+def _init_worker(directory, filters, base_config, candidates, opt_kwargs, run_kwargs):
+    _SHARED.update(directory=directory, filters=filters, base_config=base_config, candidates=candidates,
+                   opt_kwargs=opt_kwargs, run_kwargs=run_kwargs)
+
+
+def _run_window(task):
+    """Optimiza en in-sample y puntúa el mejor juego en out-of-sample. Se ejecuta en un proceso del pool."""
+    strategy, number, (is_start, is_end, oos_end) = task
+    started = time.perf_counter()
+    filters, base_config, run_kwargs = _SHARED['filters'], _SHARED['base_config'], _SHARED['run_kwargs']
+    in_sample = open_shared_ohlcv(_SHARED['directory'], is_start, is_end)
+    ranking = optimize(in_sample, [strategy], filters, base_config, _SHARED['candidates'], workers=0,
+                       log=lambda msg: None, **_SHARED['opt_kwargs'], **run_kwargs)
+    best = ranking.iloc[0]
+    params = {k: (v.item() if isinstance(v, np.generic) else v) for k, v in best.items() if k in _SHARED['candidates'][0]}
+    config = dict(base_config, **params)
+
+    # OOS: indicadores con las velas previas como calentamiento; las operaciones empiezan en is_end
+    warmup = min(is_end - is_start, indicator_lookback(config, [strategy]))
+    frame = prepare_frame(open_shared_ohlcv(_SHARED['directory'], is_end - warmup, oos_end), config, [strategy])
+    oos = run_backtest(frame, [strategy], filters, config, indicators=False, **run_kwargs)
+    return {
+        'strategy': strategy, 'window': number, 'is_start': in_sample.index[0], 'is_end': in_sample.index[-1],
+        'oos_start': frame.index[warmup] if warmup < len(frame) else frame.index[-1], 'oos_end': frame.index[-1],
+        'params': json.dumps(params, ensure_ascii=False), 'is_score': float(best['score']),
+        'oos_score': score(oos.stats, _SHARED['opt_kwargs'].get('metric', 'total_return_pct'), 0),
+        'oos_return_pct': oos.stats['total_return_pct'], 'oos_trades': oos.stats['trades'],
+        'oos_win_rate_pct': oos.stats['win_rate_pct'], 'oos_max_drawdown_pct': oos.stats['max_drawdown_pct'],
+        'elapsed_s': time.perf_counter() - started,
+    }
+
+
+def summarize(table):
+    """Por estrategia: ventanas, retorno OOS medio y compuesto, ventanas OOS positivas."""
+    if table.empty: return table
+    rows = []
+    for strategy, group in table.groupby('strategy', sort=False):
+        returns = group['oos_return_pct'].to_numpy() / 100.0
+        rows.append({'strategy': strategy, 'windows': len(group), 'oos_trades': int(group['oos_trades'].sum()),
+                     'oos_mean_return_pct': float(returns.mean() * 100),
+                     'oos_compound_return_pct': float((np.prod(1 + returns) - 1) * 100),
+                     'oos_positive_pct': float((returns > 0).mean() * 100)})
+    return pd.DataFrame(rows).sort_values('oos_compound_return_pct', ascending=False).reset_index(drop=True)
+
+
+def walk_forward(df, strategies, filters, base_config, candidates, in_sample, out_sample, step=None,
+                 workers=None, metric='total_return_pct', min_trades=5, rungs=DEFAULT_RUNGS, eta=3,
+                 shared_dir=None, log=print, **run_kwargs):
+    """
+    Walk-forward de cada estrategia de `strategies` (por defecto todo
+    STRATEGY_MAP). Devuelve (tabla por ventana, resumen por estrategia).
+    """
+    strategies = list(strategies or STRATEGY_MAP.keys())
+    windows = rolling_windows(len(df), int(in_sample), int(out_sample), step)
+    if not windows: raise ValueError(f"Walk-forward: {len(df)} velas no llegan a una ventana in-sample de {in_sample}.")
+    workers = workers or os.cpu_count() or 1
+    own_dir = shared_dir is None
+    directory = share_ohlcv(df, shared_dir or tempfile.mkdtemp(prefix="bot_wf_"))
+    log(f"🗂️ Velas compartidas por memmap en {directory} ({shared_length(directory)} velas) | "
+        f"{len(strategies)} estrategias x {len(windows)} ventanas | procesos: {workers}")
+    opt_kwargs = {'metric': metric, 'min_trades': min_trades, 'rungs': rungs, 'eta': eta}
+    tasks = [(s, number, bounds) for s in strategies for number, bounds in enumerate(windows, start=1)]
+    rows, started = [], time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(directory, dict(filters), dict(base_config), list(candidates), opt_kwargs, run_kwargs)) as pool:
+            futures = {pool.submit(_run_window, task): task for task in tasks}
+            for future in as_completed(futures):
+                strategy, number, _ = futures[future]
+                try: row = future.result()
+                except Exception as e:
+                    log(f"⚠️ Walk-forward: fallo en {strategy} ventana {number}: {e}"); continue
+                rows.append(row)
+                log(f"✅ {strategy} ventana {number}/{len(windows)}: OOS {row['oos_return_pct']:.2f}% "
+                    f"({row['oos_trades']} ops) con {row['params']} | {time.perf_counter() - started:.1f}s")
+    finally:
+        if own_dir: shutil.rmtree(directory, ignore_errors=True)
+    table = pd.DataFrame(rows)
+    if not table.empty: table = table.sort_values(['strategy', 'window']).reset_index(drop=True)
+    return table, summarize(table)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Validación walk-forward (optimizar in-sample, puntuar out-of-sample).")
+    add_common_args(parser)
+    parser.add_argument("--in-sample", type=int, required=True, help="Velas de cada ventana in-sample")
+    parser.add_argument("--out-sample", type=int, required=True, help="Velas de cada ventana out-of-sample")
+    parser.add_argument("--step", type=int, default=None, help="Avance entre ventanas (por defecto --out-sample)")
+    parser.add_argument("--method", choices=("grid", "random"), default="random", help="Rejilla completa o muestras aleatorias")
+    parser.add_argument("--samples", type=int, default=64, help="Candidatos de la búsqueda aleatoria")
+    parser.add_argument("--space", default=None, help="JSON {clave: [valores]} que sustituye/añade claves a PARAM_SPACE")
+    parser.add_argument("--metric", default="total_return_pct", help="Estadística a maximizar en in-sample")
+    parser.add_argument("--min-trades", type=int, default=5, help="Mínimo de operaciones in-sample para puntuar un candidato")
+    parser.add_argument("--rungs", default=",".join(str(r) for r in DEFAULT_RUNGS), help="Tramos de successive halving en in-sample")
+    parser.add_argument("--eta", type=float, default=3, help="Pasa 1/eta de los candidatos a cada tramo")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto todos los núcleos)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de la búsqueda aleatoria")
+    parser.add_argument("--shared-dir", default=None, help="Directorio para la copia memmap de las velas (por defecto temporal)")
+    parser.add_argument("--out", default="walk_forward.csv", help="Resultados por ventana (CSV); el resumen va a <out>_summary.csv")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        config = load_params(args.config)
+    except (ValueError, TypeError) as e:
+        print(f"❌ Configuración inválida: {e}"); return 2
+    strategies, filters = parse_strategies(args.strategies), parse_filters(args.filters)
+    space = dict(PARAM_SPACE)
+    if args.space:
+        with open(args.space, 'r', encoding='utf-8') as f: space.update(json.load(f))
+    unknown = [k for k in space if k not in DEFAULT_CONFIG]
+    if unknown: print(f"⚠️ Claves fuera de DEFAULT_CONFIG (se usan igualmente): {', '.join(unknown)}")
+    candidates = grid_candidates(space) if args.method == "grid" else random_candidates(space, args.samples, args.seed)
+    df = load_frame(args)
+    table, summary = walk_forward(df, strategies, filters, config, candidates, args.in_sample, args.out_sample, step=args.step,
+                                  workers=args.workers, metric=args.metric, min_trades=args.min_trades,
+                                  rungs=[float(r) for r in args.rungs.split(",") if r.strip()], eta=args.eta,
+                                  shared_dir=args.shared_dir, **backtest_kwargs(args))
+    table.to_csv(args.out, index=False)
+    summary_path = os.path.splitext(args.out)[0] + "_summary.csv"
+    summary.to_csv(summary_path, index=False)
+    with pd.option_context('display.max_columns', 20, 'display.width', 200):
+        print(summary.to_string(index=False))
+    print(f"💾 Ventanas: {args.out} | Resumen: {summary_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks offline (datos sintéticos y respuestas grabadas en payloads/).
+
+Ejemplo:
+    python -m benchmarks --out bench.json
+    python -m benchmarks --max-size 100000 --groups indicators,strategy --compare bench_anterior.json
+"""
+import argparse
+import json
+import os
+import sys
+
+os.environ.setdefault('BOT_HEADLESS', '1') # Sin Qt
+
+from .suite import SIZES, run_suite, compare
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de indicadores, estrategias, posición y tamaño de orden.")
+    parser.add_argument("--out", default="benchmark_results.json", help="Resultados en JSON")
+    parser.add_argument("--max-size", type=int, default=max(SIZES), help="Tamaño máximo (filas / posiciones / llamadas)")
+    parser.add_argument("--groups", default="", help="Grupos separados por comas: indicators, strategy, strategy_batch, candles, position, order_size")
+    parser.add_argument("--compare", default=None, help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=1.10, help="Ratio ahora/antes a partir del cual se marca regresión")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [s for s in SIZES if s <= args.max_size] or [min(SIZES)]
+    groups = {g.strip() for g in args.groups.split(",") if g.strip()} or None
+    report = run_suite(sizes=sizes, groups=groups)
+    with open(args.out, 'w', encoding='utf-8') as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 {len(report['results'])} resultados en {args.out}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f: baseline = json.load(f)
+        rows, regressions = compare(report, baseline, args.threshold)
+        for (group, name, size), before, now, ratio in rows:
+            mark = "⚠️" if ratio > args.threshold else "  "
+            print(f"{mark} {group:>15} {name:<22} {size:>9}  {before * 1e3:10.3f} -> {now * 1e3:10.3f} ms  x{ratio:.2f}")
+        print(f"{'❌' if regressions else '✅'} {len(regressions)} regresiones de {len(rows)} casos comparados (umbral x{args.threshold:.2f}).")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
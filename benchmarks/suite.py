@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest.data import synthetic_ohlcv
+from backtest.engine import prepare_frame
+from core.candle_buffer import CandleBuffer, candles_to_frame
+from core.exchange_utils import calculate_order_size, _normalize_position
+from strategies import STRATEGY_MAP, BATCH_STRATEGY_MAP
+from strategies.indicators import calculate_emas, calculate_rsi
+from utils.config_manager import DEFAULT_CONFIG, build_bot_params
+
+# --- Benchmarks del camino caliente (sin red, datos sintéticos) ---
+# Cada caso se mide con tamaños de 100 a 1M filas (velas, posiciones en la
+# respuesta o llamadas) y se guarda el mejor tiempo y la mediana de varias
+# repeticiones. Los print() de las funciones medidas se descartan.
+
+SIZES = (100, 1_000, 10_000, 100_000, 1_000_000)
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payloads')
+MIN_REPEATS, MAX_REPEATS = 3, 20
+TARGET_SECONDS = 0.5 # Repetir hasta acumular este tiempo (entre MIN y MAX repeticiones)
+
+
+def measure(fn):
+    """(mejor, mediana, repeticiones) en segundos de fn()."""
+    times = []
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        while len(times) < MAX_REPEATS:
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+            if len(times) >= MIN_REPEATS and sum(times) >= TARGET_SECONDS: break
+    return min(times), statistics.median(times), len(times)
+
+
+def load_payloads():
+    """{nombre: lista de posiciones ccxt grabadas} de benchmarks/payloads/*.json."""
+    payloads = {}
+    for name in sorted(os.listdir(PAYLOAD_DIR)):
+        if name.endswith('.json'):
+            with open(os.path.join(PAYLOAD_DIR, name), 'r', encoding='utf-8') as f:
+                payloads[os.path.splitext(name)[0]] = json.load(f)
+    return payloads
+
+
+def scaled_payload(positions, size, symbol):
+    """Respuesta de `size` posiciones: copias de las grabadas con otros símbolos y la de `symbol` al final (peor caso)."""
+    target = next(p for p in positions if p.get('symbol') == symbol)
+    others = [dict(p, symbol=f"X{i}/USDT:USDT") for i, p in enumerate(p for p in positions if p is not target)] or [target]
+    filler = (others * ((size - 1) // len(others) + 1))[:size - 1] # Mismos objetos repetidos: 1M posiciones sin 1M dicts
+    return filler + [target]
+
+
+def _cases(config, sizes):
+    """Genera (grupo, nombre, tamaño, fn)."""
+    ema_fast, ema_slow = int(config.get('ema_fast', 15)), int(config.get('ema_slow', 30))
+    rsi_period = int(config.get('rsi_period', 14))
+    base = synthetic_ohlcv(max(sizes))
+    for size in sizes:
+        df = base.iloc[-size:]
+        yield 'indicators', 'calculate_emas', size, (lambda d=df: calculate_emas(d, ema_fast, ema_slow, 100))
+        yield 'indicators', 'calculate_rsi', size, (lambda c=df['close']: calculate_rsi(c, rsi_period))
+        frame = prepare_frame(df, config)
+        for name, fn in STRATEGY_MAP.items():
+            yield 'strategy', name, size, (lambda f=fn, d=frame: f(d, position=None, config=config))
+            batch_fn = BATCH_STRATEGY_MAP.get(name)
+            if batch_fn is not None:
+                yield 'strategy_batch', name, size, (lambda f=batch_fn, d=frame: f(d, config))
+
+    # Velas por iteración del worker: DataFrame desde la lista de ccxt vs vista del CandleBuffer (vela en curso + frame)
+    for size in sizes:
+        chunk = base.iloc[-size:]
+        ts_ms = chunk.index.values.astype('datetime64[ms]').astype(np.int64)
+        rows = [[t] + v for t, v in zip(ts_ms.tolist(), chunk[['open', 'high', 'low', 'close', 'volume']].to_numpy().tolist())]
+        yield 'candles', 'candles_to_frame', size, (lambda r=rows: candles_to_frame(r))
+        buffer = CandleBuffer(rows[-1][0] - rows[-2][0], size); buffer.replace(rows)
+        yield 'candles', 'buffer_merge_frame', size, (lambda b=buffer, last=[rows[-1]]: b.merge(last) and b.frame())
+
+    for payload_name, positions in load_payloads().items():
+        symbol = next((p['symbol'] for p in positions if abs(float(p.get('contracts') or 0)) > 1e-9), None)
+        if symbol is None: continue
+        for size in sizes:
+            payload = scaled_payload(positions, size, symbol)
+            yield 'position', payload_name, size, (lambda p=payload, s=symbol: _normalize_position(p, s))
+
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        inputs = list(zip(rng.uniform(10, 10_000, size).tolist(), rng.uniform(1, 100, size).tolist(),
+                          rng.integers(1, 125, size).tolist(), rng.uniform(0.01, 70_000, size).tolist()))
+        def _order_sizes(rows=inputs):
+            for balance, pct, lev, price in rows: calculate_order_size(balance, pct, lev, price)
+        yield 'order_size', 'calculate_order_size', size, _order_sizes
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(PAYLOAD_DIR), timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'git_commit': commit,
+            'created_at': pd.Timestamp.now(tz='UTC').isoformat()}
+
+
+def run_suite(sizes=SIZES, groups=None, config=None, log=print):
+    """Ejecuta los benchmarks y devuelve {'environment', 'results': [...]}."""
+    config = config or build_bot_params(DEFAULT_CONFIG)
+    results = []
+    for group, name, size, fn in _cases(config, sizes):
+        if groups and group not in groups: continue
+        best, median, repeats = measure(fn)
+        results.append({'group': group, 'name': name, 'size': size, 'best_s': best, 'median_s': median,
+                        'repeats': repeats, 'ns_per_row': best / size * 1e9})
+        log(f"{group:>15} {name:<22} {size:>9}  best {best * 1e3:10.3f} ms  median {median * 1e3:10.3f} ms  ({repeats}x)")
+    return {'environment': _environment(), 'sizes': list(sizes), 'results': results}
+
+
+def compare(current, baseline, threshold=1.10):
+    """Filas (clave, antes, ahora, ratio) de los casos comunes; ratio > threshold = regresión."""
+    before = {(r['group'], r['name'], r['size']): r['best_s'] for r in baseline.get('results', [])}
+    rows = []
+    for r in current.get('results', []):
+        key = (r['group'], r['name'], r['size'])
+        if key in before and before[key] > 0:
+            rows.append((key, before[key], r['best_s'], r['best_s'] / before[key]))
+    return rows, [row for row in rows if row[3] > threshold]
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import copy
+import traceback
+
+import ccxt
+
+try:
+    import ccxt.async_support as ccxt_async
+except ImportError: # Versiones antiguas de ccxt sin soporte asyncio
+    ccxt_async = None
+
+from .exchange_utils import (
+    _price_from_ticker, _ohlcv_to_dataframe, _free_balance_from_response,
+    _normalize_position, _close_order_amount
+)
+from .metrics import timed # Mismos nombres de llamada que la versión síncrona
+from .request_scheduler import rate_limited # Mismo cubo de tokens que la instancia síncrona
+
+# --- Versión asyncio (ccxt.async_support) de las funciones de exchange_utils ---
+# Mismo comportamiento y mismos mensajes que la versión síncrona: las
+# peticiones son corrutinas y el parseo de respuestas es compartido.
+# Las clases de excepción de ccxt.async_support son las mismas que las de ccxt.
+
+
+def create_async_exchange(exchange):
+    """
+    Crea la instancia ccxt.async_support equivalente a `exchange` (síncrono):
+    mismas credenciales, opciones y URLs (sandbox incluido), reutilizando
+    los mercados ya cargados. Debe llamarse dentro del event loop que la usará.
+    """
+    if ccxt_async is None:
+        raise ImportError("ccxt.async_support no disponible (actualiza ccxt).")
+    if hasattr(exchange, 'create_async_twin'): # Exchanges en proceso (core.sim_exchange)
+        return exchange.create_async_twin()
+    exchange_class = getattr(ccxt_async, exchange.id, None)
+    if exchange_class is None:
+        raise ValueError(f"Exchange '{exchange.id}' no disponible en ccxt.async_support.")
+
+    config = {
+        'apiKey': exchange.apiKey,
+        'secret': exchange.secret,
+        'timeout': exchange.timeout,
+        'enableRateLimit': exchange.enableRateLimit,
+        'options': copy.deepcopy(exchange.options),
+    }
+    if getattr(exchange, 'password', None): config['password'] = exchange.password
+    if getattr(exchange, 'uid', None): config['uid'] = exchange.uid
+
+    async_exchange = exchange_class(config)
+    async_exchange.urls = copy.deepcopy(exchange.urls)
+    if exchange.markets:
+        async_exchange.set_markets(exchange.markets, exchange.currencies)
+    return async_exchange
+
+
+@rate_limited('fetch_price')
+@timed('fetch_price')
+async def fetch_price(exchange, symbol):
+    """Obtiene el último precio ('last') para un símbolo usando fetch_ticker."""
+    if not exchange or not symbol:
+        print("Debug [fetch_price]: Exchange o Símbolo no proporcionado.")
+        return None
+    try:
+        ticker = await exchange.fetch_ticker(symbol)
+        return _price_from_ticker(ticker, symbol)
+    except ccxt.BadSymbol:
+        print(f"❌ Error: Símbolo '{symbol}' inválido o no encontrado en {exchange.id}.")
+        return None
+    except ccxt.NetworkError:
+        return None # Fallo silencioso en actualizaciones frecuentes
+    except ccxt.ExchangeError as e:
+        print(f"⚠️ Error del Exchange obteniendo precio para {symbol}: {e}")
+        return None
+    except Exception as e:
+        print(f"⚠️ Error inesperado obteniendo precio para {symbol}: {e}")
+        return None
+
+
+async def get_ohlcv(exchange, symbol, timeframe='15m', limit=100):
+    """Obtiene datos OHLCV como DataFrame indexado por timestamp UTC."""
+    if not exchange or not symbol: return None
+    required_limit = limit + 1 # Pedir una vela extra para cálculos que usan diff()
+    ohlcv = await fetch_ohlcv_rows(exchange, symbol, timeframe=timeframe, limit=required_limit)
+    if ohlcv is None: return None
+    return _ohlcv_to_dataframe(ohlcv, symbol, timeframe, required_limit)
+
+
+@rate_limited('fetch_ohlcv_rows')
+@timed('fetch_ohlcv_rows')
+async def fetch_ohlcv_rows(exchange, symbol, timeframe='15m', limit=100, since=None):
+    """
+    Velas en bruto de fetch_ohlcv ([ts_ms, o, h, l, c, v], ...), opcionalmente
+    desde `since` (ms). None si hubo error (ya logueado).
+    """
+    if not exchange or not symbol: return None
+    try:
+        # print(f"Debug [get_ohlcv]: Obteniendo {limit} velas {timeframe} para {symbol}")
+        return await exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit)
+    except ccxt.BadSymbol:
+        print(f"❌ Error: Símbolo '{symbol}' inválido para OHLCV en {exchange.id}.")
+        return None
+    except ccxt.NetworkError as e:
+        print(f"⚠️ Error de Red obteniendo OHLCV para {symbol}: {e}")
+        return None
+    except ccxt.ExchangeError as e:
+         print(f"⚠️ Error del Exchange obteniendo OHLCV para {symbol}: {e}")
+         return None
+    except Exception as e:
+        print(f"❌ Error inesperado obteniendo OHLCV para {symbol}: {e}")
+        traceback.print_exc()
+        return None
+
+@rate_limited('fetch_balance')
+@timed('fetch_balance')
+async def fetch_balance(exchange, asset='USDT'):
+    """Obtiene el balance 'libre' o 'disponible' del asset especificado."""
+    if not exchange: return 0.0
+    try:
+        balance = await exchange.fetch_balance()
+        return _free_balance_from_response(balance, asset)
+    except ccxt.NetworkError as e:
+        print(f"⚠️ Error de Red obteniendo balance: {e}")
+        return 0.0
+    except ccxt.AuthenticationError as e:
+         print(f"❌ Error de Autenticación obteniendo balance: {e}")
+         raise e # Es un error crítico
+    except Exception as e:
+        print(f"❌ Error inesperado obteniendo balance: {e}")
+        return 0.0
+
+
+@rate_limited('get_position_status')
+@timed('get_position_status')
+async def get_position_status(exchange, symbol):
+    """Obtiene y normaliza la posición abierta del símbolo (None si no hay o error)."""
+    if not exchange or not symbol: return None
+    try:
+        if exchange.has.get('fetchPositions'):
+            positions = await exchange.fetch_positions([symbol])
+            return _normalize_position(positions, symbol)
+        else:
+            print(f"⚠️ ADVERTENCIA: {exchange.id} no soporta `fetchPositions`. No se puede obtener estado de posición.")
+            return None
+    except ccxt.NotSupported as e:
+         print(f"⚠️ {exchange.id} reporta no soportar fetch_positions: {e}")
+         return None
+    except ccxt.NetworkError:
+        return None
+    except ccxt.AuthenticationError as e:
+         print(f"❌ Error de Autenticación obteniendo posición para {symbol}: {e}")
+         raise e # Re-lanzar error crítico
+    except Exception as e:
+        print(f"❌ Error inesperado obteniendo posición para {symbol}: {e}")
+        traceback.print_exc()
+        return None
+
+
+async def _open_position(exchange, symbol, amount_contracts, side):
+    label = 'Long' if side == 'long' else 'Short'
+    if not exchange or not symbol or amount_contracts <= 0:
+        print(f"Debug [Open {label}]: Parámetros inválidos - Amount={amount_contracts}")
+        return None
+    try:
+        print(f"Debug [Open {label}]: Creando orden MARKET {'BUY' if side == 'long' else 'SELL'} para {symbol}, Cantidad: {amount_contracts}")
+        formatted_amount = exchange.amount_to_precision(symbol, amount_contracts)
+        if side == 'long': order = await exchange.create_market_buy_order(symbol, float(formatted_amount))
+        else: order = await exchange.create_market_sell_order(symbol, float(formatted_amount))
+        print(f"✅ Orden {side.upper()} creada exitosamente: ID {order.get('id', 'N/A')}")
+        return order
+    except ccxt.InsufficientFunds as e:
+        print(f"❌ Fondos Insuficientes ({label}) para {amount_contracts} {symbol}: {e}")
+        raise e
+    except ccxt.InvalidOrder as e:
+         print(f"❌ Orden Inválida ({label}) para {symbol}, Cantidad {amount_contracts}: {e}. Verificar límites/precisión.")
+         raise e
+    except ccxt.ExchangeError as e:
+        print(f"❌ Error del Exchange ({label}) {symbol}: {e}")
+        raise e
+    except Exception as e:
+        print(f"❌ Error inesperado abriendo {side.upper()} {symbol}: {e}")
+        traceback.print_exc()
+        raise e
+
+
+@rate_limited('open_long_position')
+@timed('open_long_position')
+async def open_long_position(exchange, symbol, amount_contracts):
+    """Abre una posición larga (compra) usando una orden MARKET."""
+    return await _open_position(exchange, symbol, amount_contracts, 'long')
+
+
+@rate_limited('open_short_position')
+@timed('open_short_position')
+async def open_short_position(exchange, symbol, amount_contracts):
+    """Abre una posición corta (venta) usando una orden MARKET."""
+    return await _open_position(exchange, symbol, amount_contracts, 'short')
+
+
+@rate_limited('close_position')
+@timed('close_position')
+async def close_position(exchange, symbol, position_info):
+    """Cierra la posición abierta del símbolo con una orden MARKET 'reduceOnly'."""
+    try:
+        close_plan = _close_order_amount(exchange, symbol, position_info)
+        if close_plan is None: return None
+        side_to_close, amount = close_plan
+        params = {'reduceOnly': True}
+
+        if side_to_close == 'long':
+            order = await exchange.create_market_sell_order(symbol, amount, params=params)
+        elif side_to_close == 'short':
+            order = await exchange.create_market_buy_order(symbol, amount, params=params)
+        else:
+            print(f"❌ Lado de posición desconocido para cerrar: {side_to_close}")
+            return None
+
+        print(f"✅ Orden de CIERRE ({'SELL' if side_to_close=='long' else 'BUY'}) creada: ID {order.get('id', 'N/A')}")
+        return order
+
+    except ccxt.OrderNotFound as e:
+         print(f"ℹ️ No se encontró orden/posición al intentar cerrar {symbol} (quizás ya cerrada): {e}")
+         return None
+    except ccxt.InsufficientFunds:
+         print(f"❌ Fondos/Margen INSUFICIENTE al intentar cerrar {symbol}. ¡REQUIERE ATENCIÓN MANUAL!")
+         raise
+    except ccxt.InvalidOrder as e:
+         print(f"❌ Orden Inválida al intentar cerrar {symbol} (reduceOnly falló?): {e}")
+         raise e
+    except ccxt.ExchangeError as e:
+        print(f"❌ Error del Exchange al cerrar {symbol}: {e}")
+        raise e
+    except Exception as e:
+        print(f"❌ Error inesperado cerrando posición para {symbol}: {e}")
+        traceback.print_exc()
+        raise e
+
+
+@rate_limited('set_leverage')
+@timed('set_leverage')
+async def set_leverage(exchange, leverage, symbol, params=None):
+    """exchange.set_leverage pasando por el planificador de peticiones. Los errores se propagan."""
+    return await exchange.set_leverage(leverage, symbol, params or {})
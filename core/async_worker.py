@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import time
+import traceback
+
+import ccxt
+
+from .worker import BotWorker, load_dynamic_custom_strategy
+from .parallel_fetch import MARKET_DATA_PARTS
+from . import async_exchange_utils as aex
+from .protective_orders import fetch_open_order_ids_async
+
+# --- Worker asyncio (ccxt.async_support) ---
+# Misma lógica de decisión que BotWorker (filtros, estrategias, fotos de
+# mercado, planificador por símbolo), pero las descargas, órdenes y esperas
+# son corrutinas: cientos de símbolos comparten UN hilo y UN pool de
+# conexiones. Las señales Qt se emiten desde el hilo del event loop y Qt
+# las entrega encoladas en el hilo de la GUI, igual que con BotWorker.
+
+RISK_LOCK_POLL = 0.02 # Segundos entre intentos de tomar risk_lock (lo tiene el RiskWatchdog)
+
+
+class AsyncBotWorker(BotWorker):
+
+    def __init__(self, exchange, get_active_strategies_fn, get_active_filters_fn, get_config_fn, parent=None):
+        super().__init__(exchange, get_active_strategies_fn, get_active_filters_fn, get_config_fn, parent)
+        self.async_exchange = None # Instancia ccxt.async_support (se crea dentro del event loop)
+        self.loop = None
+        self._tasks = {} # symbol -> asyncio.Task de su iteración en curso
+        self._synced_config = None; self._synced_symbols = [] # Última config aplicada con _sync_symbols
+
+    # --- run(): lanza el event loop en el hilo del worker (QThread) ---
+    def run(self):
+        if not isinstance(self.exchange, ccxt.Exchange):
+            self.log_signal.emit("❌ Error Crítico: Instancia de Exchange inválida."); self.finished.emit(); return
+
+        self._running = True
+        self.log_signal.emit("✅ Worker asyncio iniciado...")
+        try:
+            self.log_signal.emit("⚙️ Cargando estrategia personalizada (si existe)...")
+            load_dynamic_custom_strategy()
+        except Exception as e_load:
+            self.log_signal.emit(f"💥 ERROR FATAL al intentar cargar estrategia personalizada: {e_load}")
+            traceback.print_exc()
+
+        self.loop = asyncio.new_event_loop()
+        try:
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self._main())
+        except Exception as e:
+            self.log_signal.emit(f"💥 Error INESPERADO en el event loop: {e}"); self.log_signal.emit(traceback.format_exc())
+        finally:
+            try: self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            except Exception: pass
+            self.loop.close(); self.loop = None
+            self._running = False
+
+        self._export_metrics(self.get_config_fn() or {}, force=True)
+
+        self._shutdown_risk_watchdog()
+        self._shutdown_price_feed()
+        self.log_signal.emit("🛑 Worker ha salido del bucle principal.")
+        self.finished.emit()
+
+    async def _main(self):
+        try:
+            self.async_exchange = aex.create_async_exchange(self.exchange)
+        except Exception as e:
+            self._handle_fatal_error("Exchange asyncio", e); return
+        self.log_signal.emit(f"⚡ Exchange asyncio listo ({self.async_exchange.id}).")
+
+        try:
+            await self._dispatch_loop()
+        finally:
+            # Esperar a que terminen las iteraciones en curso (no cortar órdenes a medias)
+            pending = [t for t in self._tasks.values() if not t.done()]
+            if pending: await asyncio.gather(*pending, return_exceptions=True)
+            self._tasks.clear()
+            try: await self.async_exchange.close()
+            except Exception as e: self.log_signal.emit(f"⚠️ Error cerrando exchange asyncio: {e}")
+            self.async_exchange = None
+
+    async def _dispatch_loop(self):
+        """
+        Bucle despachador: cada símbolo vencido en el planificador se lanza
+        como tarea independiente; un símbolo lento no retrasa a los demás.
+        """
+        self._synced_config = None
+        while self._running:
+            config = self.get_config_fn()
+            if config is None: self.log_signal.emit("⚠️ Esperando configuración..."); await self._sleep(15); continue
+            strategies = self.get_active_strategies_fn()
+            filters = self.get_active_filters_fn()
+
+            if config != self._synced_config: # Solo al cambiar la config (los símbolos en curso no están en el planificador)
+                running = [s for s, t in self._tasks.items() if not t.done()]
+                self._synced_symbols = self._sync_symbols(config, running=running); self._synced_config = dict(config)
+            symbols = self._synced_symbols
+            if not symbols: self.log_signal.emit("❌ Error: Símbolo no definido."); await self._sleep(10); continue
+            self._ensure_risk_watchdog(config)
+
+            while self._running:
+                symbol = self.scheduler.pop_due()
+                if symbol is None: break
+                task = self._tasks.get(symbol)
+                if task is not None and not task.done(): continue # Sigue en curso: se re-planificará al terminar
+                self._tasks[symbol] = asyncio.ensure_future(self._run_symbol(symbol, config, strategies, filters))
+
+            for sym in [s for s, t in self._tasks.items() if t.done()]: del self._tasks[sym]
+            self._flush_ui_updates(config)
+            await self._sleep(min(1.0, self._idle_wait(self.scheduler.seconds_until_next())))
+
+    async def _run_symbol(self, symbol, config, strategies, filters):
+        """Una iteración de un símbolo (misma secuencia y manejo de errores que BotWorker.run)."""
+        try:
+            iteration_start_time = time.time()
+            state = self._get_symbol_state(symbol)
+            symbol_config = self._symbol_config(config, symbol)
+            state.risk_context = (symbol_config, filters)
+            if self._is_strategy_phase(state, symbol_config, iteration_start_time):
+                with self.metrics.timer('iteration'):
+                    await self._run_symbol_iteration_async(state, symbol_config, strategies, filters)
+                self._plan_next_strategy_phase(state, symbol_config, iteration_start_time)
+            else:
+                with self.metrics.timer('risk_check'):
+                    await self._run_risk_check_async(state, symbol_config, filters)
+            state.iterations += 1; state.last_run_at = iteration_start_time
+            self._export_metrics(symbol_config)
+            self._flush_ui_updates(symbol_config)
+
+            if self._running and symbol in self.symbol_states:
+                self.scheduler.schedule(symbol, self._next_due_time(state, symbol_config, filters, iteration_start_time))
+
+        except ccxt.AuthenticationError as e: self._handle_fatal_error("Autenticación", e)
+        except ccxt.NetworkError as e: self._handle_ccxt_error("Red", e, 30, symbol)
+        except Exception as e: self._handle_unexpected_error(e, config.get('loop_interval', 10), symbol)
+
+    @contextlib.asynccontextmanager
+    async def _risk_lock(self, symbol):
+        """
+        risk_lock del símbolo sin bloquear el event loop: si lo tiene el
+        RiskWatchdog se reintenta cada RISK_LOCK_POLL. Es un RLock del hilo
+        del loop; cada símbolo tiene como mucho una tarea en curso.
+        """
+        lock = self._get_symbol_state(symbol).risk_lock
+        while not lock.acquire(blocking=False):
+            await asyncio.sleep(RISK_LOCK_POLL)
+        try: yield
+        finally: lock.release()
+
+    async def _sleep(self, duration):
+        """Espera interrumpible por stop() (corrutina)."""
+        end = time.time() + duration
+        while self._running and time.time() < end:
+            await asyncio.sleep(min(0.5, end - time.time()))
+
+    # --- Fases de la iteración (versión corrutina) ---
+    async def _run_symbol_iteration_async(self, state, config, strategies, filters):
+        fetched_at = time.time()
+        limit = self._determine_ohlcv_limit(config, strategies)
+        with self.metrics.timer('fetch'):
+            market_data = await self._fetch_market_data_async(state.symbol, config, timeframe=config.get('timeframe', '15m'), limit=limit)
+        snapshot = self._build_iteration_snapshot(state, config, strategies, market_data, fetched_at)
+        if snapshot is None: return
+        await self._reconcile_protective_orders_async(state, snapshot)
+
+        with self.metrics.timer('risk_management'):
+            action_taken = await self._manage_open_position_async(snapshot, filters, config)
+        if snapshot.has_position and not action_taken:
+            with self.metrics.timer('inversion'):
+                inversion = self._inversion_signal(snapshot, strategies, config)
+                if inversion is not None:
+                    new_side, reason = inversion
+                    if await self._execute_close_position_async(snapshot, reason):
+                        await self._execute_open_position_async(snapshot, new_side, config, reason)
+                    action_taken = True
+        if not snapshot.has_position and not action_taken:
+            with self.metrics.timer('entry'):
+                for side, reason in self._entry_signals(snapshot, strategies, config):
+                    if await self._execute_open_position_async(snapshot, side, config, reason):
+                        self._reset_and_save_ts_state(snapshot.symbol)
+                        break
+
+    async def _run_risk_check_async(self, state, config, filters):
+        fetched_at = time.time()
+        with self.metrics.timer('fetch_risk'):
+            market_data = await self._fetch_market_data_async(state.symbol, config, parts=('price', 'position'))
+        snapshot = self._build_risk_snapshot(state, config, market_data, fetched_at)
+        if snapshot is None: return
+        await self._reconcile_protective_orders_async(state, snapshot)
+        await self._manage_open_position_async(snapshot, filters, config)
+
+    async def _fetch_market_data_async(self, symbol, config, timeframe='15m', limit=100, parts=MARKET_DATA_PARTS):
+        """Descarga concurrente (asyncio.gather) de las partes pedidas, mismo formato que _fetch_market_data."""
+        cache = self._ohlcv_cache_for(config)
+        feed_price = self._price_from_feed(symbol, config) # Último tick del feed (sin red) si es reciente
+        if feed_price is not None: parts = tuple(p for p in parts if p != 'price')
+        calls = {
+            'price': lambda: aex.fetch_price(self.async_exchange, symbol),
+            'ohlcv': lambda: (cache.get_async(self.async_exchange, symbol, timeframe=timeframe, limit=limit) if cache is not None
+                              else aex.get_ohlcv(self.async_exchange, symbol, timeframe=timeframe, limit=limit)),
+            'balance': lambda: aex.fetch_balance(self.async_exchange, asset='USDT'),
+            'position': lambda: aex.get_position_status(self.async_exchange, symbol),
+        }
+        results = await asyncio.gather(*(calls[part]() for part in parts))
+        data = {part: None for part in MARKET_DATA_PARTS}
+        data.update(zip(parts, results))
+        if feed_price is not None: data['price'] = feed_price
+        return data
+
+    async def _manage_open_position_async(self, snapshot, filters, config):
+        async with self._risk_lock(snapshot.symbol): # El RiskWatchdog evalúa el mismo estado TS
+            for reason in self._risk_exit_signals(snapshot, filters, config, ratchet=False):
+                if await self._execute_close_position_async(snapshot, reason):
+                    return True
+            if filters.get('ts', False) and snapshot.has_position: # Sin cierre: llevar el stop de protección al nivel del TS
+                await self._ratchet_protective_stop_async(self._get_symbol_state(snapshot.symbol), snapshot.position_info, config)
+        return False
+
+    # --- Órdenes (corrutinas; el registro posterior es el de BotWorker) ---
+    async def _execute_open_position_async(self, snapshot, side, config, reason):
+        try:
+            amount_contracts = self._prepare_open_order(snapshot, side, config, reason)
+            if not amount_contracts: return False
+            order_func = aex.open_long_position if side == 'long' else aex.open_short_position
+            with self.metrics.timer('order_open'):
+                order_result = await order_func(self.async_exchange, snapshot.symbol, amount_contracts)
+            opened = self._on_position_opened(snapshot, side, order_result, amount_contracts, reason, config, protective=False)
+            if opened:
+                filled_price, filled_contracts = self._filled_entry(snapshot, order_result, amount_contracts)
+                await self._place_protective_orders_async(snapshot.symbol, side, filled_price or snapshot.price, filled_contracts or amount_contracts, config)
+            return opened
+        except Exception as e: return self._on_open_error(side, e)
+
+    async def _execute_close_position_async(self, snapshot, reason):
+        symbol, position_info = snapshot.symbol, snapshot.position_info
+        async with self._risk_lock(symbol):
+            if self._get_symbol_state(symbol).position_predates_close(snapshot.fetched_at):
+                self.log_signal.emit(f"ℹ️ Cierre ({reason}) omitido: {symbol} ya se cerró tras esta foto."); return False
+            self.log_signal.emit(f"🚪 Cerrar {position_info.get('side','')} {symbol} (Razón: {reason})")
+            try:
+                with self.metrics.timer('order_close'):
+                    order_result = await aex.close_position(self.async_exchange, symbol, position_info)
+                closed = self._on_position_closed(snapshot, order_result, reason, protective=False)
+                if closed: await self._cancel_protective_orders_async(self._get_symbol_state(symbol))
+            except Exception as e: return self._on_close_error(symbol, reason, e)
+        return closed # Espera tras el cierre: _next_due_time
+
+    # --- Órdenes de protección con el exchange asyncio (mismos registros que BotWorker) ---
+    async def _place_protective_orders_async(self, symbol, side, entry_price, amount, config=None):
+        state, config, filters = self._protective_for(symbol, config)
+        if config is None: return
+        try:
+            self._log_protective_placed(symbol, await state.protective.place_async(self.async_exchange, side, entry_price, amount, config, filters), filters)
+        except Exception as e:
+            self.log_signal.emit(f"💥 Error colocando órdenes de protección {symbol}: {e}"); traceback.print_exc()
+
+    async def _ratchet_protective_stop_async(self, state, position_info, config):
+        if state.protective is None or not state.protective.side: return
+        try:
+            new_price = await state.protective.ratchet_async(self.async_exchange, state.trailing_data, position_info, config)
+            if new_price: self.log_signal.emit(f"🛡️ Stop de protección {state.symbol} movido a {new_price:.4f} (Trailing Stop).")
+        except Exception as e:
+            self.log_signal.emit(f"⚠️ Error moviendo el stop de protección {state.symbol}: {e}")
+
+    async def _cancel_protective_orders_async(self, state):
+        if state.protective is None or not state.protective.active: return
+        try:
+            cancelled = await state.protective.cancel_async(self.async_exchange)
+            self.log_signal.emit(f"ℹ️ {cancelled} orden(es) de protección canceladas para {state.symbol}.")
+        except Exception as e:
+            self.log_signal.emit(f"⚠️ Error cancelando órdenes de protección {state.symbol}: {e}")
+
+    def _reconcile_protective_orders(self, state, snapshot):
+        """Las fotos se reconcilian en _reconcile_protective_orders_async (cancelar necesita el exchange asyncio)."""
+
+    async def _reconcile_protective_orders_async(self, state, snapshot):
+        if not self._protection_triggered(state, snapshot): return
+        async with self._risk_lock(state.symbol):
+            open_ids = await fetch_open_order_ids_async(self.async_exchange, state.symbol)
+            self._record_protective_close(state, snapshot, state.protective.filled_kind(open_ids))
+            await self._cancel_protective_orders_async(state)
+            self._reset_and_save_ts_state(state.symbol)
+
+    def _apply_leverage_for_symbol(self, symbol, config):
+        """Igual que BotWorker pero sin bloquear el event loop."""
+        leverage = config.get('leverage')
+        if not leverage or self.async_exchange is None: return
+        asyncio.ensure_future(self._apply_leverage_async(symbol, leverage, config))
+
+    async def _apply_leverage_async(self, symbol, leverage, config):
+        try:
+            params = {"marginType": str(config.get('margin_mode', 'isolated')).lower()}
+            await aex.set_leverage(self.async_exchange, leverage, symbol, params)
+            self.log_signal.emit(f"✅ set_leverage {leverage}x enviado para {symbol}.")
+        except Exception as e:
+            self.log_signal.emit(f"⚠️ No se pudo configurar apalancamiento {leverage}x para {symbol}: {e}")
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import time
+
+import numpy as np
+import pandas as pd
+
+# --- Buffer de velas sobre arrays numpy preasignados ---
+# Sustituye a construir un DataFrame nuevo en cada iteración (lista de
+# listas -> DataFrame -> pd.to_datetime -> set_index, más las copias de
+# calculate_emas y de la gráfica). Las velas se guardan en dos arrays
+# preasignados (timestamps en ms e OHLCV en float) y `frame()` devuelve un
+# DataFrame que es una VISTA de solo lectura sobre ellos: no se copian los
+# valores ni se parsean fechas. Añadir columnas (indicadores) al DataFrame
+# devuelto no toca el buffer.
+# Las filas ya entregadas en una vista no se modifican nunca: si hay que
+# sobrescribir una (la vela en curso) o no queda sitio al final, el bloque
+# activo se pasa a un array nuevo (una sola memcpy), así que un DataFrame
+# publicado a la GUI sigue siendo válido aunque el buffer avance.
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class CandleBuffer:
+    """Velas [ts_ms, o, h, l, c, v] ordenadas por tiempo, con como mucho `capacity` filas."""
+    __slots__ = ('capacity', 'tf_ms', 'updated_at', '_ts', '_values', '_start', '_end', '_exposed')
+
+    def __init__(self, tf_ms, capacity):
+        self.capacity = max(1, int(capacity))
+        self.tf_ms = tf_ms
+        self.updated_at = 0.0
+        self._allocate(0)
+
+    def _allocate(self, keep):
+        """Arrays nuevos (2x capacidad) con las últimas `keep` filas activas al principio."""
+        ts = np.empty(2 * self.capacity, dtype=np.int64)
+        values = np.empty((2 * self.capacity, len(COLUMNS)), dtype=float)
+        if keep:
+            ts[:keep] = self._ts[self._end - keep:self._end]
+            values[:keep] = self._values[self._end - keep:self._end]
+        self._ts, self._values = ts, values
+        self._start, self._end = 0, keep
+        self._exposed = 0 # Filas [0, _exposed) entregadas en alguna vista: no se escriben
+
+    def __len__(self):
+        return self._end - self._start
+
+    def reserve(self, capacity):
+        """Amplía la capacidad a `capacity` filas conservando las velas guardadas (nunca la reduce)."""
+        capacity = int(capacity)
+        if capacity <= self.capacity: return
+        self.capacity = capacity
+        self._allocate(len(self))
+
+    @property
+    def last_ts(self):
+        return int(self._ts[self._end - 1]) if self._end > self._start else None
+
+    # --- Escritura ---
+    def replace(self, rows):
+        """Sustituye todo el contenido por `rows` (respuesta de fetch_ohlcv)."""
+        ts, values = _rows_to_arrays(rows[-self.capacity:] if rows else [])
+        self._allocate(0)
+        n = len(ts)
+        self._ts[:n] = ts; self._values[:n] = values; self._end = n
+        self.updated_at = time.time()
+
+    def merge(self, new_rows):
+        """
+        Fusiona velas nuevas: sobrescribe las de igual timestamp (vela en
+        curso) y añade las posteriores. Devuelve False si hay hueco.
+        """
+        if not new_rows: return True
+        last_ts = self.last_ts
+        if last_ts is not None and new_rows[0][0] > last_ts + self.tf_ms:
+            return False # Hueco: faltan velas entre la última guardada y la primera recibida
+        ts, values = _rows_to_arrays(new_rows)
+        newer = ts > last_ts if last_ts is not None else np.ones(len(ts), dtype=bool)
+
+        # Sobrescribir las velas con el mismo timestamp (normalmente la última)
+        if not newer.all():
+            live = self._ts[self._start:self._end]
+            old_ts, old_values = ts[~newer], values[~newer]
+            pos = np.searchsorted(live, old_ts)
+            found = pos < len(live)
+            found[found] = live[pos[found]] == old_ts[found]
+            if found.any():
+                if self._start + int(pos[found].min()) < self._exposed: self._allocate(len(self)) # Copia antes de escribir
+                self._values[self._start + pos[found]] = old_values[found]
+
+        # Añadir las posteriores
+        add = int(newer.sum())
+        if add:
+            if self._end + add > len(self._ts): self._allocate(min(len(self), max(0, self.capacity - add)))
+            ts, values = ts[newer][-self.capacity:], values[newer][-self.capacity:]
+            add = len(ts)
+            self._ts[self._end:self._end + add] = ts; self._values[self._end:self._end + add] = values
+            self._end += add
+        if len(self) > self.capacity: self._start = self._end - self.capacity
+        self.updated_at = time.time()
+        return True
+
+    # --- Lectura (vistas de solo lectura) ---
+    def _bounds(self, limit):
+        start = self._start if limit is None else max(self._start, self._end - int(limit))
+        self._exposed = max(self._exposed, self._end)
+        return start, self._end
+
+    def timestamps(self, limit=None):
+        """Timestamps en ms de las últimas `limit` velas (vista)."""
+        start, end = self._bounds(limit)
+        return _readonly(self._ts[start:end])
+
+    def column(self, name, limit=None):
+        """Columna 'open'/'high'/'low'/'close'/'volume' de las últimas `limit` velas (vista)."""
+        start, end = self._bounds(limit)
+        return _readonly(self._values[start:end, COLUMNS.index(name)])
+
+    def frame(self, limit=None):
+        """DataFrame con el formato de get_ohlcv (índice 'timestamp' UTC) sobre las últimas `limit` velas, sin copiar valores."""
+        start, end = self._bounds(limit)
+        return _frame(self._ts[start:end], self._values[start:end])
+
+    def rows(self, limit=None):
+        """Velas en bruto (lista de listas) como las devuelve fetch_ohlcv."""
+        start = self._start if limit is None else max(self._start, self._end - int(limit))
+        return [[int(t)] + v for t, v in zip(self._ts[start:self._end].tolist(), self._values[start:self._end].tolist())]
+
+
+def _rows_to_arrays(rows):
+    """Lista de velas de ccxt -> (timestamps int64, valores float (n, 5)). Volumen None -> NaN."""
+    if not len(rows): return np.empty(0, dtype=np.int64), np.empty((0, len(COLUMNS)), dtype=float)
+    data = np.asarray([r[:6] for r in rows], dtype=float)
+    return data[:, 0].astype(np.int64), data[:, 1:]
+
+
+def _readonly(array):
+    view = array.view(); view.flags.writeable = False
+    return view
+
+
+def _frame(ts, values):
+    index = pd.DatetimeIndex(ts.view('datetime64[ms]'), name='timestamp').tz_localize('UTC')
+    return pd.DataFrame(_readonly(values), columns=list(COLUMNS), index=index, copy=False)
+
+
+def candles_to_frame(rows):
+    """Lista de velas de fetch_ohlcv -> DataFrame de get_ohlcv (sin pasar por pd.to_datetime)."""
+    ts, values = _rows_to_arrays(rows)
+    return _frame(ts, values)
@@ -5,12 +5,19 @@ import time
 import traceback
 from datetime import datetime, timezone
 
+from .candle_buffer import candles_to_frame # Velas -> DataFrame sin pd.to_datetime
+from .metrics import timed # Latencia por llamada (p50/p95/p99)
+from .markets_cache import load_markets_cached, DEFAULT_TTL_HOURS
+from .request_scheduler import rate_limited # Prioridad: órdenes > posición/precio > velas/balance
+
 # --- Funciones Principales de Interacción con Exchange ---
 
-def initialize_exchange(api_key, secret_key, exchange_name, default_type='swap', password=None, is_sandbox=False):
+def initialize_exchange(api_key, secret_key, exchange_name, default_type='swap', password=None, is_sandbox=False,
+                        markets_cache=True, markets_cache_ttl=DEFAULT_TTL_HOURS):
     """
     Inicializa y retorna una instancia del exchange especificado usando ccxt.
     Maneja configuración para API keys, tipo de cuenta, contraseña y modo sandbox.
+    Con `markets_cache` los mercados salen del caché en disco (TTL en horas).
     """
     print(f"Debug [Exchange Utils]: Inicializando exchange {exchange_name}...")
 
@@ -58,8 +65,12 @@ def initialize_exchange(api_key, secret_key, exchange_name, default_type='swap',
 
         # Probar conexión cargando mercados (esencial)
         print("Debug [Exchange Utils]: Cargando mercados...")
-        exchange.load_markets(reload=True) # Forzar recarga por si cambian
-        print(f"Debug [Exchange Utils]: Mercados cargados para {exchange_name}.")
+        if markets_cache:
+            source = load_markets_cached(exchange, default_type, is_sandbox, ttl_hours=markets_cache_ttl)
+            print(f"Debug [Exchange Utils]: Mercados cargados para {exchange_name} (origen: {source}).")
+        else:
+            exchange.load_markets(reload=True) # Forzar recarga por si cambian
+            print(f"Debug [Exchange Utils]: Mercados cargados para {exchange_name}.")
 
         # Opcional: Probar fetch_balance para verificar claves API
         # try:
@@ -91,6 +102,8 @@ def initialize_exchange(api_key, secret_key, exchange_name, default_type='swap',
         traceback.print_exc() # Imprimir stack trace completo
         raise e
 
+@rate_limited('fetch_price')
+@timed('fetch_price')
 def fetch_price(exchange, symbol):
     """Obtiene el último precio ('last') para un símbolo usando fetch_ticker."""
     if not exchange or not symbol:
@@ -98,15 +111,7 @@ def fetch_price(exchange, symbol):
         return None
     try:
         ticker = exchange.fetch_ticker(symbol)
-        if 'last' in ticker and ticker['last'] is not None:
-            return float(ticker['last'])
-        else:
-            # Fallback a 'close' si 'last' no está disponible
-            if 'close' in ticker and ticker['close'] is not None:
-                 print(f"Debug [fetch_price]: Usando 'close' en lugar de 'last' para {symbol}")
-                 return float(ticker['close'])
-            print(f"⚠️ No se encontró precio 'last' o 'close' en ticker para {symbol}: {ticker.keys()}")
-            return None
+        return _price_from_ticker(ticker, symbol)
     except ccxt.BadSymbol:
         # Loguear solo una vez por símbolo para evitar spam
         # (podríamos usar un set global o similar si se vuelve muy verboso)
@@ -130,30 +135,21 @@ def get_ohlcv(exchange, symbol, timeframe='15m', limit=100):
     """
     if not exchange or not symbol: return None
     required_limit = limit + 1 # Pedir una vela extra para cálculos que usan diff()
-    try:
-        # print(f"Debug [get_ohlcv]: Obteniendo {required_limit} velas {timeframe} para {symbol}")
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=required_limit)
-        if not ohlcv or len(ohlcv) < required_limit - 10: # Permitir un margen por si faltan datos recientes
-            print(f"⚠️ No se recibieron suficientes datos OHLCV ({len(ohlcv)}/{required_limit}) para {symbol} ({timeframe}).")
-            return None
-
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        # Convertir timestamp a datetime UTC y establecer como índice
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
-        df.set_index('timestamp', inplace=True)
-
-        # Eliminar la última vela si está incompleta (heurística simple)
-        # Comprobar si el timestamp de la última vela es muy reciente
-        # now_utc = datetime.now(timezone.utc)
-        # last_candle_time = df.index[-1]
-        # timeframe_duration = pd.to_timedelta(exchange.timeframes.get(timeframe, '15m')) # Obtener duración
-        # if (now_utc - last_candle_time) < timeframe_duration * 0.9: # Si tiene menos del 90% de duración
-        #      print(f"Debug [get_ohlcv]: Eliminando última vela potencialmente incompleta: {last_candle_time}")
-        #      df = df[:-1]
-
-        # print(f"Debug [get_ohlcv]: OHLCV obtenido. {len(df)} velas. Última: {df.index[-1]}")
-        return df
+    ohlcv = fetch_ohlcv_rows(exchange, symbol, timeframe=timeframe, limit=required_limit)
+    if ohlcv is None: return None
+    return _ohlcv_to_dataframe(ohlcv, symbol, timeframe, required_limit)
 
+@rate_limited('fetch_ohlcv_rows')
+@timed('fetch_ohlcv_rows')
+def fetch_ohlcv_rows(exchange, symbol, timeframe='15m', limit=100, since=None):
+    """
+    Velas en bruto de fetch_ohlcv ([ts_ms, o, h, l, c, v], ...), opcionalmente
+    desde `since` (ms). None si hubo error (ya logueado).
+    """
+    if not exchange or not symbol: return None
+    try:
+        # print(f"Debug [get_ohlcv]: Obteniendo {limit} velas {timeframe} para {symbol}")
+        return exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit)
     except ccxt.BadSymbol:
         print(f"❌ Error: Símbolo '{symbol}' inválido para OHLCV en {exchange.id}.")
         return None
@@ -168,6 +164,8 @@ def get_ohlcv(exchange, symbol, timeframe='15m', limit=100):
         traceback.print_exc()
         return None
 
+@rate_limited('fetch_balance')
+@timed('fetch_balance')
 def fetch_balance(exchange, asset='USDT'):
     """
     Obtiene el balance 'libre' o 'disponible' del asset especificado (usualmente USDT).
@@ -178,44 +176,7 @@ def fetch_balance(exchange, asset='USDT'):
     #print(f"Debug [fetch_balance]: Obteniendo balance para {asset}...")
     try:
         balance = exchange.fetch_balance()
-        free_balance = 0.0
-
-        # Intentar acceso directo al balance libre
-        if asset.upper() in balance and 'free' in balance[asset.upper()]:
-            free_balance = float(balance[asset.upper()]['free'] or 0.0)
-            print(f"Debug [fetch_balance]: Balance Disponible: {free_balance}")
-            return free_balance
-
-        # Intentar acceso común para futuros/swaps via 'info'
-        if 'info' in balance and isinstance(balance['info'], dict):
-            # Binance Futures/Swap: Buscar en 'assets'
-            if 'assets' in balance['info'] and isinstance(balance['info']['assets'], list):
-                for item in balance['info']['assets']:
-                    if item.get('asset') == asset.upper():
-                        # Priorizar 'availableBalance', luego 'walletBalance', luego 0
-                        balance_key = 'availableBalance' if 'availableBalance' in item else 'walletBalance'
-                        free_balance = float(item.get(balance_key, 0.0) or 0.0)
-                        print(f"Debug [fetch_balance]: Balance de 'info' -> 'assets': {free_balance}")
-                        return free_balance
-            # Gate.io Swap: 'total' o 'available'
-            elif 'available' in balance['info'] and balance['info']['currency'] == asset.upper():
-                 free_balance = float(balance['info']['available'] or 0.0)
-                 print(f"Debug [fetch_balance]: Balance de 'info' -> 'available': {free_balance}")
-                 return free_balance
-            elif 'total' in balance['info'] and balance['info']['currency'] == asset.upper(): # Menos ideal pero fallback
-                 free_balance = float(balance['info']['total'] or 0.0)
-                 print(f"Debug [fetch_balance]: Balance de 'info' -> 'total': {free_balance}")
-                 return free_balance
-
-        # Si no se encontró en los lugares comunes
-        print(f"⚠️ No se encontró balance libre/disponible explícito para {asset}. Verificando balance total...")
-        if asset.upper() in balance and 'total' in balance[asset.upper()]:
-             total_balance = float(balance[asset.upper()]['total'] or 0.0)
-             print(f"Debug [fetch_balance]: Usando balance 'total' como fallback: {total_balance}")
-             return total_balance # Devolver total como último recurso
-
-        print(f"⚠️ No se pudo determinar balance para {asset}. Respuesta: {balance.keys()}")
-        return 0.0
+        return _free_balance_from_response(balance, asset)
 
     except ccxt.NetworkError as e:
         print(f"⚠️ Error de Red obteniendo balance: {e}")
@@ -228,6 +189,8 @@ def fetch_balance(exchange, asset='USDT'):
         # traceback.print_exc()
         return 0.0
 
+@rate_limited('get_position_status')
+@timed('get_position_status')
 def get_position_status(exchange, symbol):
     """
     Obtiene y normaliza el estado de la posición abierta para un símbolo en futuros/swap.
@@ -239,153 +202,7 @@ def get_position_status(exchange, symbol):
         # fetch_positions es el método preferido y más estandarizado
         if exchange.has.get('fetchPositions'):
             positions = exchange.fetch_positions([symbol])
-            # Filtrar posiciones realmente abiertas para el símbolo exacto
-            open_positions = [
-                p for p in positions
-                if p.get('symbol') == symbol and abs(float(p.get('contracts', p.get('contractSize', 0)) or 0)) > 1e-9 # Usar abs() y umbral pequeño
-            ]
-
-            if not open_positions:
-                # print(f"Debug [get_position_status]: No hay posición abierta para {symbol}.")
-                return None
-
-            pos = open_positions[0] # Asumir solo una posición por símbolo
-            # print(f"Debug [get_position_status]: Posición encontrada: {pos}") # Log detallado
-            
-            # --- !!! AÑADE ESTE BLOQUE PARA VER LA ESTRUCTURA REAL !!! ---
-            """
-            print("-" * 20)
-            print(f"DEBUG [get_position_status]: Raw 'pos' data for {symbol}:")
-            import pprint
-            pprint.pprint(pos)
-            print("-" * 20)
-            """
-            # -------------------------------------------------------------
-
-            # --- Normalización de Datos ---
-            # Obtener 'side' (long/short)
-            side = pos.get('side')
-            if not side and 'contracts' in pos: # Inferir side si no está explícito
-                 side = 'long' if float(pos['contracts']) > 0 else 'short'
-
-            # Obtener 'contracts' (tamaño en contratos base o asset)
-            contracts = float(pos.get('contracts', pos.get('contractSize', 0)) or 0)
-
-            # Obtener 'entryPrice'
-            entry_price = float(pos.get('entryPrice', pos.get('avgEntryPrice', 0)) or 0)
-
-            # Obtener 'markPrice' (precio actual de mercado para PNL)
-            mark_price = float(pos.get('markPrice', 0) or 0)
-            if mark_price == 0 and 'last' in pos: mark_price = float(pos['last']) # Fallback a last price
-
-            # Obtener 'percentage' (PNL %) - ccxt suele calcularlo
-             # --- PNL% (Cálculo Manual) ---
-            unrealized_pnl = pos.get('unrealizedPnl') # Ya es float o None
-            initial_margin_str = pos.get('info', {}).get('initial_margin') # Obtener de 'info' como string
-
-            pnl_pct = 0.0 # Default
-            if unrealized_pnl is not None and initial_margin_str is not None:
-                try:
-                    initial_margin = float(initial_margin_str)
-                    if initial_margin != 0:
-                        pnl_pct = unrealized_pnl / initial_margin # PNL / Margen Inicial
-                    else:
-                        print("WARN [get_position_status]: Margen inicial es 0, no se puede calcular PNL%.")
-                except (ValueError, TypeError) as calc_e:
-                    print(f"WARN [get_position_status]: Error convirtiendo margen/pnl para cálculo PNL%: {calc_e}")
-            else:
-                 print(f"WARN [get_position_status]: Faltan datos para calcular PNL% (PNL: {unrealized_pnl}, Margen: {initial_margin_str})")
-
-            # Obtener 'liquidationPrice' (importante para riesgo)
-            liquidation_price = float(pos.get('liquidationPrice', 0) or 0)
-
-            # --- Apalancamiento (Usando cross_leverage_limit como fallback) ---
-            leverage_str = pos.get('info', {}).get('cross_leverage_limit') # Obtener de 'info' como string
-            leverage = 0.0 # Default
-            if leverage_str is not None:
-                try:
-                    leverage = float(leverage_str)
-                except (ValueError, TypeError):
-                     print(f"WARN [get_position_status]: No se pudo convertir 'cross_leverage_limit' a float: {leverage_str}")
-            else:
-                 print(f"WARN [get_position_status]: No se encontró 'cross_leverage_limit' en info.")
-                 
-             # 'contractSize': Tamaño del contrato (generalmente 1 para lineales USDT)
-            contract_size = 1.0 # Default razonable para lineales
-            try:
-                cs_val = pos.get('contractSize')
-                if cs_val is not None:
-                    contract_size = float(cs_val)
-            except (ValueError, TypeError):
-                print(f"WARN [get_position_status]: No se pudo convertir contractSize '{pos.get('contractSize')}' a float.")
-
-            # 'datetime': Timestamp de apertura de la posición (string ISO 8601)
-            position_datetime = pos.get('datetime') # Ya es string o None
-
-            # 'marginMode': Modo de margen ('cross' o 'isolated')
-            margin_mode = pos.get('marginMode') # Ya es string o None
-
-            # 'stopLossPrice': Precio de Stop Loss (si está definido en la posición)
-            # La API lo devuelve como None si no está fijado
-            stop_loss_price = pos.get('stopLossPrice')
-            if stop_loss_price is not None:
-                 try: stop_loss_price = float(stop_loss_price)
-                 except (ValueError, TypeError): stop_loss_price = None # Volver a None si no es convertible
-
-            # 'takeProfitPrice': Precio de Take Profit (si está definido en la posición)
-            take_profit_price = pos.get('takeProfitPrice')
-            if take_profit_price is not None:
-                 try: take_profit_price = float(take_profit_price)
-                 except (ValueError, TypeError): take_profit_price = None # Volver a None si no es convertible
-                 
-            # 'pending_orders': Número de órdenes pendientes asociadas (desde 'info')
-            pending_orders_str = pos.get('info', {}).get('pending_orders')
-            pending_orders = 0 # Default
-            if pending_orders_str is not None:
-                try:
-                    pending_orders = int(pending_orders_str)
-                except (ValueError, TypeError):
-                    print(f"WARN [get_position_status]: No se pudo convertir pending_orders '{pending_orders_str}' a int.")
-                    
-            # 'initial_margin': Margen inicial (desde 'info', ya lo obtuvimos para PNL%)
-            # Lo añadimos explícitamente como float si está disponible
-            initial_margin_float = None
-            # 'initial_margin_str' debería existir desde el cálculo de PNL%
-            if 'initial_margin_str' in locals() and initial_margin_str is not None:
-                try:
-                    initial_margin_float = float(initial_margin_str)
-                except (ValueError, TypeError):
-                    pass # El warning ya se mostró antes si falló                  
-
-            # Validaciones básicas
-            if not side or abs(contracts) < 1e-9 or entry_price <= 0:
-                 print(f"Debug [get_position_status]: Datos de posición inválidos o incompletos: Side={side}, Contracts={contracts}, Entry={entry_price}")
-                 return None
-
-            return {
-                'symbol': symbol,
-                'side': side,
-                'contracts': abs(contracts), # Devolver siempre positivo, el lado indica dirección
-                'entry_price': entry_price,
-                'mark_price': mark_price,
-                'pnl_pct': pnl_pct,
-                'liquidation_price': liquidation_price,
-                'leverage': leverage,
-                # Puedes añadir 'unrealizedPnl', 'margin', etc. si los necesitas
-                # Puedes añadir más datos si los necesitas
-                'unrealizedPnl_debug': unrealized_pnl, # Opcional para depurar
-                'initialMargin_debug': initial_margin if 'initial_margin' in locals() else None, # Opcional
-                
-                # --- NUEVOS CAMPOS AÑADIDOS ---
-                'contractSize': contract_size,           # Float
-                'datetime': position_datetime,         # String (ISO format) or None
-                'marginMode': margin_mode,             # String ('cross', 'isolated') or None
-                'stopLossPrice': stop_loss_price,       # Float or None
-                'takeProfitPrice': take_profit_price,   # Float or None
-                'unrealizedPnl': unrealized_pnl,         # Float or None (obtenido antes)
-                'pendingOrders': pending_orders,       # Integer
-                'initialMargin': initial_margin_float,   # Float or None (obtenido antes)
-            }
+            return _normalize_position(positions, symbol)
         else:
             print(f"⚠️ ADVERTENCIA: {exchange.id} no soporta `fetchPositions`. No se puede obtener estado de posición.")
             return None
@@ -447,6 +264,8 @@ def calculate_order_size(usdt_balance, trade_pct, leverage, price, contract_size
           print(f"❌ Error calculando tamaño de orden: {e}")
           return 0.0
 
+@rate_limited('open_long_position')
+@timed('open_long_position')
 def open_long_position(exchange, symbol, amount_contracts):
     """Abre una posición larga (compra) usando una orden MARKET."""
     if not exchange or not symbol or amount_contracts <= 0:
@@ -476,6 +295,8 @@ def open_long_position(exchange, symbol, amount_contracts):
         traceback.print_exc()
         raise e # Re-lanzar para visibilidad
 
+@rate_limited('open_short_position')
+@timed('open_short_position')
 def open_short_position(exchange, symbol, amount_contracts):
     """Abre una posición corta (venta) usando una orden MARKET."""
     if not exchange or not symbol or amount_contracts <= 0:
@@ -503,28 +324,18 @@ def open_short_position(exchange, symbol, amount_contracts):
         traceback.print_exc()
         raise e
 
+@rate_limited('close_position')
+@timed('close_position')
 def close_position(exchange, symbol, position_info):
     """
     Cierra la posición abierta actual para el símbolo usando una orden MARKET.
     Utiliza el parámetro 'reduceOnly'.
     `position_info` debe ser el diccionario devuelto por `get_position_status`.
     """
-    if not exchange or not symbol or not position_info or abs(position_info.get('contracts', 0)) < 1e-9:
-        print(f"Debug [Close Position]: No hay posición válida para cerrar en {symbol}.")
-        return None # No hay nada que cerrar o datos inválidos
-
-    side_to_close = position_info['side']
-    contracts_to_close = abs(position_info['contracts']) # Usar valor absoluto
-
-    print(f"Debug [Close Position]: Creando orden MARKET para cerrar {side_to_close} de {contracts_to_close} contratos en {symbol}")
-
     try:
-        # Asegurar cantidad con precisión correcta
-        formatted_amount = exchange.amount_to_precision(symbol, contracts_to_close)
-        amount = float(formatted_amount)
-        if amount <= 0:
-             print(f"Error [Close Position]: Cantidad a cerrar formateada es inválida: {amount}")
-             return None
+        close_plan = _close_order_amount(exchange, symbol, position_info)
+        if close_plan is None: return None
+        side_to_close, amount = close_plan
 
         # Parámetro para asegurar que solo reduce o cierra la posición
         params = {'reduceOnly': True}
@@ -563,4 +374,262 @@ def close_position(exchange, symbol, position_info):
     except Exception as e:
         print(f"❌ Error inesperado cerrando posición para {symbol}: {e}")
         traceback.print_exc()
-        raise e # Re-lanzar
\ No newline at end of file
+        raise e # Re-lanzar
+
+
+@rate_limited('set_leverage')
+@timed('set_leverage')
+def set_leverage(exchange, leverage, symbol, params=None):
+    """
+    exchange.set_leverage pasando por el planificador de peticiones (como las
+    órdenes). Los errores se propagan: cada llamador decide cómo avisarlos.
+    """
+    return exchange.set_leverage(leverage, symbol, params or {})
+
+
+# --- Helpers de parseo (compartidos con core/async_exchange_utils) ---
+# Solo transforman respuestas ya recibidas de ccxt: no hacen peticiones,
+# así sirven igual para la versión síncrona y la asíncrona (asyncio).
+
+def _price_from_ticker(ticker, symbol):
+    """Extrae el último precio ('last', o 'close' como fallback) de un ticker ccxt."""
+    if 'last' in ticker and ticker['last'] is not None:
+        return float(ticker['last'])
+    else:
+        # Fallback a 'close' si 'last' no está disponible
+        if 'close' in ticker and ticker['close'] is not None:
+             print(f"Debug [fetch_price]: Usando 'close' en lugar de 'last' para {symbol}")
+             return float(ticker['close'])
+        print(f"⚠️ No se encontró precio 'last' o 'close' en ticker para {symbol}: {ticker.keys()}")
+        return None
+
+def _ohlcv_to_dataframe(ohlcv, symbol, timeframe, required_limit):
+    """Convierte la lista de velas de fetch_ohlcv en DataFrame indexado por timestamp UTC (None si faltan datos)."""
+    if not ohlcv or len(ohlcv) < required_limit - 10: # Permitir un margen por si faltan datos recientes
+        print(f"⚠️ No se recibieron suficientes datos OHLCV ({len(ohlcv)}/{required_limit}) para {symbol} ({timeframe}).")
+        return None
+
+    # Índice 'timestamp' UTC directamente desde los ms (vista datetime64, sin parsear fechas)
+    df = candles_to_frame(ohlcv)
+
+    # Eliminar la última vela si está incompleta (heurística simple)
+    # Comprobar si el timestamp de la última vela es muy reciente
+    # now_utc = datetime.now(timezone.utc)
+    # last_candle_time = df.index[-1]
+    # timeframe_duration = pd.to_timedelta(exchange.timeframes.get(timeframe, '15m')) # Obtener duración
+    # if (now_utc - last_candle_time) < timeframe_duration * 0.9: # Si tiene menos del 90% de duración
+    #      print(f"Debug [get_ohlcv]: Eliminando última vela potencialmente incompleta: {last_candle_time}")
+    #      df = df[:-1]
+
+    # print(f"Debug [get_ohlcv]: OHLCV obtenido. {len(df)} velas. Última: {df.index[-1]}")
+    return df
+
+def _free_balance_from_response(balance, asset):
+    """Extrae el balance libre/disponible de `asset` de la respuesta de fetch_balance."""
+    free_balance = 0.0
+
+    # Intentar acceso directo al balance libre
+    if asset.upper() in balance and 'free' in balance[asset.upper()]:
+        free_balance = float(balance[asset.upper()]['free'] or 0.0)
+        print(f"Debug [fetch_balance]: Balance Disponible: {free_balance}")
+        return free_balance
+
+    # Intentar acceso común para futuros/swaps via 'info'
+    if 'info' in balance and isinstance(balance['info'], dict):
+        # Binance Futures/Swap: Buscar en 'assets'
+        if 'assets' in balance['info'] and isinstance(balance['info']['assets'], list):
+            for item in balance['info']['assets']:
+                if item.get('asset') == asset.upper():
+                    # Priorizar 'availableBalance', luego 'walletBalance', luego 0
+                    balance_key = 'availableBalance' if 'availableBalance' in item else 'walletBalance'
+                    free_balance = float(item.get(balance_key, 0.0) or 0.0)
+                    print(f"Debug [fetch_balance]: Balance de 'info' -> 'assets': {free_balance}")
+                    return free_balance
+        # Gate.io Swap: 'total' o 'available'
+        elif 'available' in balance['info'] and balance['info']['currency'] == asset.upper():
+             free_balance = float(balance['info']['available'] or 0.0)
+             print(f"Debug [fetch_balance]: Balance de 'info' -> 'available': {free_balance}")
+             return free_balance
+        elif 'total' in balance['info'] and balance['info']['currency'] == asset.upper(): # Menos ideal pero fallback
+             free_balance = float(balance['info']['total'] or 0.0)
+             print(f"Debug [fetch_balance]: Balance de 'info' -> 'total': {free_balance}")
+             return free_balance
+
+    # Si no se encontró en los lugares comunes
+    print(f"⚠️ No se encontró balance libre/disponible explícito para {asset}. Verificando balance total...")
+    if asset.upper() in balance and 'total' in balance[asset.upper()]:
+         total_balance = float(balance[asset.upper()]['total'] or 0.0)
+         print(f"Debug [fetch_balance]: Usando balance 'total' como fallback: {total_balance}")
+         return total_balance # Devolver total como último recurso
+
+    print(f"⚠️ No se pudo determinar balance para {asset}. Respuesta: {balance.keys()}")
+    return 0.0
+
+def _normalize_position(positions, symbol):
+    """Normaliza la respuesta de fetch_positions a la posición abierta de `symbol` (None si no hay)."""
+    # Filtrar posiciones realmente abiertas para el símbolo exacto
+    open_positions = [
+        p for p in positions
+        if p.get('symbol') == symbol and abs(float(p.get('contracts', p.get('contractSize', 0)) or 0)) > 1e-9 # Usar abs() y umbral pequeño
+    ]
+
+    if not open_positions:
+        # print(f"Debug [get_position_status]: No hay posición abierta para {symbol}.")
+        return None
+
+    pos = open_positions[0] # Asumir solo una posición por símbolo
+    # print(f"Debug [get_position_status]: Posición encontrada: {pos}") # Log detallado
+    
+    # --- !!! AÑADE ESTE BLOQUE PARA VER LA ESTRUCTURA REAL !!! ---
+    """
+    print("-" * 20)
+    print(f"DEBUG [get_position_status]: Raw 'pos' data for {symbol}:")
+    import pprint
+    pprint.pprint(pos)
+    print("-" * 20)
+    """
+    # -------------------------------------------------------------
+
+    # --- Normalización de Datos ---
+    # Obtener 'side' (long/short)
+    side = pos.get('side')
+    if not side and 'contracts' in pos: # Inferir side si no está explícito
+         side = 'long' if float(pos['contracts']) > 0 else 'short'
+
+    # Obtener 'contracts' (tamaño en contratos base o asset)
+    contracts = float(pos.get('contracts', pos.get('contractSize', 0)) or 0)
+
+    # Obtener 'entryPrice'
+    entry_price = float(pos.get('entryPrice', pos.get('avgEntryPrice', 0)) or 0)
+
+    # Obtener 'markPrice' (precio actual de mercado para PNL)
+    mark_price = float(pos.get('markPrice', 0) or 0)
+    if mark_price == 0 and 'last' in pos: mark_price = float(pos['last']) # Fallback a last price
+
+    # Obtener 'percentage' (PNL %) - ccxt suele calcularlo
+     # --- PNL% (Cálculo Manual) ---
+    unrealized_pnl = pos.get('unrealizedPnl') # Ya es float o None
+    initial_margin_str = pos.get('info', {}).get('initial_margin') # Obtener de 'info' como string
+
+    pnl_pct = 0.0 # Default
+    if unrealized_pnl is not None and initial_margin_str is not None:
+        try:
+            initial_margin = float(initial_margin_str)
+            if initial_margin != 0:
+                pnl_pct = unrealized_pnl / initial_margin # PNL / Margen Inicial
+            else:
+                print("WARN [get_position_status]: Margen inicial es 0, no se puede calcular PNL%.")
+        except (ValueError, TypeError) as calc_e:
+            print(f"WARN [get_position_status]: Error convirtiendo margen/pnl para cálculo PNL%: {calc_e}")
+    else:
+         print(f"WARN [get_position_status]: Faltan datos para calcular PNL% (PNL: {unrealized_pnl}, Margen: {initial_margin_str})")
+
+    # Obtener 'liquidationPrice' (importante para riesgo)
+    liquidation_price = float(pos.get('liquidationPrice', 0) or 0)
+
+    # --- Apalancamiento (Usando cross_leverage_limit como fallback) ---
+    leverage_str = pos.get('info', {}).get('cross_leverage_limit') # Obtener de 'info' como string
+    leverage = 0.0 # Default
+    if leverage_str is not None:
+        try:
+            leverage = float(leverage_str)
+        except (ValueError, TypeError):
+             print(f"WARN [get_position_status]: No se pudo convertir 'cross_leverage_limit' a float: {leverage_str}")
+    else:
+         print(f"WARN [get_position_status]: No se encontró 'cross_leverage_limit' en info.")
+         
+     # 'contractSize': Tamaño del contrato (generalmente 1 para lineales USDT)
+    contract_size = 1.0 # Default razonable para lineales
+    try:
+        cs_val = pos.get('contractSize')
+        if cs_val is not None:
+            contract_size = float(cs_val)
+    except (ValueError, TypeError):
+        print(f"WARN [get_position_status]: No se pudo convertir contractSize '{pos.get('contractSize')}' a float.")
+
+    # 'datetime': Timestamp de apertura de la posición (string ISO 8601)
+    position_datetime = pos.get('datetime') # Ya es string o None
+
+    # 'marginMode': Modo de margen ('cross' o 'isolated')
+    margin_mode = pos.get('marginMode') # Ya es string o None
+
+    # 'stopLossPrice': Precio de Stop Loss (si está definido en la posición)
+    # La API lo devuelve como None si no está fijado
+    stop_loss_price = pos.get('stopLossPrice')
+    if stop_loss_price is not None:
+         try: stop_loss_price = float(stop_loss_price)
+         except (ValueError, TypeError): stop_loss_price = None # Volver a None si no es convertible
+
+    # 'takeProfitPrice': Precio de Take Profit (si está definido en la posición)
+    take_profit_price = pos.get('takeProfitPrice')
+    if take_profit_price is not None:
+         try: take_profit_price = float(take_profit_price)
+         except (ValueError, TypeError): take_profit_price = None # Volver a None si no es convertible
+         
+    # 'pending_orders': Número de órdenes pendientes asociadas (desde 'info')
+    pending_orders_str = pos.get('info', {}).get('pending_orders')
+    pending_orders = 0 # Default
+    if pending_orders_str is not None:
+        try:
+            pending_orders = int(pending_orders_str)
+        except (ValueError, TypeError):
+            print(f"WARN [get_position_status]: No se pudo convertir pending_orders '{pending_orders_str}' a int.")
+            
+    # 'initial_margin': Margen inicial (desde 'info', ya lo obtuvimos para PNL%)
+    # Lo añadimos explícitamente como float si está disponible
+    initial_margin_float = None
+    # 'initial_margin_str' debería existir desde el cálculo de PNL%
+    if 'initial_margin_str' in locals() and initial_margin_str is not None:
+        try:
+            initial_margin_float = float(initial_margin_str)
+        except (ValueError, TypeError):
+            pass # El warning ya se mostró antes si falló                  
+
+    # Validaciones básicas
+    if not side or abs(contracts) < 1e-9 or entry_price <= 0:
+         print(f"Debug [get_position_status]: Datos de posición inválidos o incompletos: Side={side}, Contracts={contracts}, Entry={entry_price}")
+         return None
+
+    return {
+        'symbol': symbol,
+        'side': side,
+        'contracts': abs(contracts), # Devolver siempre positivo, el lado indica dirección
+        'entry_price': entry_price,
+        'mark_price': mark_price,
+        'pnl_pct': pnl_pct,
+        'liquidation_price': liquidation_price,
+        'leverage': leverage,
+        # Puedes añadir 'unrealizedPnl', 'margin', etc. si los necesitas
+        # Puedes añadir más datos si los necesitas
+        'unrealizedPnl_debug': unrealized_pnl, # Opcional para depurar
+        'initialMargin_debug': initial_margin if 'initial_margin' in locals() else None, # Opcional
+        
+        # --- NUEVOS CAMPOS AÑADIDOS ---
+        'contractSize': contract_size,           # Float
+        'datetime': position_datetime,         # String (ISO format) or None
+        'marginMode': margin_mode,             # String ('cross', 'isolated') or None
+        'stopLossPrice': stop_loss_price,       # Float or None
+        'takeProfitPrice': take_profit_price,   # Float or None
+        'unrealizedPnl': unrealized_pnl,         # Float or None (obtenido antes)
+        'pendingOrders': pending_orders,       # Integer
+        'initialMargin': initial_margin_float,   # Float or None (obtenido antes)
+    }
+
+def _close_order_amount(exchange, symbol, position_info):
+    """Lado y cantidad (con precisión del mercado) para cerrar la posición; None si no es válida."""
+    if not exchange or not symbol or not position_info or abs(position_info.get('contracts', 0)) < 1e-9:
+        print(f"Debug [Close Position]: No hay posición válida para cerrar en {symbol}.")
+        return None # No hay nada que cerrar o datos inválidos
+
+    side_to_close = position_info['side']
+    contracts_to_close = abs(position_info['contracts']) # Usar valor absoluto
+
+    print(f"Debug [Close Position]: Creando orden MARKET para cerrar {side_to_close} de {contracts_to_close} contratos en {symbol}")
+
+    # Asegurar cantidad con precisión correcta
+    formatted_amount = exchange.amount_to_precision(symbol, contracts_to_close)
+    amount = float(formatted_amount)
+    if amount <= 0:
+         print(f"Error [Close Position]: Cantidad a cerrar formateada es inválida: {amount}")
+         return None
+    return side_to_close, amount
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Optional
+
+import pandas as pd
+
+# --- Foto inmutable de los datos de mercado de UNA iteración ---
+# Se descarga una vez (ver parallel_fetch) y todas las fases (filtros,
+# estrategias, inversión y órdenes) leen los mismos datos sin volver a
+# pedir precio/balance al exchange.
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    symbol: str
+    timeframe: str
+    price: Optional[float]
+    ohlcv: Optional[pd.DataFrame] = None # DataFrame con indicadores ya calculados
+    balance: Optional[float] = None
+    position: Optional[Any] = None # dict normalizado de get_position_status (o None)
+    fetched_at: float = field(default_factory=time.time) # Epoch (s) del inicio de la descarga
+    timings: Any = field(default_factory=dict) # Segundos por parte ('price', 'ohlcv', ...)
+
+    def __post_init__(self):
+        # Congelar también los contenedores mutables (el DataFrame se comparte tal cual)
+        if isinstance(self.position, dict): object.__setattr__(self, 'position', MappingProxyType(dict(self.position)))
+        object.__setattr__(self, 'timings', MappingProxyType(dict(self.timings or {})))
+
+    @classmethod
+    def from_market_data(cls, symbol, timeframe, market_data, fetched_at=None, **overrides):
+        """Construye la foto a partir del dict que devuelve _fetch_market_data / MarketDataFetcher."""
+        values = {
+            'price': market_data.get('price'),
+            'ohlcv': market_data.get('ohlcv'),
+            'balance': market_data.get('balance'),
+            'position': market_data.get('position'),
+            'timings': market_data.get('timings') or {},
+        }
+        values.update(overrides)
+        return cls(symbol=symbol, timeframe=timeframe, fetched_at=fetched_at or time.time(), **values)
+
+    @property
+    def position_info(self):
+        """Posición como dict normal (lo que esperan filtros, estrategias y órdenes) o None."""
+        return dict(self.position) if self.position else None
+
+    @property
+    def has_position(self):
+        return bool(self.position)
+
+    @property
+    def position_side(self):
+        return str(self.position.get('side', '')).lower() if self.position else ''
+
+    def __repr__(self):
+        return (f"MarketSnapshot({self.symbol!r}, price={self.price}, balance={self.balance}, "
+                f"pos={self.position_side or 'no'}, velas={0 if self.ohlcv is None else len(self.ohlcv)})")
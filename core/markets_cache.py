@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+import time
+import traceback
+
+import ccxt
+
+# --- Caché en disco de mercados (load_markets) ---
+# load_markets descarga varios MB de metadatos (Gate, Binance) y tarda segundos
+# en cada arranque. Se guardan markets y currencies en un JSON versionado por
+# exchange/tipo/sandbox: si está fresco (< TTL) se usa sin red; si está
+# caducado se usa igualmente y se refresca en segundo plano; si no existe,
+# es de otra versión o está corrupto se hace el load_markets de siempre.
+
+CACHE_VERSION = 1 # Subir si cambia el formato del archivo
+DEFAULT_CACHE_DIR = os.path.expanduser("~/Documents/BOT_TRADING/cache/markets")
+DEFAULT_TTL_HOURS = 12
+
+_refresh_lock = threading.Lock()
+_refreshing = set() # Archivos con un refresco en segundo plano en curso
+
+# Atributos que rellena set_markets (ccxt): se pasan ya construidos de un clon
+MARKET_ATTRS = ('markets_by_id', 'symbols', 'ids', 'currencies', 'currencies_by_id', 'codes',
+                'baseCurrencies', 'quoteCurrencies', 'markets')
+
+
+def cache_path(exchange, default_type=None, is_sandbox=False, cache_dir=DEFAULT_CACHE_DIR):
+    """Un archivo por exchange + tipo de cuenta + sandbox (los mercados difieren)."""
+    default_type = default_type or exchange.options.get('defaultType', 'spot')
+    name = f"{exchange.id}_{default_type}{'_sandbox' if is_sandbox else ''}.json"
+    return os.path.join(os.path.expanduser(cache_dir), name)
+
+
+def read_cache(path):
+    """Devuelve el contenido del caché o None si no existe, es de otra versión o está corrupto."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Caché de mercados ilegible ({path}): {e}. Se ignorará.")
+        return None
+    if data.get('version') != CACHE_VERSION or data.get('ccxt_version') != ccxt.__version__:
+        print(f"Debug [Markets Cache]: Caché {os.path.basename(path)} de otra versión. Se ignorará.")
+        return None
+    if not data.get('markets'): return None
+    return data
+
+
+def write_cache(path, exchange):
+    """Guarda markets/currencies de forma atómica (tmp + rename)."""
+    payload = {
+        'version': CACHE_VERSION, 'ccxt_version': ccxt.__version__, 'exchange': exchange.id,
+        'saved_at': time.time(),
+        'markets': list(exchange.markets.values()) if exchange.markets else [],
+        'currencies': exchange.currencies or {},
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def load_markets_cached(exchange, default_type=None, is_sandbox=False, ttl_hours=DEFAULT_TTL_HOURS,
+                        cache_dir=DEFAULT_CACHE_DIR, background_refresh=True):
+    """
+    Carga los mercados en `exchange` usando el caché en disco si es posible.
+    Devuelve 'fresh', 'stale' (usado + refresco en segundo plano) o 'network'.
+    """
+    path = cache_path(exchange, default_type, is_sandbox, cache_dir)
+    data = read_cache(path)
+    if data is not None:
+        try:
+            exchange.set_markets(data['markets'], data.get('currencies') or None)
+        except Exception as e:
+            print(f"⚠️ Caché de mercados inválido ({path}): {e}. Recargando desde el exchange.")
+            data = None
+
+    if data is None:
+        exchange.load_markets(reload=True)
+        try: write_cache(path, exchange)
+        except Exception as e: print(f"⚠️ No se pudo guardar el caché de mercados: {e}")
+        return 'network'
+
+    age_hours = (time.time() - float(data.get('saved_at', 0))) / 3600.0
+    if age_hours < float(ttl_hours): return 'fresh'
+    print(f"Debug [Markets Cache]: Caché con {age_hours:.1f}h (TTL {ttl_hours}h). Refrescando en segundo plano...")
+    if background_refresh: refresh_in_background(exchange, path)
+    return 'stale'
+
+
+def swap_markets(exchange, source):
+    """
+    Pasa a `exchange` los mercados ya cargados en `source` con una asignación
+    por atributo. set_markets reconstruye los diccionarios sobre la propia
+    instancia (el hilo dueño vería mercados a medias); así cada lectura ve
+    el diccionario anterior o el nuevo, completo.
+    """
+    for attr in MARKET_ATTRS:
+        if hasattr(source, attr): setattr(exchange, attr, getattr(source, attr))
+
+
+def refresh_in_background(exchange, path):
+    """
+    Descarga los mercados en un hilo con un clon (las instancias ccxt no son
+    seguras entre hilos), actualiza el archivo y luego cambia los mercados
+    de `exchange` por los del clon (swap_markets).
+    """
+    with _refresh_lock:
+        if path in _refreshing: return None
+        _refreshing.add(path)
+
+    def _refresh():
+        try:
+            from .parallel_fetch import clone_exchange
+            clone = clone_exchange(exchange)
+            clone.load_markets(reload=True)
+            write_cache(path, clone)
+            swap_markets(exchange, clone)
+            print(f"Debug [Markets Cache]: Mercados de {exchange.id} refrescados ({len(clone.markets)}).")
+        except Exception as e:
+            print(f"⚠️ Falló el refresco en segundo plano de los mercados de {exchange.id}: {e}")
+            traceback.print_exc()
+        finally:
+            with _refresh_lock: _refreshing.discard(path)
+
+    thread = threading.Thread(target=_refresh, name=f"markets-refresh-{exchange.id}", daemon=True)
+    thread.start()
+    return thread
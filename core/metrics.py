@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import functools
+import inspect
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# --- Métricas de latencia del worker ---
+# Histogramas "rodantes" (últimas N muestras) por etapa del bucle y por
+# llamada a exchange_utils, con p50/p95/p99. Se exportan a un archivo JSON
+# o en formato de texto Prometheus cada N iteraciones (ver BotWorker).
+# Registrar una muestra es O(1); los percentiles solo se calculan al exportar.
+
+DEFAULT_WINDOW = 1000 # Muestras por histograma
+QUANTILES = (0.5, 0.95, 0.99)
+
+FAMILIES = {
+    'stage': ('bot_stage_seconds', 'Duración de cada etapa del bucle del worker'),
+    'exchange': ('bot_exchange_call_seconds', 'Duración de cada llamada a exchange_utils'),
+    'queue': ('bot_request_queue_seconds', 'Espera en el planificador de peticiones por prioridad'),
+}
+
+
+def _percentile(sorted_values, q):
+    """Percentil por interpolación lineal (igual que numpy.percentile por defecto)."""
+    if not sorted_values: return None
+    pos = (len(sorted_values) - 1) * q
+    low, high = math.floor(pos), math.ceil(pos)
+    if low == high: return sorted_values[low]
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+class RollingHistogram:
+    """Últimas `window` muestras + totales acumulados (count, sum, errores)."""
+    __slots__ = ('samples', 'count', 'total', 'errors', 'max_seen')
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0; self.total = 0.0; self.errors = 0; self.max_seen = 0.0
+
+    def observe(self, seconds, error=False):
+        self.samples.append(seconds)
+        self.count += 1; self.total += seconds
+        if seconds > self.max_seen: self.max_seen = seconds
+        if error: self.errors += 1
+
+    def summary(self):
+        values = sorted(self.samples)
+        data = {'count': self.count, 'sum': round(self.total, 6), 'errors': self.errors,
+                'window': len(values), 'max': round(self.max_seen, 6),
+                'mean': round(sum(values) / len(values), 6) if values else None}
+        for q in QUANTILES:
+            p = _percentile(values, q)
+            data[f"p{int(q * 100)}"] = round(p, 6) if p is not None else None
+        return data
+
+
+class LatencyMetrics:
+    """Registro de histogramas por (familia, nombre). Seguro entre hilos."""
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self._hists = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def observe(self, family, name, seconds, error=False):
+        key = (family, name)
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = RollingHistogram(self.window); self._hists[key] = hist
+            hist.observe(seconds, error)
+
+    @contextmanager
+    def timer(self, name, family='stage'):
+        """`with metrics.timer('fetch'):` mide el bloque (también si lanza excepción)."""
+        start = time.perf_counter(); error = False
+        try:
+            yield
+        except BaseException:
+            error = True; raise
+        finally:
+            self.observe(family, name, time.perf_counter() - start, error)
+
+    def reset(self):
+        with self._lock: self._hists.clear()
+        self.started_at = time.time()
+
+    def snapshot(self):
+        """{'stage': {nombre: resumen}, 'exchange': {...}} con p50/p95/p99."""
+        with self._lock:
+            items = [(key, hist.summary()) for key, hist in self._hists.items()]
+        data = {family: {} for family in FAMILIES}
+        for (family, name), summary in sorted(items):
+            data.setdefault(family, {})[name] = summary
+        return data
+
+    # --- Exportación ---
+    def to_json(self, extra=None):
+        payload = {'generated_at': time.time(), 'started_at': self.started_at, 'metrics': self.snapshot()}
+        if extra: payload.update(extra)
+        return json.dumps(payload, indent=2, ensure_ascii=False)
+
+    def to_prometheus(self, extra_labels=None):
+        """Formato de texto de Prometheus: un summary de latencias y un counter de errores por familia."""
+        base = "".join(f',{k}="{_escape(v)}"' for k, v in (extra_labels or {}).items())
+        lines = []
+        for family, metrics in self.snapshot().items():
+            metric, help_text = FAMILIES.get(family, (f"bot_{family}_seconds", family))
+            label = {'stage': 'stage', 'queue': 'priority'}.get(family, 'call')
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for name, s in metrics.items():
+                labels = f'{label}="{_escape(name)}"{base}'
+                for q in QUANTILES:
+                    value = s.get(f"p{int(q * 100)}")
+                    if value is not None: lines.append(f'{metric}{{{labels},quantile="{q}"}} {value}')
+                lines.append(f"{metric}_count{{{labels}}} {s['count']}")
+                lines.append(f"{metric}_sum{{{labels}}} {s['sum']}")
+            # Errores: familia propia (counter); un summary solo admite quantile/_count/_sum
+            errors = f"{metric[:-len('_seconds')] if metric.endswith('_seconds') else metric}_errors_total"
+            lines.append(f"# HELP {errors} Muestras de {metric} que terminaron con excepción")
+            lines.append(f"# TYPE {errors} counter")
+            for name, s in metrics.items():
+                lines.append(f'{errors}{{{label}="{_escape(name)}"{base}}} {s["errors"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, fmt='json', extra_labels=None):
+        """Escribe el archivo de forma atómica (tmp + rename) para no servir lecturas a medias."""
+        path = os.path.expanduser(path)
+        text = self.to_prometheus(extra_labels) if str(fmt).lower() in ('prometheus', 'prom') else self.to_json(extra_labels)
+        folder = os.path.dirname(path)
+        if folder: os.makedirs(folder, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f: f.write(text)
+        os.replace(tmp_path, path)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Registro global (compartido por worker, exchange_utils y clones del pool de descarga)
+METRICS = LatencyMetrics()
+
+
+def timed(name, family='exchange', metrics=None):
+    """Decorador que mide una función (síncrona o corrutina) en el registro de métricas."""
+    registry = metrics or METRICS
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with registry.timer(name, family):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with registry.timer(name, family):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
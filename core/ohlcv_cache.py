@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from .candle_buffer import CandleBuffer
+from .exchange_utils import fetch_ohlcv_rows
+from . import async_exchange_utils as aex
+from .scheduler import timeframe_to_seconds
+
+# --- Caché incremental de velas por (símbolo, timeframe) ---
+# En régimen estable solo cambia la última vela (la que está en curso):
+# en vez de descargar `limit+1` velas en cada iteración se piden solo las
+# velas desde el timestamp de la última guardada (fetch_ohlcv(since=...)),
+# se sobrescribe la vela en curso y se añaden las nuevas.
+# Si se detecta un hueco (faltan velas entre lo guardado y lo recibido) o
+# el histórico guardado no alcanza el `limit` pedido, se recarga completo.
+# Las velas viven en un CandleBuffer (arrays numpy) y `get()` devuelve una
+# vista DataFrame de solo lectura: no se reconstruye el DataFrame cada vez.
+
+DEFAULT_MAX_CANDLES = 1000 # Tamaño del buffer por clave (crece si se piden más velas)
+
+
+class OHLCVCache:
+    """
+    Caché de velas compartida por el worker. `get()` devuelve el mismo
+    DataFrame que exchange_utils.get_ohlcv, pero pidiendo al exchange solo
+    las velas que faltan. Seguro entre hilos (cada clave se actualiza con
+    su buffer; la red va fuera del lock).
+    """
+    def __init__(self, max_candles=DEFAULT_MAX_CANDLES):
+        self.max_candles = max(10, int(max_candles))
+        self._buffers = {} # (symbol, timeframe) -> CandleBuffer
+        self._lock = threading.Lock()
+        self.stats = {'full': 0, 'delta': 0, 'gaps': 0, 'rows_fetched': 0}
+
+    def clear(self, symbol=None):
+        """Vacía la caché (de un símbolo o entera)."""
+        with self._lock:
+            if symbol is None: self._buffers.clear()
+            else:
+                for key in [k for k in self._buffers if k[0] == symbol]: del self._buffers[key]
+
+    # --- Planificación de la petición (compartida sync/async) ---
+    def _plan(self, symbol, timeframe, required_limit):
+        """(since, limit) de la petición delta, o (None, limit) si hace falta recarga completa."""
+        with self._lock:
+            buf = self._buffers.get((symbol, timeframe))
+            if buf is None or len(buf) < required_limit - 10 or buf.last_ts is None:
+                return None, required_limit
+            # Velas esperadas desde la última guardada (+ la propia en curso y margen)
+            elapsed_bars = int((time.time() * 1000 - buf.last_ts) // buf.tf_ms)
+            if elapsed_bars >= required_limit: return None, required_limit # Demasiado tiempo sin actualizar
+            return buf.last_ts, max(0, elapsed_bars) + 3
+
+    def _store(self, symbol, timeframe, rows, since, required_limit, delta_limit=None):
+        """Guarda/fusiona la respuesta. Devuelve False si el delta tenía un hueco (hay que recargar)."""
+        tf_seconds = timeframe_to_seconds(timeframe) or 60
+        capacity = max(self.max_candles, required_limit) # Un limit mayor que max_candles amplía el buffer
+        with self._lock:
+            key = (symbol, timeframe)
+            buf = self._buffers.get(key)
+            if buf is None:
+                buf = CandleBuffer(tf_seconds * 1000, capacity); self._buffers[key] = buf
+            else: buf.reserve(capacity)
+            self.stats['rows_fetched'] += len(rows)
+            if since is None:
+                buf.replace(rows); self.stats['full'] += 1
+                return True
+            # Un delta "lleno" puede haber dejado velas fuera (reloj local desfasado): recargar
+            ok = not (delta_limit and len(rows) >= delta_limit) and buf.merge(rows)
+            if ok: self.stats['delta'] += 1
+            else:
+                self.stats['gaps'] += 1
+                print(f"Debug [OHLCVCache]: Hueco/delta incompleto en {symbol} {timeframe} (última {since}, recibido {rows[0][0] if rows else None}). Recarga completa.")
+            return ok
+
+    def _frame(self, symbol, timeframe, required_limit):
+        """Vista DataFrame (solo lectura) de las últimas `required_limit` velas; None si faltan datos."""
+        with self._lock:
+            buf = self._buffers.get((symbol, timeframe))
+            available = len(buf) if buf else 0
+            if available and available >= required_limit - 10: # Mismo margen que _ohlcv_to_dataframe
+                return buf.frame(required_limit)
+        print(f"⚠️ No se recibieron suficientes datos OHLCV ({available}/{required_limit}) para {symbol} ({timeframe}).")
+        return None
+
+    # --- API ---
+    def get(self, exchange, symbol, timeframe='15m', limit=100):
+        """Equivalente a get_ohlcv(exchange, symbol, timeframe, limit) con descarga incremental."""
+        if not exchange or not symbol: return None
+        required_limit = limit + 1 # Igual que get_ohlcv: una vela extra para diff()
+        since, fetch_limit = self._plan(symbol, timeframe, required_limit)
+        rows = fetch_ohlcv_rows(exchange, symbol, timeframe=timeframe, limit=fetch_limit, since=since)
+        if rows is None: return None
+        if not self._store(symbol, timeframe, rows, since, required_limit, fetch_limit):
+            rows = fetch_ohlcv_rows(exchange, symbol, timeframe=timeframe, limit=required_limit)
+            if rows is None: return None
+            self._store(symbol, timeframe, rows, None, required_limit)
+        return self._frame(symbol, timeframe, required_limit)
+
+    async def get_async(self, exchange, symbol, timeframe='15m', limit=100):
+        """Versión corrutina de get() para el worker asyncio (exchange de ccxt.async_support)."""
+        if not exchange or not symbol: return None
+        required_limit = limit + 1
+        since, fetch_limit = self._plan(symbol, timeframe, required_limit)
+        rows = await aex.fetch_ohlcv_rows(exchange, symbol, timeframe=timeframe, limit=fetch_limit, since=since)
+        if rows is None: return None
+        if not self._store(symbol, timeframe, rows, since, required_limit, fetch_limit):
+            rows = await aex.fetch_ohlcv_rows(exchange, symbol, timeframe=timeframe, limit=required_limit)
+            if rows is None: return None
+            self._store(symbol, timeframe, rows, None, required_limit)
+        return self._frame(symbol, timeframe, required_limit)
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+import glob
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .exchange_utils import fetch_ohlcv_rows
+from .parallel_fetch import ExchangePool
+from .request_scheduler import attach_request_scheduler
+from .scheduler import timeframe_to_seconds
+
+# --- Histórico local de velas (para backtests y arranques en caliente) ---
+# get_ohlcv solo trae las últimas `limit+1` velas. Aquí se guardan velas
+# CERRADAS en disco, una partición por exchange / símbolo / timeframe:
+#   <raíz>/<exchange>/<símbolo>/<timeframe>/candles.bin  (registros fijos, orden creciente)
+#   <raíz>/<exchange>/<símbolo>/<timeframe>/meta.json
+# candles.bin es un array NumPy de CANDLE_DTYPE sin cabecera: se abre con
+# memmap y un rango de fechas se localiza con búsqueda binaria sobre los
+# timestamps, así que leer un tramo no carga el archivo entero.
+#
+# La descarga masiva parte el rango en bloques alineados de
+# `page_limit x block_pages` velas que se paginan con fetch_ohlcv(since=...)
+# en paralelo (un clon de exchange por hilo). Cada bloque escribe en
+# parts/<inicio>.part y al terminar pasa a parts/<inicio>-<fin>.blk; los
+# bloques terminados se añaden en orden a candles.bin. Si se corta, la
+# siguiente ejecución reanuda cada bloque desde su última vela.
+
+DEFAULT_STORE_DIR = os.path.expanduser("~/Documents/BOT_TRADING/cache/ohlcv")
+CANDLE_DTYPE = np.dtype([('timestamp', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<f8')])
+STORE_VERSION = 1
+DEFAULT_PAGE_LIMIT = 1000 # Velas por petición (máximo habitual de los exchanges)
+DEFAULT_BLOCK_PAGES = 20 # Páginas por bloque de descarga
+MAX_PAGE_RETRIES = 3
+
+
+def _safe_name(text):
+    """'BTC/USDT:USDT' -> 'BTC_USDT-USDT' (nombre de carpeta válido en cualquier SO)."""
+    return str(text).replace('/', '_').replace(':', '-').replace('\\', '_')
+
+
+def _to_ms(value):
+    """ms desde epoch para int/float (ms), str de fecha, datetime o Timestamp. None se mantiene."""
+    if value is None: return None
+    if isinstance(value, (int, np.integer)): return int(value)
+    if isinstance(value, float): return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None: ts = ts.tz_localize('UTC')
+    return int(ts.value // 1_000_000)
+
+
+def rows_to_records(rows):
+    """Velas ccxt [[ts, o, h, l, c, v], ...] -> array CANDLE_DTYPE."""
+    out = np.zeros(len(rows), dtype=CANDLE_DTYPE)
+    if not len(rows): return out
+    data = np.asarray(rows, dtype=np.float64)
+    out['timestamp'] = data[:, 0].astype(np.int64)
+    for i, name in enumerate(CANDLE_DTYPE.names[1:], start=1): out[name] = data[:, i]
+    return out
+
+
+def records_to_frame(records):
+    """Array CANDLE_DTYPE -> DataFrame con el formato de get_ohlcv (índice 'timestamp' UTC)."""
+    index = pd.DatetimeIndex(pd.to_datetime(np.asarray(records['timestamp']), unit='ms', utc=True), name='timestamp')
+    return pd.DataFrame({name: np.array(records[name], dtype=float) for name in CANDLE_DTYPE.names[1:]}, index=index)
+
+
+def _read_records(path):
+    """Registros completos de un .bin/.part/.blk (ignora un registro final a medias)."""
+    if not os.path.exists(path): return np.zeros(0, dtype=CANDLE_DTYPE)
+    count = os.path.getsize(path) // CANDLE_DTYPE.itemsize
+    return np.fromfile(path, dtype=CANDLE_DTYPE, count=count)
+
+
+def _append_records(path, records):
+    """Añade registros al final; antes recorta un registro a medias de una escritura interrumpida."""
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size % CANDLE_DTYPE.itemsize:
+        with open(path, 'r+b') as f: f.truncate(size - size % CANDLE_DTYPE.itemsize)
+    with open(path, 'ab') as f: f.write(records.tobytes())
+
+
+class OHLCVStore:
+    """Velas cerradas en disco por (exchange, símbolo, timeframe)."""
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = os.path.expanduser(root)
+        self._lock = threading.Lock()
+
+    def partition_dir(self, exchange_id, symbol, timeframe):
+        return os.path.join(self.root, _safe_name(exchange_id), _safe_name(symbol), _safe_name(timeframe))
+
+    def _data_path(self, exchange_id, symbol, timeframe):
+        return os.path.join(self.partition_dir(exchange_id, symbol, timeframe), 'candles.bin')
+
+    def _write_meta(self, exchange_id, symbol, timeframe):
+        folder = self.partition_dir(exchange_id, symbol, timeframe)
+        info = self.info(exchange_id, symbol, timeframe)
+        payload = {'version': STORE_VERSION, 'exchange': exchange_id, 'symbol': symbol, 'timeframe': timeframe,
+                   'rows': info['rows'], 'first_ts': info['first_ts'], 'last_ts': info['last_ts'], 'updated_at': time.time()}
+        tmp_path = os.path.join(folder, 'meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(folder, 'meta.json'))
+
+    def open_memmap(self, exchange_id, symbol, timeframe):
+        """Array CANDLE_DTYPE de solo lectura sobre candles.bin (vacío si no existe)."""
+        path = self._data_path(exchange_id, symbol, timeframe)
+        count = os.path.getsize(path) // CANDLE_DTYPE.itemsize if os.path.exists(path) else 0
+        if count == 0: return np.zeros(0, dtype=CANDLE_DTYPE)
+        return np.memmap(path, dtype=CANDLE_DTYPE, mode='r', shape=(count,))
+
+    def info(self, exchange_id, symbol, timeframe):
+        """{'rows', 'first_ts', 'last_ts'} (ms) sin cargar las velas."""
+        data = self.open_memmap(exchange_id, symbol, timeframe)
+        if not len(data): return {'rows': 0, 'first_ts': None, 'last_ts': None}
+        return {'rows': int(len(data)), 'first_ts': int(data[0]['timestamp']), 'last_ts': int(data[-1]['timestamp'])}
+
+    def last_timestamp(self, exchange_id, symbol, timeframe):
+        return self.info(exchange_id, symbol, timeframe)['last_ts']
+
+    def read_records(self, exchange_id, symbol, timeframe, start=None, end=None):
+        """Registros con start <= ts < end (fechas o ms). Solo se leen del disco las filas del rango."""
+        data = self.open_memmap(exchange_id, symbol, timeframe)
+        if not len(data): return np.zeros(0, dtype=CANDLE_DTYPE)
+        stamps = data['timestamp'] # Vista sobre el memmap: searchsorted toca O(log n) páginas
+        lo = int(np.searchsorted(stamps, _to_ms(start), side='left')) if start is not None else 0
+        hi = int(np.searchsorted(stamps, _to_ms(end), side='left')) if end is not None else len(data)
+        return np.array(data[lo:max(lo, hi)])
+
+    def read(self, exchange_id, symbol, timeframe, start=None, end=None):
+        """DataFrame (formato get_ohlcv) de las velas en [start, end)."""
+        return records_to_frame(self.read_records(exchange_id, symbol, timeframe, start, end))
+
+    def append(self, exchange_id, symbol, timeframe, rows):
+        """Añade velas (ccxt o CANDLE_DTYPE) posteriores a la última guardada. Devuelve cuántas se añadieron."""
+        records = rows if isinstance(rows, np.ndarray) and rows.dtype == CANDLE_DTYPE else rows_to_records(rows)
+        if not len(records): return 0
+        with self._lock:
+            folder = self.partition_dir(exchange_id, symbol, timeframe)
+            os.makedirs(folder, exist_ok=True)
+            last_ts = self.last_timestamp(exchange_id, symbol, timeframe)
+            records = np.sort(records, order='timestamp')
+            keep = np.ones(len(records), dtype=bool)
+            keep[1:] = records['timestamp'][1:] > records['timestamp'][:-1] # Sin duplicados
+            if last_ts is not None: keep &= records['timestamp'] > last_ts
+            records = records[keep]
+            if len(records):
+                _append_records(self._data_path(exchange_id, symbol, timeframe), records)
+                self._write_meta(exchange_id, symbol, timeframe)
+            return int(len(records))
+
+    def partitions(self):
+        """[(exchange, símbolo, timeframe), ...] según los meta.json guardados."""
+        out = []
+        for meta_path in sorted(glob.glob(os.path.join(self.root, '*', '*', '*', 'meta.json'))):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f: meta = json.load(f)
+                out.append((meta['exchange'], meta['symbol'], meta['timeframe']))
+            except Exception as e:
+                print(f"⚠️ meta.json ilegible ({meta_path}): {e}")
+        return out
+
+
+# --- Descarga masiva paginada ---
+
+def plan_blocks(start_ms, end_ms, tf_ms, page_limit=DEFAULT_PAGE_LIMIT, block_pages=DEFAULT_BLOCK_PAGES):
+    """[(inicio, fin), ...] bloques alineados a múltiplos de su duración (mismos bloques en cada ejecución)."""
+    block_ms = tf_ms * page_limit * block_pages
+    blocks, block_start = [], (start_ms // block_ms) * block_ms
+    while block_start < end_ms:
+        blocks.append((block_start, min(block_start + block_ms, end_ms)))
+        block_start += block_ms
+    return blocks
+
+
+def _block_paths(parts_dir, block_start, block_end):
+    return os.path.join(parts_dir, f"{block_start}.part"), os.path.join(parts_dir, f"{block_start}-{block_end}.blk")
+
+
+def _download_block(pool, symbol, timeframe, tf_ms, block, from_ms, parts_dir, page_limit, stop_event=None):
+    """Pagina fetch_ohlcv(since=...) dentro de un bloque, reanudando desde su .part. Devuelve velas nuevas o None si falló."""
+    block_start, block_end = block
+    part_path, done_path = _block_paths(parts_dir, block_start, block_end)
+    if os.path.exists(done_path): return 0
+    for old in glob.glob(os.path.join(parts_dir, f"{block_start}-*.blk")): os.replace(old, part_path) # Bloque final de una ejecución anterior (más corto)
+    existing = _read_records(part_path)
+    since = max(from_ms, block_start, int(existing['timestamp'][-1]) + tf_ms if len(existing) else 0)
+    exchange, added, retries = pool.get(), 0, 0
+    while since < block_end:
+        if stop_event is not None and stop_event.is_set(): return None
+        rows = fetch_ohlcv_rows(exchange, symbol, timeframe=timeframe, limit=page_limit, since=since)
+        if rows is None: # Error ya logueado: reintentar con espera creciente
+            retries += 1
+            if retries > MAX_PAGE_RETRIES: return None
+            time.sleep(min(30, 2 ** retries)); continue
+        retries = 0
+        records = rows_to_records([r for r in rows if since <= r[0] < block_end])
+        if not len(records): break # Sin más velas en el bloque (antes del listado o hueco final)
+        _append_records(part_path, records)
+        added += len(records)
+        since = int(records['timestamp'][-1]) + tf_ms
+    if os.path.exists(part_path): os.replace(part_path, done_path)
+    else: open(done_path, 'wb').close() # Bloque sin velas: terminado igualmente
+    return added
+
+
+def _merge_blocks(store, exchange_id, symbol, timeframe, blocks, parts_dir):
+    """Añade a candles.bin los bloques terminados, en orden, hasta el primero sin terminar."""
+    merged = 0
+    for block_start, block_end in blocks:
+        _, done_path = _block_paths(parts_dir, block_start, block_end)
+        if not os.path.exists(done_path): break
+        merged += store.append(exchange_id, symbol, timeframe, _read_records(done_path))
+        os.remove(done_path)
+    return merged
+
+
+def download_history(exchange, symbol, timeframe, since, until=None, store=None, workers=4,
+                     page_limit=DEFAULT_PAGE_LIMIT, block_pages=DEFAULT_BLOCK_PAGES, log=print, stop_event=None):
+    """
+    Descarga velas cerradas de `symbol` desde `since` (fecha o ms) hasta
+    `until` (por defecto ahora) al OHLCVStore, en paralelo por bloques y
+    reanudando lo ya descargado. Devuelve el número de velas añadidas.
+    """
+    store = store or OHLCVStore()
+    tf_seconds = timeframe_to_seconds(timeframe)
+    if not tf_seconds: raise ValueError(f"Timeframe '{timeframe}' no válido.")
+    tf_ms = tf_seconds * 1000
+    now_ms = int(time.time() * 1000)
+    end_ms = min(_to_ms(until) if until is not None else now_ms, now_ms)
+    end_ms = (end_ms // tf_ms) * tf_ms # Solo velas cerradas: la vela que empieza en end_ms aún no cuenta
+    last_ts = store.last_timestamp(exchange.id, symbol, timeframe)
+    from_ms = max(_to_ms(since), last_ts + tf_ms if last_ts is not None else 0)
+    if from_ms >= end_ms:
+        log(f"ℹ️ {symbol} {timeframe}: histórico ya al día ({store.info(exchange.id, symbol, timeframe)['rows']} velas)."); return 0
+
+    parts_dir = os.path.join(store.partition_dir(exchange.id, symbol, timeframe), 'parts')
+    os.makedirs(parts_dir, exist_ok=True)
+    blocks = plan_blocks(from_ms, end_ms, tf_ms, page_limit, block_pages)
+    log(f"⬇️ {symbol} {timeframe}: {len(blocks)} bloques desde {pd.Timestamp(from_ms, unit='ms', tz='UTC')} "
+        f"hasta {pd.Timestamp(end_ms, unit='ms', tz='UTC')} ({max(1, int(workers))} hilos)")
+    pool, started, failed = ExchangePool(exchange, workers), time.time(), []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="ohlcv_dl") as executor:
+            futures = {executor.submit(_download_block, pool, symbol, timeframe, tf_ms, block, from_ms, parts_dir, page_limit, stop_event): block
+                       for block in blocks}
+            for done, future in enumerate(as_completed(futures), start=1):
+                block = futures[future]
+                try: added = future.result()
+                except Exception as e:
+                    print(f"❌ Error descargando bloque {block} de {symbol}: {e}"); traceback.print_exc(); added = None
+                if added is None: failed.append(block)
+                log(f"Debug [OHLCV Store]: bloque {done}/{len(blocks)} {'FALLÓ' if added is None else f'+{added} velas'}")
+    finally:
+        pool.close()
+    merged = _merge_blocks(store, exchange.id, symbol, timeframe, blocks, parts_dir)
+    info = store.info(exchange.id, symbol, timeframe)
+    if failed: log(f"⚠️ {symbol} {timeframe}: {len(failed)} bloques sin terminar; se reanudarán en la próxima ejecución.")
+    log(f"✅ {symbol} {timeframe}: +{merged} velas en {time.time() - started:.1f}s (total {info['rows']}).")
+    return merged
+
+
+def main(argv=None):
+    """python -m core.ohlcv_store download|info ... (descarga pública: no necesita credenciales)."""
+    import argparse
+    import ccxt
+    parser = argparse.ArgumentParser(description="Histórico local de velas (descarga masiva y consulta).")
+    parser.add_argument("command", choices=("download", "info"))
+    parser.add_argument("--exchange", default="binanceusdm", help="Id ccxt del exchange (p.ej. binanceusdm, gate)")
+    parser.add_argument("--default-type", default="swap", help="options.defaultType de ccxt")
+    parser.add_argument("--symbol", default="BTC/USDT:USDT")
+    parser.add_argument("--timeframe", default="1m")
+    parser.add_argument("--since", default=None, help="Fecha o ms de inicio (download)")
+    parser.add_argument("--until", default=None, help="Fecha o ms de fin (por defecto ahora)")
+    parser.add_argument("--workers", type=int, default=4, help="Hilos de descarga")
+    parser.add_argument("--page-limit", type=int, default=DEFAULT_PAGE_LIMIT, help="Velas por petición")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="Raíz del histórico")
+    args = parser.parse_args(argv)
+
+    store = OHLCVStore(args.store_dir)
+    if args.command == "info":
+        for exchange_id, symbol, timeframe in store.partitions():
+            info = store.info(exchange_id, symbol, timeframe)
+            first = pd.Timestamp(info['first_ts'], unit='ms', tz='UTC') if info['first_ts'] is not None else '-'
+            last = pd.Timestamp(info['last_ts'], unit='ms', tz='UTC') if info['last_ts'] is not None else '-'
+            print(f"{exchange_id} {symbol} {timeframe}: {info['rows']} velas ({first} -> {last})")
+        return 0
+    if not args.since: parser.error("download necesita --since")
+    exchange = getattr(ccxt, args.exchange)({'enableRateLimit': True, 'options': {'defaultType': args.default_type}})
+    exchange.load_markets()
+    attach_request_scheduler(exchange) # Un solo cubo para todos los hilos de descarga (ritmo del exchange)
+    download_history(exchange, args.symbol, args.timeframe, args.since, args.until, store=store,
+                     workers=args.workers, page_limit=args.page_limit)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import copy
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from .exchange_utils import fetch_price, get_ohlcv, fetch_balance, get_position_status
+
+# --- Fase de descarga en paralelo para el worker ---
+# Las instancias ccxt NO son seguras entre hilos (sesión HTTP, nonce, throttler),
+# así que cada hilo del pool usa su propio clon de la instancia principal.
+# Los clones comparten los mercados ya cargados: no se repite load_markets.
+
+MARKET_DATA_PARTS = ('price', 'ohlcv', 'balance', 'position')
+
+
+def clone_exchange(exchange):
+    """
+    Crea una instancia nueva del mismo exchange con las mismas credenciales,
+    opciones y URLs (sandbox incluido), reutilizando los mercados cargados.
+    """
+    config = {
+        'apiKey': exchange.apiKey,
+        'secret': exchange.secret,
+        'timeout': exchange.timeout,
+        'enableRateLimit': exchange.enableRateLimit,
+        'options': copy.deepcopy(exchange.options),
+    }
+    if getattr(exchange, 'password', None): config['password'] = exchange.password
+    if getattr(exchange, 'uid', None): config['uid'] = exchange.uid
+
+    clone = exchange.__class__(config)
+    clone.urls = copy.deepcopy(exchange.urls) # Conserva la URL de testnet si estaba activa
+    if exchange.markets:
+        clone.set_markets(exchange.markets, exchange.currencies)
+    return clone
+
+
+class ExchangePool:
+    """
+    Entrega una instancia ccxt distinta por hilo (clones perezosos de `exchange`).
+    Cada clon tiene su propio throttle de ccxt: con `workers` hilos su
+    rateLimit se multiplica por `workers` para que, juntos, no pasen del
+    ritmo del exchange (con RequestScheduler el throttle está desactivado
+    y todos comparten el cubo de la cuenta).
+    """
+    def __init__(self, exchange, workers=1):
+        self.base = exchange
+        self.workers = max(1, int(workers))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._clones = []
+
+    def get(self):
+        clone = getattr(self._local, 'exchange', None)
+        if clone is None:
+            clone = clone_exchange(self.base)
+            clone.rateLimit = self.base.rateLimit * self.workers # ms entre peticiones de cada clon
+            self._local.exchange = clone
+            with self._lock: self._clones.append(clone)
+        return clone
+
+    def close(self):
+        """Cierra las sesiones HTTP de todos los clones creados."""
+        with self._lock:
+            clones, self._clones = self._clones, []
+        for clone in clones:
+            try:
+                if hasattr(clone, 'close') and callable(clone.close): clone.close()
+            except Exception as e:
+                print(f"Advertencia [ExchangePool]: Error cerrando clon {clone.id}: {e}")
+
+
+class MarketDataFetcher:
+    """
+    Lanza a la vez las peticiones independientes de una iteración (precio,
+    velas, balance y posición) sobre un pool acotado de hilos y espera a la
+    más lenta: la latencia pasa de la suma de los round-trips al máximo.
+    """
+    def __init__(self, exchange, max_workers=4):
+        self.max_workers = max(1, int(max_workers))
+        self.pool = ExchangePool(exchange, self.max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fetch")
+
+    def _call(self, fn, *args, **kwargs):
+        start = time.time()
+        result = fn(self.pool.get(), *args, **kwargs)
+        return result, time.time() - start
+
+    def fetch(self, symbol, timeframe='15m', limit=100, asset='USDT', parts=MARKET_DATA_PARTS, ohlcv_cache=None):
+        """
+        Descarga en paralelo las partes pedidas. Devuelve un dict con
+        'price', 'ohlcv', 'balance', 'position' (None si no se pidió) y
+        'timings' (segundos por parte). Las excepciones críticas que
+        re-lanzan las funciones de exchange_utils (p.ej. autenticación)
+        se propagan al llamador. Con `ohlcv_cache` (OHLCVCache) las velas
+        se descargan de forma incremental.
+        """
+        ohlcv_fn = ohlcv_cache.get if ohlcv_cache is not None else get_ohlcv
+        calls = {
+            'price': (fetch_price, (symbol,), {}),
+            'ohlcv': (ohlcv_fn, (symbol,), {'timeframe': timeframe, 'limit': limit}),
+            'balance': (fetch_balance, (), {'asset': asset}),
+            'position': (get_position_status, (symbol,), {}),
+        }
+        futures = {}
+        for part in parts:
+            fn, args, kwargs = calls[part]
+            futures[part] = self._executor.submit(self._call, fn, *args, **kwargs)
+
+        data = {part: None for part in MARKET_DATA_PARTS}
+        data['timings'] = {}
+        first_error = None
+        for part, future in futures.items():
+            try:
+                data[part], data['timings'][part] = future.result()
+            except Exception as e:
+                if first_error is None: first_error = e
+        if first_error is not None: raise first_error
+        return data
+
+    def shutdown(self):
+        try:
+            self._executor.shutdown(wait=True)
+        except Exception:
+            traceback.print_exc()
+        self.pool.close()
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import copy
+import random
+import threading
+import time
+from collections import namedtuple
+
+from .exchange_utils import fetch_price
+
+# --- Fuentes de precio desacopladas del bucle del worker ---
+# Con fetch_price en cada iteración los chequeos de riesgo ven precios de
+# hasta `loop_interval` segundos. Un PriceFeed mantiene en segundo plano el
+# último tick de cada símbolo y el worker lo lee sin bloquear (latest()):
+#   - PollingPriceFeed: REST (fetch_ticker) en un hilo propio, cada `interval`.
+#   - StreamingPriceFeed: push desde una fuente tipo websocket (ccxt.pro o propia).
+#   - FakePriceFeed: en proceso, para pruebas (push manual, paseo aleatorio o
+#     el precio de una fuente local). Solo con el exchange simulado
+#     (SimExchange), y leyendo su SimBook: los ticks son los precios a los que
+#     se llenan las órdenes. Con precios inventados el tamaño de orden y
+#     SL/TP/TS trabajarían sobre un mercado distinto del que ejecuta.
+
+PriceTick = namedtuple('PriceTick', ['symbol', 'price', 'timestamp', 'received_at'])
+
+
+class PriceFeed:
+    """Base: almacén del último tick por símbolo, suscripciones y oyentes. Seguro entre hilos."""
+    name = 'base'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ticks = {}
+        self._symbols = set()
+        self._listeners = []
+        self._running = False
+
+    # --- Ciclo de vida ---
+    def start(self):
+        self._running = True
+        return self
+
+    def stop(self):
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    # --- Suscripciones ---
+    def subscribe(self, symbols):
+        """Fija los símbolos seguidos (los retirados dejan de actualizarse)."""
+        with self._lock:
+            self._symbols = set(symbols)
+            for sym in [s for s in self._ticks if s not in self._symbols]: del self._ticks[sym]
+
+    def symbols(self):
+        with self._lock: return sorted(self._symbols)
+
+    def add_listener(self, callback):
+        """callback(tick) en el hilo de la fuente con cada precio nuevo."""
+        self._listeners.append(callback)
+
+    # --- Lectura (no bloqueante) ---
+    def latest(self, symbol, max_age=None):
+        """Último PriceTick del símbolo, o None si no hay o es más viejo que `max_age` segundos."""
+        with self._lock: tick = self._ticks.get(symbol)
+        if tick is None: return None
+        if max_age is not None and time.time() - tick.received_at > float(max_age): return None
+        return tick
+
+    def _on_tick(self, symbol, price, timestamp=None):
+        """Registra un precio recibido por la fuente (y avisa a los oyentes)."""
+        try: price = float(price)
+        except (TypeError, ValueError): return
+        if price <= 0: return
+        now = time.time()
+        tick = PriceTick(symbol, price, (timestamp / 1000.0) if timestamp else now, now)
+        with self._lock:
+            if self._symbols and symbol not in self._symbols: return
+            self._ticks[symbol] = tick
+        for callback in list(self._listeners):
+            try: callback(tick)
+            except Exception as e: print(f"⚠️ Error en oyente del feed de precios: {e}")
+
+
+class PollingPriceFeed(PriceFeed):
+    """Consulta REST (fetch_price) de los símbolos suscritos cada `interval` segundos en un hilo propio."""
+    name = 'polling'
+
+    def __init__(self, exchange, interval=1.0):
+        super().__init__()
+        self.exchange = exchange
+        self.interval = max(0.1, float(interval))
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive(): return self
+        super().start()
+        self._thread = threading.Thread(target=self._poll_loop, name="price-feed-polling", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        super().stop()
+        if self._thread is not None: self._thread.join(timeout=self.interval + 5)
+        self._thread = None
+
+    def _poll_loop(self):
+        from .parallel_fetch import clone_exchange
+        try: exchange = clone_exchange(self.exchange) # Instancia propia: ccxt no es seguro entre hilos
+        except Exception as e:
+            print(f"⚠️ Feed de precios: no se pudo clonar el exchange ({e}). Usando la instancia principal.")
+            exchange = self.exchange
+        while self._running:
+            started = time.time()
+            for symbol in self.symbols():
+                if not self._running: break
+                price = fetch_price(exchange, symbol)
+                if price: self._on_tick(symbol, price)
+            time.sleep(max(0.0, self.interval - (time.time() - started)))
+        if exchange is not self.exchange:
+            try: exchange.close()
+            except Exception: pass
+
+
+class StreamingPriceFeed(PriceFeed):
+    """
+    Recibe precios de una fuente push. `source` debe tener:
+      - async stream(symbol): generador asíncrono de (precio, timestamp_ms)
+      - async close() (opcional)
+    Corre su propio event loop en un hilo; una tarea por símbolo, con
+    reconexión y espera creciente si la fuente falla.
+    """
+    name = 'stream'
+
+    def __init__(self, source, reconnect_delay=1.0, max_reconnect_delay=30.0):
+        super().__init__()
+        self.source = source
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._loop = None
+        self._thread = None
+        self._tasks = {}
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive(): return self
+        super().start()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="price-feed-stream", daemon=True)
+        self._thread.start()
+        self._loop.call_soon_threadsafe(self._sync_tasks)
+        return self
+
+    def stop(self):
+        super().stop()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancel_all)
+        if self._thread is not None: self._thread.join(timeout=10)
+        self._thread = None
+
+    def subscribe(self, symbols):
+        super().subscribe(symbols)
+        if self._loop is not None and self._running:
+            self._loop.call_soon_threadsafe(self._sync_tasks)
+
+    # --- Dentro del event loop del feed ---
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            try:
+                close = getattr(self.source, 'close', None)
+                if close is not None: self._loop.run_until_complete(close())
+            except Exception as e: print(f"⚠️ Error cerrando la fuente del feed de precios: {e}")
+            self._loop.close(); self._loop = None
+
+    def _sync_tasks(self):
+        wanted = set(self.symbols())
+        for sym in [s for s in self._tasks if s not in wanted]: self._tasks.pop(sym).cancel()
+        for sym in wanted - set(self._tasks):
+            self._tasks[sym] = self._loop.create_task(self._stream_symbol(sym))
+
+    def _cancel_all(self):
+        tasks = list(self._tasks.values()); self._tasks.clear()
+        for task in tasks: task.cancel()
+
+        async def _finish():
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._loop.stop()
+        self._loop.create_task(_finish())
+
+    async def _stream_symbol(self, symbol):
+        delay = self.reconnect_delay
+        while self._running:
+            try:
+                async for price, timestamp in self.source.stream(symbol):
+                    if not self._running: return
+                    self._on_tick(symbol, price, timestamp)
+                    delay = self.reconnect_delay
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Feed de precios {symbol}: {e}. Reconectando en {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            delay = min(self.max_reconnect_delay, delay * 2)
+
+
+class CcxtProSource:
+    """Fuente websocket de ccxt.pro (watch_ticker) con las credenciales/URLs de `exchange`."""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self._pro = None
+
+    def _pro_exchange(self):
+        if self._pro is None:
+            import ccxt.pro as ccxtpro
+            exchange_class = getattr(ccxtpro, self.exchange.id, None)
+            if exchange_class is None: raise ValueError(f"Exchange '{self.exchange.id}' sin soporte websocket en ccxt.pro.")
+            self._pro = exchange_class({
+                'apiKey': self.exchange.apiKey, 'secret': self.exchange.secret,
+                'options': copy.deepcopy(self.exchange.options),
+            })
+            if self.exchange.markets: self._pro.set_markets(self.exchange.markets, self.exchange.currencies)
+        return self._pro
+
+    async def stream(self, symbol):
+        pro = self._pro_exchange()
+        while True:
+            ticker = await pro.watch_ticker(symbol)
+            price = ticker.get('last') or ticker.get('close')
+            if price: yield price, ticker.get('timestamp')
+
+    async def close(self):
+        if self._pro is not None:
+            try: await self._pro.close()
+            finally: self._pro = None
+
+
+class FakePriceFeed(PriceFeed):
+    """
+    Feed en proceso para pruebas: push(symbol, price) manual y, si se da
+    `interval`, cada `interval` segundos el precio de `source(symbol)` (p.ej.
+    SimBook.price, sin llamadas de API) o, sin `source`, un paseo aleatorio
+    (volatilidad relativa) desde `prices`.
+    """
+    name = 'fake'
+
+    def __init__(self, prices=None, interval=None, volatility=0.001, seed=None, source=None):
+        super().__init__()
+        self.prices = dict(prices or {})
+        self.interval = interval
+        self.volatility = volatility
+        self.source = source
+        self._random = random.Random(seed)
+        self._thread = None
+
+    def push(self, symbol, price, timestamp=None):
+        self.prices[symbol] = float(price)
+        self._on_tick(symbol, price, timestamp)
+
+    def start(self):
+        super().start()
+        if self.interval and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._walk, name="price-feed-fake", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        super().stop()
+        if self._thread is not None: self._thread.join(timeout=float(self.interval or 0) + 1)
+        self._thread = None
+
+    def _walk(self):
+        while self._running:
+            for symbol in self.symbols():
+                if self.source is not None:
+                    try: self.push(symbol, self.source(symbol))
+                    except Exception as e: print(f"⚠️ Feed 'fake': sin precio de la fuente para {symbol}: {e}")
+                    continue
+                last = self.prices.get(symbol, 100.0)
+                self.push(symbol, max(1e-9, last * (1 + self._random.gauss(0, self.volatility))))
+            time.sleep(float(self.interval))
+
+
+def _is_sim_exchange(exchange):
+    from .sim_exchange import SimExchange # Import diferido: sim_exchange no se necesita en real
+    return isinstance(exchange, SimExchange)
+
+
+def create_price_feed(kind, exchange, interval=1.0):
+    """Feed según la config 'price_feed' ('polling' | 'stream'); None para 'none'. 'fake' solo con SimExchange (precios de su SimBook)."""
+    kind = str(kind or 'none').strip().lower()
+    if kind == 'polling': return PollingPriceFeed(exchange, interval=interval)
+    if kind == 'stream': return StreamingPriceFeed(CcxtProSource(exchange))
+    if kind == 'fake':
+        if _is_sim_exchange(exchange): return FakePriceFeed(interval=interval, source=exchange.book.price)
+        print("❌ Feed de precios 'fake' (paseo aleatorio) rechazado: solo se permite con el exchange simulado. Se usa fetch_price por iteración.")
+        return None
+    if kind not in ('none', ''): print(f"⚠️ Feed de precios '{kind}' desconocido. Se usa fetch_price por iteración.")
+    return None
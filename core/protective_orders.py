@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+import math
+import time
+import traceback
+
+import ccxt
+
+from .metrics import timed
+from .request_scheduler import rate_limited
+
+# --- Órdenes de protección en el exchange (SL/TP reduce-only) ---
+# Sin ellas el SL/TP depende del sondeo del worker: se cierra con la latencia
+# del bucle y cada iteración gasta llamadas en precio y posición. Con la opción
+# 'protective_orders', tras llenarse la entrada se envían órdenes condicionales
+# reduce-only (stop-market y take-profit-market) calculadas con 'stop_loss' y
+# 'auto_profit', solo las de los filtros 'sl' / 'tp' activos. Cuando el Trailing Stop sube su stop se
+# reemplaza la orden de stop, así que las salidas ocurren a velocidad de
+# exchange. El chequeo del worker se mantiene como respaldo.
+#
+# Los umbrales del bot son PNL% sobre margen: un movimiento de precio de
+# pct / apalancamiento / 100 desde la entrada.
+
+MIN_AMEND_STEP = 0.0005 # Mover el stop solo si mejora al menos un 0.05% del precio
+RECONCILE_GRACE = 15.0 # Segundos tras colocar antes de dar por cerrada una posición que no aparece
+
+
+def pnl_pct_to_price(side, entry_price, pnl_ratio, leverage):
+    """Precio al que la posición tendría el PNL% (ratio sobre margen) dado."""
+    try:
+        entry, lev = float(entry_price), float(leverage or 1.0) or 1.0
+        if entry <= 0 or pnl_ratio is None or not math.isfinite(float(pnl_ratio)): return None
+        move = float(pnl_ratio) / lev
+    except (TypeError, ValueError):
+        return None
+    price = entry * (1 + move) if side == 'long' else entry * (1 - move)
+    return price if price > 0 else None
+
+
+def protective_prices(side, entry_price, leverage, stop_loss_pct, auto_profit_pct):
+    """(precio_stop, precio_take_profit) para 'stop_loss' / 'auto_profit' en %; None si el filtro está desactivado."""
+    def _pct(value):
+        try: value = abs(float(value or 0))
+        except (TypeError, ValueError): return None
+        return value if value > 0.001 else None # Mismo umbral que stop_loss.py / auto_profit.py
+    sl_pct, tp_pct = _pct(stop_loss_pct), _pct(auto_profit_pct)
+    sl_price = pnl_pct_to_price(side, entry_price, -sl_pct / 100.0, leverage) if sl_pct else None
+    tp_price = pnl_pct_to_price(side, entry_price, tp_pct / 100.0, leverage) if tp_pct else None
+    return sl_price, tp_price
+
+
+def _is_better_stop(side, new_price, old_price):
+    """True si `new_price` protege más que `old_price` (más alto en long, más bajo en short) por encima de MIN_AMEND_STEP."""
+    if new_price is None: return False
+    if old_price is None: return True
+    if side == 'long': return new_price > old_price * (1 + MIN_AMEND_STEP)
+    return new_price < old_price * (1 - MIN_AMEND_STEP)
+
+
+def _protective_order_args(exchange, symbol, kind, position_side, amount, trigger_price, working_type):
+    """Argumentos de create_order para la orden de protección (precio y cantidad con la precisión del mercado)."""
+    close_side = 'sell' if position_side == 'long' else 'buy'
+    try: price = float(exchange.price_to_precision(symbol, trigger_price))
+    except Exception: price = float(trigger_price)
+    try: amount = float(exchange.amount_to_precision(symbol, amount))
+    except Exception: amount = float(amount)
+    params = {'reduceOnly': True, ('stopLossPrice' if kind == 'sl' else 'takeProfitPrice'): price}
+    if working_type: params['workingType'] = working_type # Binance: 'MARK_PRICE' | 'CONTRACT_PRICE'
+    print(f"Debug [Protective]: {kind.upper()} {close_side.upper()} {amount} {symbol} @ {price} (reduceOnly)")
+    return (symbol, 'market', close_side, amount, None, params)
+
+
+def _protective_order_error(symbol, kind, price, e):
+    if isinstance(e, (ccxt.InvalidOrder, ccxt.ExchangeError)):
+        print(f"❌ Orden de protección {kind.upper()} rechazada para {symbol} @ {price}: {e}")
+    else:
+        print(f"❌ Error inesperado enviando orden de protección {kind.upper()} {symbol}: {e}")
+        traceback.print_exc()
+    return None
+
+
+def _cancel_error(symbol, order_id, e):
+    if isinstance(e, ccxt.OrderNotFound): return True # Ya ejecutada o cancelada
+    print(f"⚠️ No se pudo cancelar la orden de protección {order_id} ({symbol}): {e}")
+    return False
+
+
+@rate_limited('protective_order')
+@timed('protective_order')
+def place_protective_order(exchange, symbol, kind, position_side, amount, trigger_price, working_type=None):
+    """
+    Orden condicional reduce-only que cierra `position_side`: kind 'sl'
+    (stop-market, stopLossPrice) o 'tp' (take-profit-market, takeProfitPrice).
+    Devuelve la orden ccxt o None.
+    """
+    if not exchange or not symbol or not amount or not trigger_price: return None
+    args = _protective_order_args(exchange, symbol, kind, position_side, amount, trigger_price, working_type)
+    try: return exchange.create_order(*args)
+    except Exception as e: return _protective_order_error(symbol, kind, trigger_price, e)
+
+
+@rate_limited('protective_order')
+@timed('protective_order')
+async def place_protective_order_async(exchange, symbol, kind, position_side, amount, trigger_price, working_type=None):
+    """place_protective_order con un exchange ccxt.async_support."""
+    if not exchange or not symbol or not amount or not trigger_price: return None
+    args = _protective_order_args(exchange, symbol, kind, position_side, amount, trigger_price, working_type)
+    try: return await exchange.create_order(*args)
+    except Exception as e: return _protective_order_error(symbol, kind, trigger_price, e)
+
+
+@rate_limited('cancel_order')
+@timed('cancel_order')
+def cancel_protective_order(exchange, symbol, order_id):
+    """Cancela una orden de protección. True si se canceló o ya no existía."""
+    if not exchange or not order_id: return True
+    try:
+        exchange.cancel_order(order_id, symbol)
+        return True
+    except Exception as e: return _cancel_error(symbol, order_id, e)
+
+
+@rate_limited('cancel_order')
+@timed('cancel_order')
+async def cancel_protective_order_async(exchange, symbol, order_id):
+    """cancel_protective_order con un exchange ccxt.async_support."""
+    if not exchange or not order_id: return True
+    try:
+        await exchange.cancel_order(order_id, symbol)
+        return True
+    except Exception as e: return _cancel_error(symbol, order_id, e)
+
+
+@rate_limited('fetch_open_orders')
+@timed('fetch_open_orders')
+def fetch_open_order_ids(exchange, symbol):
+    """Ids de las órdenes abiertas del símbolo, o None si no se pudieron leer."""
+    try: return {o.get('id') for o in exchange.fetch_open_orders(symbol)}
+    except Exception as e: print(f"⚠️ No se pudieron leer las órdenes abiertas de {symbol}: {e}"); return None
+
+
+@rate_limited('fetch_open_orders')
+@timed('fetch_open_orders')
+async def fetch_open_order_ids_async(exchange, symbol):
+    """fetch_open_order_ids con un exchange ccxt.async_support."""
+    try: return {o.get('id') for o in await exchange.fetch_open_orders(symbol)}
+    except Exception as e: print(f"⚠️ No se pudieron leer las órdenes abiertas de {symbol}: {e}"); return None
+
+
+class ProtectiveOrders:
+    """
+    Órdenes de protección vivas de UN símbolo (se guarda en SymbolState).
+    Las llamadas al exchange van con el exchange que se pase (el del hilo
+    que llama: worker o RiskWatchdog); los métodos `*_async` son los mismos
+    con un exchange ccxt.async_support (AsyncBotWorker).
+    """
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self._clear()
+
+    def _clear(self):
+        self.side = None # 'long' | 'short' de la posición protegida
+        self.amount = 0.0
+        self.entry_price = None
+        self.leverage = None
+        self.sl_order_id = None; self.sl_price = None
+        self.tp_order_id = None; self.tp_price = None
+        self.placed_at = None
+        self.last_position = None # Última posición vista (PNL para el historial si la cierra una orden)
+
+    @property
+    def active(self):
+        return bool(self.sl_order_id or self.tp_order_id)
+
+    def covers(self, kind):
+        """True si el exchange ya vigila 'sl' o 'tp' para la posición."""
+        return bool(self.sl_order_id) if kind == 'sl' else bool(self.tp_order_id) if kind == 'tp' else False
+
+    def filled_kind(self, open_ids):
+        """'sl' o 'tp': la orden que ya no está abierta (la que cerró la posición); None si no se sabe."""
+        if open_ids is None: return None
+        missing = [kind for kind, oid in (('sl', self.sl_order_id), ('tp', self.tp_order_id)) if oid and oid not in open_ids]
+        return missing[0] if len(missing) == 1 else None
+
+    def _targets(self, side, entry_price, amount, config, filters):
+        """Guarda la posición protegida y devuelve [(kind, precio)] de las órdenes a enviar (solo filtros 'sl' / 'tp' activos)."""
+        self.side, self.amount, self.entry_price = side, float(amount), float(entry_price)
+        self.leverage = config.get('leverage', 1)
+        sl_price, tp_price = protective_prices(side, entry_price, self.leverage, config.get('stop_loss'), config.get('auto_profit'))
+        return [(kind, price) for kind, price in (('sl', sl_price), ('tp', tp_price)) if price and filters.get(kind, False)]
+
+    def _record(self, kind, price, order, placed):
+        if not order: return
+        if kind == 'sl': self.sl_order_id, self.sl_price = order.get('id'), price
+        else: self.tp_order_id, self.tp_price = order.get('id'), price
+        placed.append((kind, price))
+
+    def _ratchet_price(self, trailing_data, position_info, config):
+        """Nuevo precio del stop según el Trailing Stop, o None si no lo mejora."""
+        if not self.side or not trailing_data or not trailing_data.get('active'): return None
+        if position_info:
+            self.entry_price = position_info.get('entry_price') or self.entry_price
+            self.leverage = position_info.get('leverage') or self.leverage
+        new_price = pnl_pct_to_price(self.side, self.entry_price, trailing_data.get('target_pnl_pct'), self.leverage or config.get('leverage', 1))
+        return new_price if _is_better_stop(self.side, new_price, self.sl_price) else None
+
+    def _swap_stop(self, order, new_price):
+        """Registra el nuevo stop y devuelve el id del anterior (a cancelar)."""
+        old_id = self.sl_order_id
+        self.sl_order_id, self.sl_price = order.get('id'), new_price
+        return old_id
+
+    def _take_pending(self):
+        pending = [oid for oid in (self.sl_order_id, self.tp_order_id) if oid]
+        self._clear()
+        return pending
+
+    def place(self, exchange, side, entry_price, amount, config, filters):
+        """
+        Tras la entrada: envía SL y TP según 'stop_loss' / 'auto_profit' si
+        su filtro está activo. Sin ninguno se registra igualmente la posición
+        (el Trailing Stop puede colocar su stop). Devuelve las órdenes colocadas.
+        """
+        if self.active: self.cancel(exchange)
+        working_type = config.get('protective_orders_working_type') or None
+        placed = []
+        for kind, price in self._targets(side, entry_price, amount, config, filters):
+            self._record(kind, price, place_protective_order(exchange, self.symbol, kind, side, amount, price, working_type), placed)
+        self.placed_at = time.time()
+        return placed
+
+    async def place_async(self, exchange, side, entry_price, amount, config, filters):
+        """place() con un exchange ccxt.async_support."""
+        if self.active: await self.cancel_async(exchange)
+        working_type = config.get('protective_orders_working_type') or None
+        placed = []
+        for kind, price in self._targets(side, entry_price, amount, config, filters):
+            self._record(kind, price, await place_protective_order_async(exchange, self.symbol, kind, side, amount, price, working_type), placed)
+        self.placed_at = time.time()
+        return placed
+
+    def ratchet(self, exchange, trailing_data, position_info, config):
+        """
+        Sube (long) o baja (short) el stop al nivel del Trailing Stop activo.
+        Primero crea el nuevo stop y luego cancela el anterior: la posición
+        nunca queda sin protección. Devuelve el nuevo precio o None.
+        """
+        new_price = self._ratchet_price(trailing_data, position_info, config)
+        if new_price is None: return None
+        order = place_protective_order(exchange, self.symbol, 'sl', self.side, self.amount, new_price,
+                                       config.get('protective_orders_working_type') or None)
+        if not order: return None
+        old_id = self._swap_stop(order, new_price)
+        if old_id: cancel_protective_order(exchange, self.symbol, old_id)
+        return new_price
+
+    async def ratchet_async(self, exchange, trailing_data, position_info, config):
+        """ratchet() con un exchange ccxt.async_support."""
+        new_price = self._ratchet_price(trailing_data, position_info, config)
+        if new_price is None: return None
+        order = await place_protective_order_async(exchange, self.symbol, 'sl', self.side, self.amount, new_price,
+                                                   config.get('protective_orders_working_type') or None)
+        if not order: return None
+        old_id = self._swap_stop(order, new_price)
+        if old_id: await cancel_protective_order_async(exchange, self.symbol, old_id)
+        return new_price
+
+    def cancel(self, exchange):
+        """Cancela las órdenes vivas (tras cerrar la posición). Devuelve cuántas había."""
+        pending = self._take_pending()
+        for order_id in pending: cancel_protective_order(exchange, self.symbol, order_id)
+        return len(pending)
+
+    async def cancel_async(self, exchange):
+        """cancel() con un exchange ccxt.async_support."""
+        pending = self._take_pending()
+        for order_id in pending: await cancel_protective_order_async(exchange, self.symbol, order_id)
+        return len(pending)
+
+    def __repr__(self):
+        return f"ProtectiveOrders({self.symbol!r}, side={self.side}, sl={self.sl_price}, tp={self.tp_price})"
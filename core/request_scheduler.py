@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import functools
+import heapq
+import inspect
+import itertools
+import threading
+import time
+
+from .metrics import METRICS
+
+# --- Planificador de peticiones con prioridades (delante del exchange) ---
+# El throttle de ccxt (enableRateLimit) es FIFO por instancia: una descarga
+# de velas o el refresco de la GUI puede retrasar el cierre de un stop-loss.
+# Aquí hay UN cubo de tokens por cuenta (exchange + API key), compartido por
+# la GUI, el worker, sus clones y la instancia asyncio, y las peticiones
+# esperan por clase: órdenes > posición y precio > velas y balance.
+# Con el planificador activo se desactiva el throttle propio de ccxt.
+
+PRIORITY_ORDER = 0 # Abrir / cerrar posiciones
+PRIORITY_POSITION = 1 # Posición y precio (necesarios para SL/TP/TS)
+PRIORITY_MARKET = 2 # Velas y balance
+PRIORITY_NAMES = {PRIORITY_ORDER: 'order', PRIORITY_POSITION: 'position', PRIORITY_MARKET: 'market'}
+
+# Llamadas de exchange_utils -> (prioridad, peso). Pesos aproximados de Binance Futures.
+CALL_CLASSES = {
+    'open_long_position': (PRIORITY_ORDER, 1),
+    'open_short_position': (PRIORITY_ORDER, 1),
+    'close_position': (PRIORITY_ORDER, 1),
+    'protective_order': (PRIORITY_ORDER, 1),
+    'cancel_order': (PRIORITY_ORDER, 1),
+    'fetch_open_orders': (PRIORITY_POSITION, 1),
+    'set_leverage': (PRIORITY_ORDER, 1),
+    'get_position_status': (PRIORITY_POSITION, 5),
+    'fetch_price': (PRIORITY_POSITION, 1),
+    'fetch_ohlcv_rows': (PRIORITY_MARKET, 2),
+    'fetch_balance': (PRIORITY_MARKET, 5),
+}
+
+DEFAULT_BURST = 20 # Peso máximo acumulable en el cubo
+
+
+class RequestScheduler:
+    """
+    Cubo de tokens (`rate` de peso por segundo, capacidad `burst`) con cola
+    de prioridad: solo la petición en cabeza (menor prioridad, luego orden de
+    llegada) puede consumir tokens, así que una orden nunca espera detrás de
+    las velas ya encoladas. Sirve para hilos (acquire) y asyncio (acquire_async).
+    """
+    def __init__(self, rate, burst=DEFAULT_BURST, metrics=None):
+        self.rate = max(0.1, float(rate))
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.metrics = metrics or METRICS
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._queue = [] # heap de (prioridad, secuencia)
+        self._seq = itertools.count()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_grant(self, ticket, weight):
+        """Con el lock tomado: 0 si se concede (sale de la cola), si no segundos a esperar."""
+        now = time.monotonic()
+        self._refill(now)
+        if self._queue[0] != ticket: return 0.05 # Hay otra petición más prioritaria delante
+        weight = min(float(weight), self.burst)
+        if self.tokens >= weight:
+            self.tokens -= weight
+            heapq.heappop(self._queue)
+            return 0
+        return (weight - self.tokens) / self.rate
+
+    def _enqueue(self, priority):
+        ticket = (int(priority), next(self._seq))
+        heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _cancel(self, ticket):
+        if ticket in self._queue:
+            self._queue.remove(ticket); heapq.heapify(self._queue)
+
+    def _observe(self, priority, start):
+        self.metrics.observe('queue', PRIORITY_NAMES.get(priority, str(priority)), time.monotonic() - start)
+
+    def acquire(self, priority=PRIORITY_MARKET, weight=1):
+        """Bloquea el hilo hasta que le toque a esta petición."""
+        start = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._try_grant(ticket, weight)
+                    if wait == 0: break
+                    self._cond.wait(wait)
+            except BaseException:
+                self._cancel(ticket); raise
+            finally:
+                self._cond.notify_all() # La nueva cabeza de la cola re-evalúa
+        self._observe(priority, start)
+
+    async def acquire_async(self, priority=PRIORITY_MARKET, weight=1):
+        """Versión corrutina: espera con asyncio.sleep sin bloquear el event loop."""
+        start = time.monotonic()
+        with self._cond: ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_grant(ticket, weight)
+                    if wait == 0: self._cond.notify_all(); break
+                await asyncio.sleep(min(wait, 0.05))
+        except BaseException:
+            with self._cond: self._cancel(ticket); self._cond.notify_all()
+            raise
+        self._observe(priority, start)
+
+    def queued(self):
+        with self._cond: return len(self._queue)
+
+
+# --- Registro por cuenta (mismo cubo para GUI, worker, clones y asyncio) ---
+_schedulers = {}
+_registry_lock = threading.Lock()
+
+
+def _account_key(exchange):
+    return (getattr(exchange, 'id', None), getattr(exchange, 'apiKey', None) or '')
+
+
+def default_rate(exchange):
+    """Peso por segundo a partir de `rateLimit` de ccxt (ms entre peticiones de peso 1)."""
+    rate_limit_ms = float(getattr(exchange, 'rateLimit', 50) or 50)
+    return 1000.0 / max(1.0, rate_limit_ms)
+
+
+def attach_request_scheduler(exchange, rate=None, burst=DEFAULT_BURST):
+    """
+    Crea (o reutiliza) el planificador de la cuenta de `exchange` y desactiva el
+    throttle de ccxt en esa instancia (los clones y la instancia asyncio copian
+    enableRateLimit=False). Devuelve el RequestScheduler.
+    """
+    key = _account_key(exchange)
+    with _registry_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = RequestScheduler(rate or default_rate(exchange), burst)
+            _schedulers[key] = scheduler
+        else:
+            if rate: scheduler.rate = max(0.1, float(rate))
+            scheduler.burst = max(1.0, float(burst))
+    exchange.enableRateLimit = False
+    print(f"Debug [Request Scheduler]: {exchange.id} -> {scheduler.rate:.1f} peso/s, ráfaga {scheduler.burst:.0f}.")
+    return scheduler
+
+
+def detach_request_scheduler(exchange):
+    """Quita el planificador de la cuenta y devuelve el throttle de ccxt a la instancia."""
+    with _registry_lock: _schedulers.pop(_account_key(exchange), None)
+    exchange.enableRateLimit = True
+
+
+def scheduler_for(exchange):
+    if not _schedulers: return None
+    return _schedulers.get(_account_key(exchange))
+
+
+def rate_limited(name):
+    """
+    Decorador para las funciones de exchange_utils (primer argumento = exchange):
+    pasa por el planificador de la cuenta si hay uno activo, con la prioridad y
+    el peso de CALL_CLASSES. Sin planificador, la llamada es directa.
+    """
+    priority, weight = CALL_CLASSES.get(name, (PRIORITY_MARKET, 1))
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(exchange, *args, **kwargs):
+                scheduler = scheduler_for(exchange)
+                if scheduler is not None: await scheduler.acquire_async(priority, weight)
+                return await fn(exchange, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(exchange, *args, **kwargs):
+            scheduler = scheduler_for(exchange)
+            if scheduler is not None: scheduler.acquire(priority, weight)
+            return fn(exchange, *args, **kwargs)
+        return wrapper
+    return decorator
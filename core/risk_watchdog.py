@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import queue
+import threading
+import time
+import traceback
+
+from .exchange_utils import close_position
+from .market_snapshot import MarketSnapshot
+
+# --- Vigilante de riesgo de alta frecuencia ---
+# SL/TP/TS se evalúan con cada tick nuevo del feed de precios, sin esperar a
+# la iteración completa (velas, balance, posición). La posición es la última
+# que descargó el worker, re-valorada localmente con el precio del tick
+# (mark_position); el cierre se envía al momento con un clon del exchange.
+# La iteración del worker sigue igual sobre las velas y vuelve a sincronizar
+# la posición real; el lock por símbolo evita que ambos cierren a la vez.
+
+
+def mark_position(position_info, price, leverage=None):
+    """
+    Copia de la posición con mark_price, unrealizedPnl y pnl_pct recalculados
+    al precio dado. pnl_pct es PNL / margen inicial (como get_position_status);
+    sin margen conocido se aproxima con el movimiento de precio x apalancamiento.
+    """
+    if not position_info or not price: return position_info
+    marked = dict(position_info)
+    try:
+        entry = float(marked.get('entry_price') or 0)
+        contracts = abs(float(marked.get('contracts') or 0))
+        contract_size = float(marked.get('contractSize') or 1.0)
+        direction = 1 if marked.get('side') == 'long' else -1
+        if entry <= 0 or contracts <= 0: return position_info
+        unrealized = (float(price) - entry) * contracts * contract_size * direction
+        margin = marked.get('initialMargin_debug')
+        if margin:
+            pnl_pct = unrealized / float(margin)
+        else:
+            lev = float(marked.get('leverage') or leverage or 1.0) or 1.0
+            pnl_pct = direction * (float(price) - entry) / entry * lev
+        marked.update({'mark_price': float(price), 'unrealizedPnl': unrealized, 'pnl_pct': pnl_pct})
+    except (TypeError, ValueError):
+        return position_info
+    return marked
+
+
+class RiskWatchdog:
+    """
+    Escucha el PriceFeed y, por cada tick de un símbolo con posición y
+    filtros activos, evalúa SL -> TP -> TS con la lógica del worker
+    (_risk_exit_signals) y cierra inmediatamente si alguno dispara.
+    Los ticks se agrupan por símbolo: solo se evalúa el más reciente.
+    """
+    def __init__(self, worker, feed, min_interval=0.1):
+        self.worker = worker
+        self.feed = feed
+        self.min_interval = max(0.0, float(min_interval))
+        self._pending = queue.Queue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._last_eval = {}
+        self._running = False
+        self._thread = None
+        self.exchange = None # Clon propio (ccxt no es seguro entre hilos)
+        self.evaluations = 0
+        self.closes = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive(): return self
+        self._running = True
+        self.feed.add_listener(self._on_tick)
+        self._thread = threading.Thread(target=self._run, name="risk-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._pending.put(None)
+        if self._thread is not None: self._thread.join(timeout=15)
+        self._thread = None
+        if self.exchange is not None and self.exchange is not self.worker.exchange:
+            try: self.exchange.close()
+            except Exception: pass
+        self.exchange = None
+
+    def _on_tick(self, tick):
+        """Hilo del feed: solo encola el símbolo (una vez) para no bloquear la fuente."""
+        if not self._running: return
+        with self._queued_lock:
+            if tick.symbol in self._queued: return
+            self._queued.add(tick.symbol)
+        self._pending.put(tick.symbol)
+
+    def _run(self):
+        from .parallel_fetch import clone_exchange
+        try: self.exchange = clone_exchange(self.worker.exchange)
+        except Exception as e:
+            print(f"⚠️ RiskWatchdog: no se pudo clonar el exchange ({e}). Usando la instancia del worker.")
+            self.exchange = self.worker.exchange
+        while self._running:
+            symbol = self._pending.get()
+            if symbol is None: continue
+            with self._queued_lock: self._queued.discard(symbol)
+            wait = self._last_eval.get(symbol, 0) + self.min_interval - time.time()
+            if wait > 0: time.sleep(wait)
+            if not self._running: break
+            try:
+                self.check_symbol(symbol)
+            except Exception as e:
+                self.worker.log_signal.emit(f"💥 Error en el vigilante de riesgo [{symbol}]: {e}")
+                traceback.print_exc()
+
+    def check_symbol(self, symbol):
+        """Evalúa SL/TP/TS del símbolo con el último tick. Devuelve True si cerró la posición."""
+        worker = self.worker
+        state = worker.symbol_states.get(symbol)
+        if state is None or not state.position_info or state.risk_context is None: return False
+        if state.position_predates_close(): return False # Posición descargada antes de nuestro último cierre
+        config, filters = state.risk_context
+        if not any(filters.get(k, False) for k in ('sl', 'tp', 'ts')): return False
+        tick = self.feed.latest(symbol, max_age=float(config.get('price_feed_max_age', 5)))
+        if tick is None: return False
+
+        self._last_eval[symbol] = time.time()
+        with state.risk_lock:
+            if not state.position_info or state.position_predates_close(): return False # Cerrada mientras esperábamos el lock
+            self.evaluations += 1
+            marked = mark_position(state.position_info, tick.price, config.get('leverage'))
+            snapshot = MarketSnapshot.from_market_data(
+                symbol, config.get('timeframe', '15m'),
+                {'price': tick.price, 'ohlcv': state.df_ohlcv, 'balance': state.last_balance, 'position': marked},
+                fetched_at=tick.received_at)
+            for reason in worker._risk_exit_signals(snapshot, filters, config, exchange=self.exchange):
+                if self._close(snapshot, reason): return True
+        return False
+
+    def _close(self, snapshot, reason):
+        worker = self.worker
+        symbol = snapshot.symbol
+        worker.log_signal.emit(f"⚡ Vigilante de riesgo: cerrar {snapshot.position_side} {symbol} @ {snapshot.price} (Razón: {reason})")
+        try:
+            with worker.metrics.timer('order_close_watchdog'):
+                order_result = close_position(self.exchange, symbol, snapshot.position_info)
+            closed = worker._on_position_closed(snapshot, order_result, reason, exchange=self.exchange)
+        except Exception as e:
+            return worker._on_close_error(symbol, reason, e)
+        if closed:
+            self.closes += 1
+            worker._get_symbol_state(symbol).position_info = None # Hasta que el worker la vuelva a descargar
+        return closed
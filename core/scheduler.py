@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    from utils.state_manager import DEFAULT_TS_STATE
+except ImportError as e:
+    print(f"Error Crítico [Scheduler]: Fallo al importar DEFAULT_TS_STATE: {e}")
+    raise
+
+# --- Estado y planificación por símbolo para el worker multi-símbolo ---
+
+SCHEDULE_MODES = ("interval", "candle")
+
+_TIMEFRAME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'M': 2592000, 'y': 31536000}
+
+
+def timeframe_to_seconds(timeframe):
+    """Convierte un timeframe ccxt ('1m', '15m', '1h', '1d'...) a segundos. None si no es válido."""
+    try:
+        tf = str(timeframe).strip()
+        amount, unit = int(tf[:-1]), tf[-1]
+        if amount <= 0 or unit not in _TIMEFRAME_UNITS: return None
+        return amount * _TIMEFRAME_UNITS[unit]
+    except (ValueError, IndexError):
+        return None
+
+
+def next_candle_close(now, timeframe):
+    """
+    Epoch (s) del próximo cierre de vela para `timeframe`, alineado a UTC
+    como las velas de los exchanges. None si el timeframe no es válido.
+    """
+    tf_seconds = timeframe_to_seconds(timeframe)
+    if not tf_seconds: return None
+    unit = str(timeframe).strip()[-1]
+    if unit == 'M': # Velas mensuales: inicio de mes calendario (UTC)
+        months = int(str(timeframe).strip()[:-1])
+        dt = datetime.fromtimestamp(now, tz=timezone.utc)
+        index = (dt.year * 12 + dt.month - 1) // months * months + months
+        return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc).timestamp()
+    # Las velas semanales empiezan en lunes (el epoch 1970-01-01 fue jueves: +4 días)
+    offset = 4 * 86400 if unit == 'w' else 0
+    return (math.floor((now - offset) / tf_seconds) + 1) * tf_seconds + offset
+
+
+def parse_symbol_list(config):
+    """
+    Devuelve la lista ordenada (sin duplicados) de símbolos a operar.
+    El símbolo principal ('symbol') va siempre primero; 'symbols' es una
+    cadena separada por comas con los símbolos adicionales.
+    """
+    if not config: return []
+    symbols = []
+    primary = str(config.get('symbol') or '').strip()
+    if primary: symbols.append(primary)
+
+    extra = config.get('symbols', '')
+    if isinstance(extra, (list, tuple)): extra_items = extra
+    else: extra_items = str(extra or '').split(',')
+
+    for item in extra_items:
+        sym = str(item).strip()
+        if sym and sym not in symbols:
+            symbols.append(sym)
+    return symbols
+
+
+class SymbolState:
+    """
+    Estado independiente de un símbolo: Trailing Stop, última posición,
+    último precio/DataFrame y datos de planificación.
+    """
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.trailing_data = DEFAULT_TS_STATE.copy()
+        self.position_info = None
+        self.position_dirty = False # True tras abrir/cerrar: la posición conocida puede estar desfasada
+        self.last_price = None
+        self.df_ohlcv = None
+        self.last_balance = None
+        self.snapshot = None # Última MarketSnapshot (core.market_snapshot)
+        self.iterations = 0
+        self.last_run_at = None
+        self.next_strategy_at = None # Modo 'candle': hora de la próxima fase de estrategia (None = ya)
+        self.risk_lock = threading.RLock() # Serializa SL/TP/TS y cierres entre el worker y el RiskWatchdog
+        self.risk_context = None # (config, filtros) de la última iteración (los usa el RiskWatchdog)
+        self.last_close_at = None # Hora del último cierre enviado (worker o vigilante)
+        self.protective = None # ProtectiveOrders (SL/TP en el exchange) si 'protective_orders'
+
+    def position_predates_close(self, fetched_at=None):
+        """True si la posición conocida (o la de una foto con `fetched_at`) se descargó antes del último cierre."""
+        if self.last_close_at is None: return False
+        if fetched_at is None: fetched_at = self.snapshot.fetched_at if self.snapshot is not None else None
+        return fetched_at is not None and fetched_at <= self.last_close_at
+
+    def __repr__(self):
+        return f"SymbolState({self.symbol!r}, iter={self.iterations}, pos={'sí' if self.position_info else 'no'})"
+
+
+class SymbolScheduler:
+    """
+    Planificador cooperativo de iteraciones por símbolo.
+    Cada símbolo tiene una hora de vencimiento; `pop_due` devuelve el
+    símbolo más atrasado para que el worker lo procese en el mismo hilo.
+    Usa un heap con borrado perezoso (las entradas obsoletas se descartan al salir).
+    """
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._heap = []
+        self._due = {} # symbol -> timestamp de vencimiento vigente
+        self._counter = itertools.count() # Desempate estable (FIFO) entre vencimientos iguales
+
+    def __contains__(self, symbol):
+        return symbol in self._due
+
+    def __len__(self):
+        return len(self._due)
+
+    def symbols(self):
+        return list(self._due.keys())
+
+    def schedule(self, symbol, when=None):
+        """(Re)programa un símbolo para ejecutarse en `when` (epoch s). Por defecto, ya."""
+        if when is None: when = self._clock()
+        self._due[symbol] = when
+        heapq.heappush(self._heap, (when, next(self._counter), symbol))
+
+    def schedule_in(self, symbol, delay):
+        self.schedule(symbol, self._clock() + max(0.0, delay))
+
+    def remove(self, symbol):
+        """Quita un símbolo del planificador (su entrada en el heap queda obsoleta)."""
+        self._due.pop(symbol, None)
+
+    def _discard_stale(self):
+        while self._heap:
+            when, _, symbol = self._heap[0]
+            if self._due.get(symbol) == when: return
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now=None):
+        """Extrae el símbolo vencido más antiguo, o None si ninguno ha vencido."""
+        if now is None: now = self._clock()
+        self._discard_stale()
+        if not self._heap: return None
+        when, _, symbol = self._heap[0]
+        if when > now: return None
+        heapq.heappop(self._heap)
+        del self._due[symbol]
+        return symbol
+
+    def seconds_until_next(self, now=None, default=1.0):
+        """Segundos hasta el próximo vencimiento (0 si ya hay alguno vencido)."""
+        if now is None: now = self._clock()
+        self._discard_stale()
+        if not self._heap: return default
+        return max(0.0, self._heap[0][0] - now)
+
+    def sync(self, symbols, interval=0.0, running=()):
+        """
+        Sincroniza el conjunto de símbolos planificados con `symbols`.
+        Los nuevos se reparten (escalonados) dentro de `interval` para no
+        disparar todas las peticiones a la vez. `running` son los símbolos
+        ya extraídos con `pop_due` cuya iteración sigue en curso: cuentan
+        como planificados (ni se re-añaden ni se pierden al retirarlos).
+        Devuelve (añadidos, eliminados).
+        """
+        wanted = list(symbols)
+        known = list(self._due) + [s for s in running if s not in self._due]
+        removed = [s for s in known if s not in wanted]
+        for s in removed: self.remove(s)
+        added = [s for s in wanted if s not in self._due and s not in running]
+        now = self._clock()
+        step = (interval / len(wanted)) if wanted and interval > 0 else 0.0
+        for s in added:
+            self.schedule(s, now + wanted.index(s) * step)
+        return added, removed
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import traceback
+
+# --- Señales para el worker: Qt (GUI) o callbacks puros (modo headless) ---
+# Con la GUI se usan QObject/pyqtSignal de PyQt5 tal cual. En un servidor
+# sin pantalla (BOT_HEADLESS=1, o PyQt5 no instalado) se usan estas clases
+# con la misma API (`connect`, `disconnect`, `emit`), así BotWorker no
+# necesita Qt ni carga sus librerías (menos memoria y arranque más rápido).
+
+HEADLESS = os.environ.get('BOT_HEADLESS', '').strip().lower() in ('1', 'true', 'yes', 'si')
+
+
+class BoundSignal:
+    """Señal de una instancia: lista de callbacks llamados en el hilo que emite."""
+    __slots__ = ('_slots', '_lock')
+
+    def __init__(self):
+        self._slots = []
+        self._lock = threading.Lock()
+
+    def connect(self, slot):
+        if not callable(slot): raise TypeError(f"Slot no invocable: {slot!r}")
+        with self._lock: self._slots.append(slot)
+
+    def disconnect(self, slot=None):
+        with self._lock:
+            if slot is None: self._slots.clear()
+            else: self._slots.remove(slot)
+
+    def emit(self, *args):
+        with self._lock: slots = list(self._slots)
+        for slot in slots:
+            try:
+                slot(*args)
+            except Exception: # Un callback roto no debe tumbar el worker
+                print(f"Error [Signal]: Excepción en callback {getattr(slot, '__name__', slot)}:")
+                traceback.print_exc()
+
+
+class Signal:
+    """Descriptor equivalente a pyqtSignal: `log_signal = Signal(str)` a nivel de clase."""
+    def __init__(self, *types):
+        self.types = types
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None: return self
+        signal = instance.__dict__.get(self.name)
+        if signal is None:
+            signal = BoundSignal(); instance.__dict__[self.name] = signal
+        return signal
+
+
+class SignalObject:
+    """Sustituto mínimo de QObject para el modo headless."""
+    def __init__(self, parent=None):
+        self._parent = parent
+
+    def moveToThread(self, thread): # Compatibilidad con el código de la GUI
+        pass
+
+
+if HEADLESS:
+    QObject, pyqtSignal = SignalObject, Signal
+else:
+    try:
+        from PyQt5.QtCore import QObject, pyqtSignal
+    except ImportError:
+        print("Advertencia [Signals]: PyQt5 no disponible. Usando señales por callbacks (modo headless).")
+        HEADLESS = True
+        QObject, pyqtSignal = SignalObject, Signal
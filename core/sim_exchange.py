@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import itertools
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+import ccxt
+
+try:
+    import ccxt.async_support as ccxt_async
+except ImportError:
+    ccxt_async = None
+
+from .scheduler import timeframe_to_seconds
+
+# --- Exchange simulado en proceso (sin red) ---
+# Implementa la parte de ccxt que usa el bot (ticker, velas, balance,
+# posiciones, órdenes market/condicionales, precisión, apalancamiento)
+# sobre precios reproducidos (velas propias) o sintéticos (paseo aleatorio
+# con semilla). Sirve para medir el bucle completo de BotWorker sin tocar
+# un exchange real: latencia, fallos de red, deslizamiento, comisiones y
+# llenados parciales son configurables y deterministas (misma semilla =
+# misma secuencia).
+#
+# El estado de la cuenta (SimBook) se comparte por apiKey: los clones de
+# parallel_fetch / RiskWatchdog / PriceFeed y la instancia asyncio ven la
+# misma cuenta que el worker.
+
+DEFAULT_SYMBOLS = ('BTC/USDT:USDT',)
+QUOTE = 'USDT'
+
+_books = {} # apiKey -> SimBook
+_books_lock = threading.Lock()
+_book_ids = itertools.count(1)
+
+
+def _iso(ms):
+    return datetime.fromtimestamp(ms / 1000.0, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _rows_from(data):
+    """Velas [[ts_ms, o, h, l, c, v], ...] desde una lista o un DataFrame (índice datetime o columna 'timestamp')."""
+    if hasattr(data, 'columns'):
+        df = data
+        if 'timestamp' in df.columns: stamps = df['timestamp']
+        else: stamps = df.index
+        stamps = [int(getattr(ts, 'value', ts) // 1_000_000) if hasattr(ts, 'value') else int(ts) for ts in stamps]
+        return [[ts, float(o), float(h), float(l), float(c), float(v)] for ts, o, h, l, c, v in
+                zip(stamps, df['open'], df['high'], df['low'], df['close'], df['volume'])]
+    return [[int(r[0])] + [float(x) for x in r[1:6]] for r in data]
+
+
+class SimBook:
+    """
+    Estado de una cuenta simulada: trayectorias de precio, balance,
+    posiciones y órdenes. Seguro entre hilos (los clones comparten libro).
+
+    Reloj: con `candle_seconds` la vela actual avanza sola (una vela cada
+    `candle_seconds` segundos reales); sin él solo avanza con advance().
+    """
+    def __init__(self, symbols=DEFAULT_SYMBOLS, paths=None, timeframe='1m', start_price=100.0, volatility=0.002,
+                 balance=10000.0, history=500, candle_seconds=None, latency=0.0, fee_rate=0.0004, slippage_bps=0.0,
+                 fill_ratio=1.0, reject_rate=0.0, error_rate=0.0, seed=0, amount_step=0.001, price_tick=0.01,
+                 min_amount=0.001, clock=time.time):
+        self.timeframe = timeframe
+        self.tf_ms = (timeframe_to_seconds(timeframe) or 60) * 1000
+        self.start_price = float(start_price)
+        self.volatility = float(volatility)
+        self.history = max(1, int(history))
+        self.candle_seconds = candle_seconds
+        self.latency = latency # Segundos por llamada, o (mín, máx) con jitter determinista
+        self.fee_rate = float(fee_rate)
+        self.slippage_bps = float(slippage_bps)
+        self.fill_ratio = max(0.0, min(1.0, float(fill_ratio)))
+        self.reject_rate = float(reject_rate)
+        self.error_rate = float(error_rate)
+        self.seed = seed
+        self.amount_step, self.price_tick, self.min_amount = float(amount_step), float(price_tick), float(min_amount)
+        self.clock = clock
+
+        self._lock = threading.RLock()
+        self._rng = random.Random(seed) # Latencia, rechazos y fallos
+        self._order_ids = itertools.count(1)
+        self.wallet = float(balance)
+        self.positions = {} # symbol -> {'side', 'contracts', 'entry', 'leverage', 'margin'}
+        self.leverage = {} # symbol -> apalancamiento fijado con set_leverage
+        self.open_orders = {} # id -> orden condicional pendiente
+        self.trades = [] # Llenados ejecutados (para inspeccionar la simulación)
+        self.calls = {} # Nombre de llamada -> número (carga de API generada por el bot)
+
+        self._paths = {} # symbol -> velas
+        self._replayed = set()
+        self._walkers = {}
+        now_ms = int(self.clock() * 1000)
+        self._origin_ms = now_ms // self.tf_ms * self.tf_ms - (self.history - 1) * self.tf_ms
+        for symbol, data in (paths or {}).items():
+            self._paths[symbol] = _rows_from(data); self._replayed.add(symbol)
+        for symbol in symbols:
+            if symbol not in self._paths: self._paths[symbol] = []
+        self._steps = 0 # Velas avanzadas con advance()
+        self._started_at = self.clock()
+        self._processed = {} # symbol -> último índice revisado para órdenes condicionales
+
+    # --- Trayectorias ---
+    def symbols(self):
+        return sorted(self._paths)
+
+    def _cursor(self, symbol):
+        """Índice de la vela actual del símbolo (las reproducidas se quedan en la última al agotarse)."""
+        steps = self._steps
+        if self.candle_seconds: steps += int((self.clock() - self._started_at) / float(self.candle_seconds))
+        index = self.history - 1 + steps
+        if symbol in self._replayed: return min(index, len(self._paths[symbol]) - 1)
+        self._extend(symbol, index)
+        return index
+
+    def _extend(self, symbol, upto):
+        """Genera velas sintéticas (paseo log-normal con semilla por símbolo) hasta `upto`."""
+        rows = self._paths[symbol]
+        if len(rows) > upto: return
+        walker = self._walkers.get(symbol)
+        if walker is None: walker = self._walkers[symbol] = random.Random(f"{self.seed}:{symbol}")
+        vol = self.volatility
+        while len(rows) <= upto:
+            prev_close = rows[-1][4] if rows else self.start_price
+            close = prev_close * math.exp(walker.gauss(0, vol))
+            high = max(prev_close, close) * (1 + abs(walker.gauss(0, vol / 2)))
+            low = min(prev_close, close) * (1 - abs(walker.gauss(0, vol / 2)))
+            rows.append([self._origin_ms + len(rows) * self.tf_ms, prev_close, high, low, close, round(walker.uniform(10, 1000), 3)])
+
+    def _row(self, symbol):
+        if symbol not in self._paths: raise ccxt.BadSymbol(f"sim: símbolo {symbol} no existe")
+        index = self._cursor(symbol)
+        if index < 0: raise ccxt.ExchangeError(f"sim: sin velas para {symbol}")
+        self._process_triggers(symbol, index)
+        return self._paths[symbol][index]
+
+    def price(self, symbol):
+        with self._lock: return self._row(symbol)[4]
+
+    def advance(self, candles=1):
+        """Avanza el reloj simulado `candles` velas (dispara las órdenes condicionales cruzadas)."""
+        with self._lock:
+            self._steps += int(candles)
+            for symbol in self._paths: self._row(symbol)
+
+    # --- Fallos y latencia simulados ---
+    def before_call(self, name):
+        """Cuenta la llamada y decide latencia / fallo. Devuelve los segundos a esperar (fuera del lock)."""
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self.error_rate and self._rng.random() < self.error_rate:
+                raise ccxt.NetworkError(f"sim: error de red simulado en {name}")
+            latency = self.latency
+            if isinstance(latency, (tuple, list)): return self._rng.uniform(float(latency[0]), float(latency[1]))
+            return float(latency or 0.0)
+
+    # --- Mercados y precisión ---
+    def market_list(self):
+        markets = []
+        for symbol in self.symbols():
+            base = symbol.split('/')[0]
+            markets.append({
+                'id': symbol.replace('/', '').replace(':' + QUOTE, ''), 'symbol': symbol,
+                'base': base, 'quote': QUOTE, 'settle': QUOTE, 'baseId': base, 'quoteId': QUOTE, 'settleId': QUOTE,
+                'type': 'swap', 'spot': False, 'margin': False, 'swap': True, 'future': False, 'option': False,
+                'contract': True, 'linear': True, 'inverse': False, 'active': True, 'contractSize': 1.0,
+                'taker': self.fee_rate, 'maker': self.fee_rate,
+                'precision': {'amount': self.amount_step, 'price': self.price_tick},
+                'limits': {'amount': {'min': self.min_amount, 'max': None}, 'leverage': {'min': 1, 'max': 125},
+                           'price': {'min': None, 'max': None}, 'cost': {'min': None, 'max': None}},
+                'info': {},
+            })
+        return markets
+
+    def amount_to_precision(self, amount):
+        return math.floor(float(amount) / self.amount_step + 1e-9) * self.amount_step
+
+    def price_to_precision(self, price):
+        return round(round(float(price) / self.price_tick) * self.price_tick, 10)
+
+    # --- Lecturas ---
+    def ticker(self, symbol):
+        with self._lock:
+            ts, _, high, low, close, volume = self._row(symbol)
+            spread = self.price_tick / 2
+            return {'symbol': symbol, 'timestamp': ts, 'datetime': _iso(ts), 'last': close, 'close': close,
+                    'bid': close - spread, 'ask': close + spread, 'high': high, 'low': low, 'baseVolume': volume, 'info': {}}
+
+    def ohlcv(self, symbol, timeframe=None, since=None, limit=None):
+        """Velas hasta la actual (incluida, en curso). Timeframes mayores se agregan desde el base."""
+        with self._lock:
+            self._row(symbol)
+            rows = self._paths[symbol][:self._cursor(symbol) + 1]
+        tf_ms = (timeframe_to_seconds(timeframe) or 0) * 1000 if timeframe else self.tf_ms
+        if tf_ms != self.tf_ms:
+            if tf_ms <= 0 or tf_ms % self.tf_ms: raise ccxt.NotSupported(f"sim: timeframe {timeframe} no es múltiplo de {self.timeframe}")
+            rows = self._resample(rows, tf_ms)
+        if since is not None:
+            rows = [r for r in rows if r[0] >= since]
+            return [list(r) for r in (rows[:limit] if limit else rows)]
+        return [list(r) for r in (rows[-limit:] if limit else rows)]
+
+    @staticmethod
+    def _resample(rows, tf_ms):
+        out = []
+        for ts, o, h, l, c, v in rows:
+            bucket = ts // tf_ms * tf_ms
+            if out and out[-1][0] == bucket:
+                last = out[-1]; last[2] = max(last[2], h); last[3] = min(last[3], l); last[4] = c; last[5] += v
+            else: out.append([bucket, o, h, l, c, v])
+        return out
+
+    def _unrealized(self, symbol, pos):
+        direction = 1 if pos['side'] == 'long' else -1
+        return (self._row(symbol)[4] - pos['entry']) * pos['contracts'] * direction
+
+    def balance(self):
+        with self._lock:
+            used = sum(p['margin'] for p in self.positions.values())
+            unrealized = sum(self._unrealized(s, p) for s, p in self.positions.items())
+            total = self.wallet + unrealized
+            free = max(0.0, self.wallet - used + min(0.0, unrealized))
+            entry = {'free': free, 'used': used, 'total': total}
+            return {QUOTE: dict(entry), 'free': {QUOTE: free}, 'used': {QUOTE: used}, 'total': {QUOTE: total},
+                    'info': {'assets': [{'asset': QUOTE, 'walletBalance': self.wallet, 'availableBalance': free}]}}
+
+    def position_list(self, symbols=None):
+        with self._lock:
+            result = []
+            for symbol, pos in self.positions.items():
+                if symbols and symbol not in symbols: continue
+                mark = self._row(symbol)[4]
+                unrealized = self._unrealized(symbol, pos)
+                result.append({
+                    'symbol': symbol, 'side': pos['side'], 'contracts': pos['contracts'], 'contractSize': 1.0,
+                    'entryPrice': pos['entry'], 'markPrice': mark, 'notional': pos['contracts'] * mark,
+                    'unrealizedPnl': unrealized, 'percentage': unrealized / pos['margin'] * 100 if pos['margin'] else None,
+                    'leverage': pos['leverage'], 'initialMargin': pos['margin'], 'marginMode': 'cross',
+                    'liquidationPrice': None, 'timestamp': pos['opened_at'], 'datetime': _iso(pos['opened_at']),
+                    'stopLossPrice': None, 'takeProfitPrice': None,
+                    'info': {'initial_margin': str(pos['margin']), 'cross_leverage_limit': str(pos['leverage'])},
+                })
+            return result
+
+    # --- Órdenes ---
+    def set_leverage(self, leverage, symbol):
+        with self._lock:
+            if symbol not in self._paths: raise ccxt.BadSymbol(f"sim: símbolo {symbol} no existe")
+            self.leverage[symbol] = float(leverage)
+            return {'symbol': symbol, 'leverage': float(leverage)}
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        params = dict(params or {})
+        with self._lock:
+            row = self._row(symbol)
+            if self.reject_rate and self._rng.random() < self.reject_rate:
+                raise ccxt.InvalidOrder(f"sim: orden rechazada (simulado) {side} {amount} {symbol}")
+            amount = self.amount_to_precision(amount)
+            if amount < self.min_amount: raise ccxt.InvalidOrder(f"sim: cantidad {amount} < mínima {self.min_amount}")
+            trigger = params.get('stopLossPrice') or params.get('takeProfitPrice') or params.get('stopPrice') or params.get('triggerPrice')
+            if trigger:
+                kind = 'take_profit' if params.get('takeProfitPrice') else 'stop'
+                order = self._order_dict(symbol, 'market', side, amount, row[0], status='open', reduce_only=bool(params.get('reduceOnly')))
+                order.update({'triggerPrice': float(trigger), 'stopPrice': float(trigger), 'info': {'kind': kind}})
+                self.open_orders[order['id']] = order
+                return dict(order)
+            if str(type).lower() != 'market': raise ccxt.NotSupported("sim: solo órdenes market o condicionales")
+            slip = self.slippage_bps / 10000.0
+            fill_price = row[4] * (1 + slip if side == 'buy' else 1 - slip)
+            return self._fill(symbol, side, amount, fill_price, row[0], bool(params.get('reduceOnly')), 'market')
+
+    def cancel_order(self, order_id, symbol=None):
+        with self._lock:
+            order = self.open_orders.pop(str(order_id), None)
+            if order is None: raise ccxt.OrderNotFound(f"sim: orden {order_id} no encontrada")
+            order.update({'status': 'canceled', 'remaining': order['amount']})
+            return dict(order)
+
+    def fetch_open_orders(self, symbol=None):
+        with self._lock:
+            return [dict(o) for o in self.open_orders.values() if symbol is None or o['symbol'] == symbol]
+
+    def _order_dict(self, symbol, type, side, amount, ts, status='closed', reduce_only=False):
+        return {'id': str(next(self._order_ids)), 'clientOrderId': None, 'timestamp': ts, 'datetime': _iso(ts),
+                'symbol': symbol, 'type': type, 'side': side, 'amount': amount, 'filled': 0.0, 'remaining': amount,
+                'price': None, 'average': None, 'cost': 0.0, 'status': status, 'reduceOnly': reduce_only,
+                'fee': {'cost': 0.0, 'currency': QUOTE}, 'trades': [], 'info': {}}
+
+    def _fill(self, symbol, side, amount, fill_price, ts, reduce_only, type, order=None):
+        """Ejecuta un llenado contra la posición del símbolo (abre, suma, reduce o da la vuelta)."""
+        pos = self.positions.get(symbol)
+        direction = 'long' if side == 'buy' else 'short'
+        if reduce_only:
+            if pos is None or pos['side'] == direction:
+                raise ccxt.InvalidOrder(f"sim: ReduceOnly rechazada, no hay posición que reducir en {symbol}")
+            amount = min(amount, pos['contracts'])
+        filled = self.amount_to_precision(amount * self.fill_ratio) if self.fill_ratio < 1.0 else amount
+        if filled <= 0: raise ccxt.InvalidOrder(f"sim: llenado nulo para {amount} {symbol}")
+
+        leverage = self.leverage.get(symbol, 1.0)
+        realized = 0.0
+        remaining = filled
+        if pos is not None and pos['side'] != direction: # Reducir (y quizá dar la vuelta)
+            closed = min(remaining, pos['contracts'])
+            sign = 1 if pos['side'] == 'long' else -1
+            realized = (fill_price - pos['entry']) * closed * sign
+            pos['margin'] *= (pos['contracts'] - closed) / pos['contracts']
+            pos['contracts'] = round(pos['contracts'] - closed, 12)
+            remaining = round(remaining - closed, 12)
+            if pos['contracts'] <= 1e-12: self.positions.pop(symbol, None); pos = None
+        if remaining > 0: # Abrir o aumentar
+            margin = remaining * fill_price / leverage
+            used = sum(p['margin'] for p in self.positions.values())
+            if margin > self.wallet + realized - used + 1e-9:
+                if remaining == filled: raise ccxt.InsufficientFunds(f"sim: margen insuficiente ({margin:.2f} {QUOTE})")
+                filled = round(filled - remaining, 12); remaining = 0.0 # Solo la parte que reduce
+            elif pos is None:
+                self.positions[symbol] = {'side': direction, 'contracts': remaining, 'entry': fill_price,
+                                          'leverage': leverage, 'margin': margin, 'opened_at': ts}
+            else:
+                total = pos['contracts'] + remaining
+                pos['entry'] = (pos['entry'] * pos['contracts'] + fill_price * remaining) / total
+                pos['contracts'] = total; pos['margin'] += margin
+
+        fee = filled * fill_price * self.fee_rate
+        self.wallet += realized - fee
+        if order is None: order = self._order_dict(symbol, type, side, amount, ts, reduce_only=reduce_only)
+        order.update({'status': 'closed', 'filled': filled, 'remaining': round(order['amount'] - filled, 12),
+                      'price': fill_price, 'average': fill_price, 'cost': filled * fill_price,
+                      'fee': {'cost': fee, 'currency': QUOTE}})
+        self.trades.append({'timestamp': ts, 'symbol': symbol, 'side': side, 'amount': filled, 'price': fill_price,
+                            'fee': fee, 'realized_pnl': realized, 'order_id': order['id'], 'type': type})
+        return dict(order)
+
+    def _process_triggers(self, symbol, index):
+        """Revisa las órdenes condicionales del símbolo contra cada vela nueva (máx./mín. de la vela)."""
+        last = self._processed.get(symbol)
+        self._processed[symbol] = index
+        if last is None or index <= last: return
+        pending = [o for o in self.open_orders.values() if o['symbol'] == symbol]
+        if not pending: return
+        for ts, o, h, l, c, v in self._paths[symbol][last + 1:index + 1]:
+            for order in list(pending):
+                trigger, kind = order['triggerPrice'], order['info'].get('kind')
+                falling = (order['side'] == 'sell') == (kind == 'stop') # Stop de long / TP de short: dispara al bajar
+                if falling and l <= trigger: fill_price = min(o, trigger)
+                elif not falling and h >= trigger: fill_price = max(o, trigger)
+                else: continue
+                self.open_orders.pop(order['id'], None); pending.remove(order)
+                try: self._fill(symbol, order['side'], order['amount'], fill_price, ts, order['reduceOnly'], kind, order=order)
+                except ccxt.InvalidOrder: order.update({'status': 'expired'}) # Posición ya cerrada
+
+    def stats(self):
+        """Resumen de la simulación: balance, llamadas, operaciones y PNL realizado."""
+        with self._lock:
+            return {'wallet': self.wallet, 'positions': len(self.positions), 'open_orders': len(self.open_orders),
+                    'trades': len(self.trades), 'realized_pnl': sum(t['realized_pnl'] for t in self.trades),
+                    'fees': sum(t['fee'] for t in self.trades), 'calls': dict(self.calls)}
+
+
+def register_book(book, api_key=None):
+    """Registra el libro con una apiKey (generada si no se da) y la devuelve."""
+    api_key = api_key or f"sim-{next(_book_ids)}"
+    with _books_lock: _books[api_key] = book
+    return api_key
+
+
+def book_for(api_key):
+    with _books_lock: return _books.get(api_key)
+
+
+def _resolve_book(exchange, book):
+    if book is not None:
+        exchange.apiKey = register_book(book, exchange.apiKey or None)
+        return book
+    book = book_for(exchange.apiKey)
+    if book is None: # Instancia nueva sin libro: cuenta por defecto
+        book = SimBook()
+        exchange.apiKey = register_book(book, exchange.apiKey or None)
+    return book
+
+
+_SIM_DESCRIPTION = {
+    'id': 'sim', 'name': 'Simulado', 'countries': [], 'rateLimit': 10, 'pro': False,
+    'has': {'swap': True, 'fetchTicker': True, 'fetchOHLCV': True, 'fetchBalance': True, 'fetchPositions': True,
+            'createOrder': True, 'createMarketOrder': True, 'cancelOrder': True, 'fetchOpenOrders': True,
+            'setLeverage': True, 'editOrder': False},
+    'timeframes': {tf: tf for tf in ('1m', '3m', '5m', '15m', '30m', '1h', '2h', '4h', '6h', '8h', '12h', '1d')},
+}
+
+
+class SimExchange(ccxt.Exchange):
+    """
+    ccxt.Exchange en proceso sobre un SimBook (pasa el isinstance del
+    worker). Ejemplo:
+
+        book = SimBook(symbols=['BTC/USDT:USDT'], candle_seconds=1, latency=(0.02, 0.08))
+        exchange = SimExchange(book=book)
+    """
+    def __init__(self, config=None, book=None):
+        super().__init__(config or {})
+        self.book = _resolve_book(self, book)
+        self.set_markets(self.book.market_list())
+
+    def describe(self):
+        return self.deep_extend(super().describe(), _SIM_DESCRIPTION)
+
+    def _call(self, name):
+        wait = self.book.before_call(name)
+        if wait > 0: time.sleep(wait)
+
+    def create_async_twin(self):
+        """Instancia asyncio sobre el mismo libro (la usa create_async_exchange)."""
+        return AsyncSimExchange({'apiKey': self.apiKey}, book=self.book)
+
+    def fetch_markets(self, params={}):
+        return self.book.market_list()
+
+    def fetch_currencies(self, params={}):
+        return {}
+
+    def amount_to_precision(self, symbol, amount):
+        return self.number_to_string(self.book.amount_to_precision(amount))
+
+    def price_to_precision(self, symbol, price):
+        return self.number_to_string(self.book.price_to_precision(price))
+
+    def fetch_ticker(self, symbol, params={}):
+        self._call('fetch_ticker'); return self.book.ticker(symbol)
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        self._call('fetch_ohlcv'); return self.book.ohlcv(symbol, timeframe, since, limit)
+
+    def fetch_balance(self, params={}):
+        self._call('fetch_balance'); return self.book.balance()
+
+    def fetch_positions(self, symbols=None, params={}):
+        self._call('fetch_positions'); return self.book.position_list(symbols)
+
+    def set_leverage(self, leverage, symbol=None, params={}):
+        self._call('set_leverage'); return self.book.set_leverage(leverage, symbol)
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self._call('create_order'); return self.book.create_order(symbol, type, side, amount, price, params)
+
+    def cancel_order(self, id, symbol=None, params={}):
+        self._call('cancel_order'); return self.book.cancel_order(id, symbol)
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self._call('fetch_open_orders'); return self.book.fetch_open_orders(symbol)
+
+
+if ccxt_async is not None:
+    class AsyncSimExchange(ccxt_async.Exchange):
+        """Versión ccxt.async_support de SimExchange (mismo libro; la latencia no bloquea el event loop)."""
+        def __init__(self, config=None, book=None):
+            super().__init__(config or {})
+            self.book = _resolve_book(self, book)
+            self.set_markets(self.book.market_list())
+
+        def describe(self):
+            return self.deep_extend(super().describe(), _SIM_DESCRIPTION)
+
+        async def _call(self, name):
+            wait = self.book.before_call(name)
+            if wait > 0: await asyncio.sleep(wait)
+
+        async def fetch_markets(self, params={}):
+            return self.book.market_list()
+
+        async def fetch_currencies(self, params={}):
+            return {}
+
+        def amount_to_precision(self, symbol, amount):
+            return self.number_to_string(self.book.amount_to_precision(amount))
+
+        def price_to_precision(self, symbol, price):
+            return self.number_to_string(self.book.price_to_precision(price))
+
+        async def fetch_ticker(self, symbol, params={}):
+            await self._call('fetch_ticker'); return self.book.ticker(symbol)
+
+        async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+            await self._call('fetch_ohlcv'); return self.book.ohlcv(symbol, timeframe, since, limit)
+
+        async def fetch_balance(self, params={}):
+            await self._call('fetch_balance'); return self.book.balance()
+
+        async def fetch_positions(self, symbols=None, params={}):
+            await self._call('fetch_positions'); return self.book.position_list(symbols)
+
+        async def set_leverage(self, leverage, symbol=None, params={}):
+            await self._call('set_leverage'); return self.book.set_leverage(leverage, symbol)
+
+        async def create_order(self, symbol, type, side, amount, price=None, params={}):
+            await self._call('create_order'); return self.book.create_order(symbol, type, side, amount, price, params)
+
+        async def cancel_order(self, id, symbol=None, params={}):
+            await self._call('cancel_order'); return self.book.cancel_order(id, symbol)
+
+        async def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+            await self._call('fetch_open_orders'); return self.book.fetch_open_orders(symbol)
+else:
+    AsyncSimExchange = None
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pandas as pd
+
+# --- Canal de actualizaciones de la GUI (deltas agrupados) ---
+# El worker ya no manda en cada iteración el DataFrame completo + posición +
+# precio: deja aquí los valores nuevos y el coalescedor solo emite lo que
+# cambió desde el último envío (campos de posición distintos, velas nuevas o
+# la vela en curso actualizada), como mucho `max_fps` veces por segundo.
+# Un bucle rápido ya no satura el hilo de la GUI.
+
+DEFAULT_MAX_FPS = 4.0
+
+
+class UIUpdateCoalescer:
+    """
+    Acumula cambios del símbolo mostrado y los entrega como un único dict:
+      {'symbol', 'seq', 'reset'?, 'price'?, 'position'? (solo campos cambiados),
+       'ohlcv'? (velas nuevas o actualizadas), 'ohlcv_length'?, 'ohlcv_reset'?}
+    Con 'reset' la GUI descarta todo su estado (símbolo nuevo); con
+    'ohlcv_reset' las velas recibidas sustituyen a las que tenía (no contiguas).
+    Seguro entre hilos (el worker asyncio y el de hilos publican desde su hilo).
+    """
+    def __init__(self, max_fps=DEFAULT_MAX_FPS):
+        self._lock = threading.Lock()
+        self.set_max_fps(max_fps)
+        self._last_flush = 0.0
+        self._seq = 0
+        self._reset_state(None)
+
+    def set_max_fps(self, max_fps):
+        try: max_fps = float(max_fps)
+        except (TypeError, ValueError): max_fps = DEFAULT_MAX_FPS
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+
+    def _reset_state(self, symbol):
+        self.symbol = symbol
+        self._sent_price = None
+        self._sent_position = {}
+        self._sent_last_ts = None # Timestamp de la última vela enviada
+        self._sent_last_row = None # Valores de esa vela (para detectar la vela en curso actualizada)
+        self._pending = {'reset': True} if symbol is not None else {}
+
+    def _ensure_symbol(self, symbol):
+        if symbol != self.symbol: self._reset_state(symbol)
+
+    # --- Publicación (hilo del worker) ---
+    def publish_price(self, symbol, price):
+        with self._lock:
+            self._ensure_symbol(symbol)
+            if price != self._sent_price: self._pending['price'] = price
+            else: self._pending.pop('price', None)
+
+    def publish_position(self, symbol, position_data):
+        with self._lock:
+            self._ensure_symbol(symbol)
+            pending = self._pending.setdefault('position', {})
+            for k, v in position_data.items():
+                if k not in self._sent_position or not _same(self._sent_position[k], v): pending[k] = v
+                else: pending.pop(k, None) # Volvió al valor ya enviado
+            if not pending: del self._pending['position']
+
+    def publish_ohlcv(self, symbol, df):
+        """Solo se copian las velas desde la última enviada (normalmente 1 o 2 filas)."""
+        if df is None or df.empty: return
+        with self._lock:
+            self._ensure_symbol(symbol)
+            start = None
+            if self._sent_last_ts is not None and not self._pending.get('ohlcv_reset'):
+                pos = df.index.searchsorted(self._sent_last_ts)
+                if pos < len(df) and df.index[pos] == self._sent_last_ts: start = pos
+            if start is None: # Primer envío o velas no contiguas: se manda todo
+                self._pending['ohlcv_reset'] = True
+                tail = df.copy()
+            else:
+                if start == len(df) - 1 and _same_row(df.iloc[-1], self._sent_last_row): return # Nada nuevo
+                tail = df.iloc[start:].copy()
+            pending = self._pending.get('ohlcv')
+            if pending is not None and start is not None: # Aún sin entregar: se une con lo nuevo
+                tail = pd.concat([pending[pending.index < tail.index[0]], tail])
+            self._pending['ohlcv'] = tail
+            self._pending['ohlcv_length'] = len(df)
+            self._sent_last_ts = df.index[-1]; self._sent_last_row = df.iloc[-1].copy()
+
+    # --- Entrega (limitada a max_fps) ---
+    def has_pending(self):
+        with self._lock: return bool(self._pending)
+
+    def seconds_until_flush(self, now=None):
+        """Segundos hasta poder entregar lo pendiente; None si no hay nada pendiente."""
+        with self._lock:
+            if not self._pending: return None
+            now = time.monotonic() if now is None else now
+            return max(0.0, self._last_flush + self.min_interval - now)
+
+    def take(self, now=None):
+        """Devuelve el delta pendiente si ya toca (respetando max_fps); None si no."""
+        with self._lock:
+            if not self._pending: return None
+            now = time.monotonic() if now is None else now
+            if now - self._last_flush < self.min_interval: return None
+            delta, self._pending = self._pending, {}
+            if 'price' in delta: self._sent_price = delta['price']
+            if 'position' in delta: self._sent_position.update(delta['position'])
+            self._last_flush = now; self._seq += 1
+            delta['symbol'] = self.symbol; delta['seq'] = self._seq
+            return delta
+
+
+def _same(a, b):
+    try:
+        if pd.isna(a) and pd.isna(b): return True
+    except (TypeError, ValueError): pass
+    try: return bool(a == b)
+    except Exception: return False
+
+
+def _same_row(row, sent_row):
+    if sent_row is None: return False
+    try: return row.equals(sent_row)
+    except Exception: return False
+
+
+def apply_ohlcv_delta(df_current, rows, length=None, reset=False):
+    """
+    Lado GUI: integra las velas recibidas en el DataFrame que se muestra.
+    Las filas con el mismo timestamp se sustituyen (vela en curso) y las
+    nuevas se añaden; se recorta a `length` velas como el DataFrame del worker.
+    """
+    if reset or df_current is None or df_current.empty: merged = rows
+    elif rows is None or rows.empty: merged = df_current
+    else: merged = pd.concat([df_current[df_current.index < rows.index[0]], rows])
+    if length and merged is not None and len(merged) > length: merged = merged.iloc[-length:]
+    return merged
@@ -1,5 +1,5 @@
 # src/core/worker.py
-from PyQt5.QtCore import QObject, pyqtSignal
+from .signals import QObject, pyqtSignal # PyQt5, o callbacks en modo headless (BOT_HEADLESS=1)
 import ccxt
 import time
 import traceback
@@ -11,7 +11,7 @@ import math # <- Necesario si usas TS PNL-based
 from .exchange_utils import (
     get_ohlcv, get_position_status, fetch_price, fetch_balance,
     open_long_position, open_short_position, close_position,
-    calculate_order_size
+    calculate_order_size, set_leverage
 )
 try:
     from .stop_loss import execute_stop_loss
@@ -39,13 +39,29 @@ except ImportError as e:
 try:
     from strategies import STRATEGY_MAP, load_dynamic_custom_strategy # <-- Añadir la nueva función aquí
     from strategies.indicators import calculate_emas, calculate_rsi
+    from strategies.streaming_indicators import IndicatorEngine
+    from strategies.indicator_cache import INDICATOR_CACHE, cached_indicator, remember_indicator
+    from strategies import active_requirements
+    from strategies.requirements import WORKER_COLUMNS, default_requirements, merge_requirements
     from utils.state_manager import load_ts_state, save_ts_state, DEFAULT_TS_STATE
 except ImportError as e:
     print(f"Error Crítico [Worker]: Fallo al importar dependencias de strategies/utils: {e}")
     raise ImportError(f"Fallo importación worker: {e}") from e
 
+from .market_snapshot import MarketSnapshot
+from .metrics import METRICS
+from .ohlcv_cache import OHLCVCache
+from .parallel_fetch import MarketDataFetcher, MARKET_DATA_PARTS
+from .price_feed import create_price_feed
+from .protective_orders import ProtectiveOrders, RECONCILE_GRACE, fetch_open_order_ids
+from .risk_watchdog import RiskWatchdog
+from .scheduler import SCHEDULE_MODES, SymbolScheduler, SymbolState, parse_symbol_list, next_candle_close
+from .ui_updates import UIUpdateCoalescer
+
 # --- Fin Importaciones ---
 
+OHLCV_MARGIN = 50 # Velas extra sobre el lookback declarado (convergencia de EMAs/RSI al descargar)
+CLOSE_SETTLE_SECONDS = 2.0 # Tras un cierre, la siguiente iteración del símbolo espera esto (releer la posición ya cerrada)
 
 
 class BotWorker(QObject):
@@ -55,11 +71,13 @@ class BotWorker(QObject):
     position_signal = pyqtSignal(dict) # Sigue enviando estado y EMAs actuales
     price_signal = pyqtSignal(float)   # Sigue enviando precio actual
     ohlcv_signal = pyqtSignal(object)  # <-- NUEVA SEÑAL para enviar el DataFrame OHLCV
+    ui_update_signal = pyqtSignal(dict) # Deltas agrupados (precio/posición/velas cambiadas), máx. 'ui_max_fps' por segundo
     finished = pyqtSignal()
     error_signal = pyqtSignal(str, str)
     # --- Fin Señales ---
 
-    # --- __init__ (sin cambios necesarios aquí) ---
+    # --- __init__ ---
+    # (Estado por símbolo + planificador para operar varios mercados en un solo worker)
     def __init__(self, exchange, get_active_strategies_fn, get_active_filters_fn, get_config_fn, parent=None):
         super().__init__(parent)
         self.exchange = exchange
@@ -67,12 +85,23 @@ class BotWorker(QObject):
         self.get_active_filters_fn = get_active_filters_fn
         self.get_config_fn = get_config_fn
         self._running = False
-        self.trailing_data = DEFAULT_TS_STATE.copy()
-        self.current_symbol = None
+        self.symbol_states = {} # symbol -> SymbolState (TS, posición, último DF)
+        self.scheduler = SymbolScheduler()
+        self.primary_symbol = None # Símbolo cuyo estado se muestra en la GUI
+        self.fetcher = None # MarketDataFetcher (se crea al usar 'parallel_fetch')
+        self.ohlcv_cache = OHLCVCache() # Velas por (símbolo, timeframe) con descarga incremental
+        self.indicator_engines = {} # (símbolo, timeframe) -> IndicatorEngine (EMA/RSI incrementales)
+        self.metrics = METRICS # Latencias por etapa y por llamada al exchange (p50/p95/p99)
+        self._metrics_pending = 0 # Iteraciones desde la última exportación de métricas
+        self.ui_updates = UIUpdateCoalescer() # Solo lo que cambió, limitado a 'ui_max_fps' (si 'ui_coalesce')
+        self.price_feed = None # PriceFeed con el último tick por símbolo (config 'price_feed' o set_price_feed)
+        self._owns_price_feed = False
+        self.risk_watchdog = None # RiskWatchdog (SL/TP/TS con cada tick) si 'risk_watchdog'
         print("Debug Worker: __init__ completado.")
 
-    # --- run() MODIFICADA ---
-    # (Añadir emisión de ohlcv_signal)
+    # --- run() MULTI-SÍMBOLO ---
+    # El bucle principal ya no procesa un único símbolo: en cada vuelta extrae
+    # del planificador el símbolo vencido y ejecuta SU iteración completa.
     def run(self):
         if not isinstance(self.exchange, ccxt.Exchange):
             self.log_signal.emit("❌ Error Crítico: Instancia de Exchange inválida."); self.finished.emit(); return
@@ -93,206 +122,548 @@ class BotWorker(QObject):
             # self.finished.emit()
             # return
         # --- >>> FIN DE LA LLAMADA <<< ---
-        
-        
-        
-        
-        self._load_initial_ts_state()
 
         while self._running:
-            iteration_start_time = time.time()
             config = None
-            df_ohlcv = None
-            latest_ema_fast = None
-            latest_ema_slow = None
+            symbol = None
 
             try:
                 # 1. Config y Estado
                 config = self.get_config_fn()
                 if config is None: self.log_signal.emit("⚠️ Esperando configuración..."); time.sleep(15); continue
                 if not self._running: break
-                # ... (obtener strategies, filters, symbol, timeframe, etc.) ...
                 strategies = self.get_active_strategies_fn()
                 filters = self.get_active_filters_fn()
-                symbol = config.get('symbol')
-                timeframe = config.get('timeframe', '15m')
                 loop_interval = config.get('loop_interval', 10)
 
-                if symbol != self.current_symbol: self._reload_ts_state_for_new_symbol(symbol)
-                if not symbol: self.log_signal.emit("❌ Error: Símbolo no definido."); time.sleep(10); continue
-
-                # 2. Datos Mercado
-                current_price = fetch_price(self.exchange, symbol)
-                if current_price: self.price_signal.emit(current_price)
-                else: self.log_signal.emit(f"⚠️ No precio {symbol}."); self._interruptible_sleep(loop_interval); continue
-
-                limit = self._determine_ohlcv_limit(config, strategies)
-                df_ohlcv = get_ohlcv(self.exchange, symbol, timeframe=timeframe, limit=limit)
-                if df_ohlcv is None or df_ohlcv.empty: self.log_signal.emit(f"❌ No OHLCV {symbol}/{timeframe}."); self._interruptible_sleep(loop_interval); continue
-
-                # 3. Indicadores
-                df_ohlcv = self._calculate_indicators(df_ohlcv, config, strategies)
-
-                # ---> EMITIR SEÑAL OHLCV <---
-                if df_ohlcv is not None and not df_ohlcv.empty:
-                    
-                    self.ohlcv_signal.emit(df_ohlcv) # Enviar DataFrame completo
-                    #print(f"DEBUG WORKER: Emitiendo df_ohlcv con columnas: {df_ohlcv.columns.tolist()}") # <-- AÑADIR ESTA LÍNEA
-                    print(f"DEBUG WORKER: Emitiendo df_ohlcv: {df_ohlcv}") # <-- AÑADIR ESTA LÍNEA
-                    
-                # --------------------------
-
-                # Extraer últimas EMAs para position_signal (como antes)
-                if df_ohlcv is not None and not df_ohlcv.empty:
-                    if 'ema_fast' in df_ohlcv.columns and not pd.isna(df_ohlcv['ema_fast'].iloc[-1]): latest_ema_fast = df_ohlcv['ema_fast'].iloc[-1]
-                    if 'ema_slow' in df_ohlcv.columns and not pd.isna(df_ohlcv['ema_slow'].iloc[-1]): latest_ema_slow = df_ohlcv['ema_slow'].iloc[-1]
-
-                # 4. Estado Cuenta y Posición
-                usdt_balance = fetch_balance(self.exchange, asset='USDT')
-                position_info = get_position_status(self.exchange, symbol)
-
-                # 5. Emitir Estado Posición (con EMAs actuales)
-                self._emit_position_status(position_info, usdt_balance, df_ohlcv, config, latest_ema_fast, latest_ema_slow)
-
-                # 6. Gestión Posición Abierta
-                action_taken = self._manage_open_position(symbol, position_info, current_price, filters, config)
-
-                # 6.1 Inversión
-                if position_info and not action_taken:
-                    invert_ok = self._evaluate_inversion_strategy(symbol, position_info, strategies, df_ohlcv, config)
-                    if invert_ok: action_taken = True
-
-                # 7. Entrada
-                if not position_info and not action_taken:
-                    self._evaluate_entry_strategies(symbol, strategies, df_ohlcv, config, usdt_balance, current_price)
-
-                # 8. Pausa
+                symbols = self._sync_symbols(config)
+                if not symbols: self.log_signal.emit("❌ Error: Símbolo no definido."); time.sleep(10); continue
+                self._ensure_risk_watchdog(config)
+
+                # 2. Planificador: siguiente símbolo vencido (o esperar al próximo)
+                symbol = self.scheduler.pop_due()
+                if symbol is None:
+                    self._flush_ui_updates(config)
+                    self._interruptible_sleep(self._idle_wait(self.scheduler.seconds_until_next()))
+                    continue
+
+                iteration_start_time = time.time()
+                state = self._get_symbol_state(symbol)
+                symbol_config = self._symbol_config(config, symbol)
+                state.risk_context = (symbol_config, filters)
+                if self._is_strategy_phase(state, symbol_config, iteration_start_time):
+                    with self.metrics.timer('iteration'):
+                        self._run_symbol_iteration(state, symbol_config, strategies, filters)
+                    self._plan_next_strategy_phase(state, symbol_config, iteration_start_time)
+                else:
+                    # Modo 'candle' entre cierres de vela: solo chequeo barato de riesgo (SL/TP/TS)
+                    with self.metrics.timer('risk_check'):
+                        self._run_risk_check(state, symbol_config, filters)
+                state.iterations += 1; state.last_run_at = iteration_start_time
+                self._export_metrics(symbol_config)
+                self._flush_ui_updates(symbol_config)
+
+                # 3. Re-planificar el símbolo para su próxima iteración
                 if not self._running: break
-                iteration_time = time.time() - iteration_start_time
-                sleep_time = max(0.1, loop_interval - iteration_time)
-                self._interruptible_sleep(sleep_time)
+                self.scheduler.schedule(symbol, self._next_due_time(state, symbol_config, filters, iteration_start_time))
 
-            # Manejo de Errores (igual)
-            except ccxt.NetworkError as e: self._handle_ccxt_error("Red", e, 30)
+            # Manejo de Errores (por símbolo: se aplaza solo el símbolo que falló)
+            except ccxt.NetworkError as e: self._handle_ccxt_error("Red", e, 30, symbol)
             # ... (resto de excepts) ...
-            except Exception as e: self._handle_unexpected_error(e, config.get('loop_interval', 10) if config else 10)
+            except Exception as e: self._handle_unexpected_error(e, config.get('loop_interval', 10) if config else 10, symbol)
 
+        self._shutdown_fetcher()
+        self._shutdown_risk_watchdog()
+        self._shutdown_price_feed()
+        self._export_metrics(self.get_config_fn() or {}, force=True)
         self.log_signal.emit("🛑 Worker ha salido del bucle principal.")
         self.finished.emit()
-    # --- FIN run() MODIFICADA ---
+    # --- FIN run() MULTI-SÍMBOLO ---
+
+    def _run_symbol_iteration(self, state, config, strategies, filters):
+        """Ejecuta una iteración completa (datos, indicadores, gestión, entrada) para UN símbolo."""
+        # 2. Datos Mercado (precio, velas, balance y posición; en paralelo si 'parallel_fetch')
+        fetched_at = time.time()
+        limit = self._determine_ohlcv_limit(config, strategies)
+        with self.metrics.timer('fetch'):
+            market_data = self._fetch_market_data(state.symbol, config, timeframe=config.get('timeframe', '15m'), limit=limit)
+        snapshot = self._build_iteration_snapshot(state, config, strategies, market_data, fetched_at)
+        if snapshot is None: return
+
+        # 6. Gestión Posición Abierta
+        with self.metrics.timer('risk_management'):
+            action_taken = self._manage_open_position(snapshot, filters, config)
+
+        # 6.1 Inversión
+        if snapshot.has_position and not action_taken:
+            with self.metrics.timer('inversion'):
+                invert_ok = self._evaluate_inversion_strategy(snapshot, strategies, config)
+            if invert_ok: action_taken = True
+
+        # 7. Entrada
+        if not snapshot.has_position and not action_taken:
+            with self.metrics.timer('entry'):
+                self._evaluate_entry_strategies(snapshot, strategies, config)
+
+    def _build_iteration_snapshot(self, state, config, strategies, market_data, fetched_at):
+        """
+        Pasos 3-5 de la iteración (sin red): indicadores, foto inmutable y
+        señales a la GUI. Devuelve la MarketSnapshot o None si faltan datos.
+        Compartido por el worker con hilos y el worker asyncio.
+        """
+        symbol = state.symbol
+        timeframe = config.get('timeframe', '15m')
+        is_primary = (symbol == self.primary_symbol)
+
+        current_price = market_data['price']
+        if current_price:
+            state.last_price = current_price
+            if is_primary: self._publish_price(current_price, config)
+        else: self.log_signal.emit(f"⚠️ No precio {symbol}."); return None
+
+        df_ohlcv = market_data['ohlcv']
+        if df_ohlcv is None or df_ohlcv.empty: self.log_signal.emit(f"❌ No OHLCV {symbol}/{timeframe}."); return None
+
+        # 3. Indicadores
+        with self.metrics.timer('indicators'):
+            df_ohlcv = self._calculate_indicators(df_ohlcv, config, strategies)
+
+        # ---> EMITIR SEÑAL OHLCV (solo el símbolo principal se dibuja en la GUI) <---
+        if is_primary and df_ohlcv is not None and not df_ohlcv.empty:
+            self._publish_ohlcv(df_ohlcv, config) # DataFrame completo o solo las velas cambiadas
+        # --------------------------
+
+        # Extraer últimas EMAs para position_signal (como antes)
+        latest_ema_fast, latest_ema_slow = self._latest_emas(df_ohlcv)
+
+        # 4. Foto inmutable de la iteración (balance y posición ya descargados en la fase 2)
+        snapshot = MarketSnapshot.from_market_data(symbol, timeframe, market_data, fetched_at=fetched_at, ohlcv=df_ohlcv)
+        self._store_snapshot(state, snapshot)
+        self._reconcile_protective_orders(state, snapshot)
+
+        # 5. Emitir Estado Posición (con EMAs actuales)
+        if is_primary:
+            self._emit_position_status(snapshot.position_info, snapshot.balance, df_ohlcv, config, latest_ema_fast, latest_ema_slow)
+        return snapshot
+
+    def _run_risk_check(self, state, config, filters):
+        """
+        Chequeo ligero entre cierres de vela (modo 'candle'): solo precio y
+        posición para aplicar SL/TP/TS; sin velas, indicadores ni balance.
+        """
+        fetched_at = time.time()
+        with self.metrics.timer('fetch_risk'):
+            market_data = self._fetch_market_data(state.symbol, config, parts=('price', 'position'))
+        snapshot = self._build_risk_snapshot(state, config, market_data, fetched_at)
+        if snapshot is None: return
+        self._manage_open_position(snapshot, filters, config)
+
+    def _build_risk_snapshot(self, state, config, market_data, fetched_at):
+        """Foto del chequeo de riesgo: precio y posición nuevos; velas y balance de la última fase de estrategia."""
+        symbol = state.symbol
+        is_primary = (symbol == self.primary_symbol)
+        if not market_data['price']: self.log_signal.emit(f"⚠️ No precio {symbol} (chequeo riesgo)."); return None
+        if is_primary: self._publish_price(market_data['price'], config)
+
+        snapshot = MarketSnapshot.from_market_data(
+            symbol, config.get('timeframe', '15m'), market_data, fetched_at=fetched_at,
+            ohlcv=state.df_ohlcv, balance=state.last_balance)
+        self._store_snapshot(state, snapshot)
+        self._reconcile_protective_orders(state, snapshot)
+        if is_primary:
+            latest_ema_fast, latest_ema_slow = self._latest_emas(snapshot.ohlcv)
+            self._emit_position_status(snapshot.position_info, snapshot.balance, snapshot.ohlcv, config, latest_ema_fast, latest_ema_slow)
+        return snapshot
+
+    @staticmethod
+    def _store_snapshot(state, snapshot):
+        """Guarda en el estado del símbolo la última foto de mercado."""
+        state.snapshot = snapshot
+        state.last_price = snapshot.price
+        state.df_ohlcv = snapshot.ohlcv
+        state.last_balance = snapshot.balance
+        state.position_info = snapshot.position_info; state.position_dirty = False
+        if state.protective is not None and snapshot.position_info: state.protective.last_position = snapshot.position_info
+
+    # --- Fase de descarga ---
+    def _fetch_market_data(self, symbol, config, timeframe='15m', limit=100, parts=MARKET_DATA_PARTS):
+        """
+        Descarga las partes pedidas de la iteración. Con 'parallel_fetch' las
+        peticiones van a la vez por el pool de hilos (un clon del exchange por
+        hilo); si no, en serie y abortando si no hay precio (como antes).
+        """
+        feed_price = self._price_from_feed(symbol, config) # Último tick del feed (sin red) si es reciente
+        if feed_price is not None: parts = tuple(p for p in parts if p != 'price')
+
+        if config.get('parallel_fetch', True):
+            fetcher = self._get_fetcher(config)
+            if fetcher is not None:
+                data = fetcher.fetch(symbol, timeframe=timeframe, limit=limit, asset='USDT', parts=parts, ohlcv_cache=self._ohlcv_cache_for(config))
+                if feed_price is not None: data['price'] = feed_price
+                return data
+
+        data = {part: None for part in MARKET_DATA_PARTS}
+        data['price'] = feed_price if feed_price is not None else fetch_price(self.exchange, symbol)
+        if not data['price']: return data
+        if 'ohlcv' in parts:
+            cache = self._ohlcv_cache_for(config)
+            if cache is not None: data['ohlcv'] = cache.get(self.exchange, symbol, timeframe=timeframe, limit=limit)
+            else: data['ohlcv'] = get_ohlcv(self.exchange, symbol, timeframe=timeframe, limit=limit)
+        if 'balance' in parts: data['balance'] = fetch_balance(self.exchange, asset='USDT')
+        if 'position' in parts: data['position'] = get_position_status(self.exchange, symbol)
+        return data
+
+    def _ohlcv_cache_for(self, config):
+        """Caché de velas si 'ohlcv_cache' está activo (None = descarga completa en cada iteración)."""
+        return self.ohlcv_cache if config.get('ohlcv_cache', True) else None
+
+    def _get_fetcher(self, config):
+        """Crea (una vez) el MarketDataFetcher; None si no se pudo crear (se usa el modo en serie)."""
+        if self.fetcher is None:
+            try:
+                self.fetcher = MarketDataFetcher(self.exchange, max_workers=int(config.get('fetch_workers', 4)))
+                self.log_signal.emit(f"⚡ Descarga paralela activada ({self.fetcher.max_workers} hilos, un clon de exchange por hilo).")
+            except Exception as e:
+                self.log_signal.emit(f"⚠️ No se pudo crear el pool de descarga paralela: {e}. Usando modo en serie.")
+                self.fetcher = False # No reintentar en cada iteración
+        return self.fetcher or None
+
+    # --- Actualizaciones de la GUI ---
+    # Con 'ui_coalesce' los valores pasan por el coalescedor y se emiten como
+    # deltas por ui_update_signal; si no, por las señales de siempre.
+    @staticmethod
+    def _ui_coalesce(config):
+        return bool(config.get('ui_coalesce', True))
+
+    def _publish_price(self, price, config):
+        if self._ui_coalesce(config): self.ui_updates.publish_price(self.primary_symbol, price)
+        else: self.price_signal.emit(price)
+
+    def _publish_ohlcv(self, df_ohlcv, config):
+        if self._ui_coalesce(config): self.ui_updates.publish_ohlcv(self.primary_symbol, df_ohlcv)
+        else: self.ohlcv_signal.emit(df_ohlcv)
+
+    def _publish_position(self, position_data, config):
+        if self._ui_coalesce(config): self.ui_updates.publish_position(self.primary_symbol, position_data)
+        else: self.position_signal.emit(position_data)
+
+    def _flush_ui_updates(self, config):
+        """Emite el delta pendiente si ya pasó 1/ui_max_fps desde el anterior."""
+        if not config: return
+        self.ui_updates.set_max_fps(config.get('ui_max_fps', 4))
+        delta = self.ui_updates.take()
+        if delta: self.ui_update_signal.emit(delta)
+
+    def _idle_wait(self, wait):
+        """Espera sin símbolos vencidos, acortada si hay un delta de GUI retenido por el límite de fps."""
+        ui_wait = self.ui_updates.seconds_until_flush()
+        if ui_wait is not None: wait = min(wait, ui_wait)
+        return max(0.05, wait)
+
+    def _export_metrics(self, config, force=False):
+        """
+        Vuelca las métricas de latencia a 'metrics_file' (JSON o Prometheus)
+        cada 'metrics_every' iteraciones. Sin 'metrics_file' no se escribe nada.
+        """
+        path = str(config.get('metrics_file', '') or '').strip()
+        if not path: return
+        self._metrics_pending += 1
+        if not force and self._metrics_pending < max(1, int(config.get('metrics_every', 20))): return
+        self._metrics_pending = 0
+        try:
+            self.metrics.write(path, config.get('metrics_format', 'json'), extra_labels={'worker': self.__class__.__name__})
+        except Exception as e:
+            self.log_signal.emit(f"⚠️ No se pudieron exportar las métricas a {path}: {e}")
+
+    # --- Feed de precios (último tick sin bloquear) ---
+    def set_price_feed(self, feed):
+        """Usa un PriceFeed externo (p.ej. FakePriceFeed en pruebas); el worker no lo detiene al salir."""
+        self._shutdown_price_feed()
+        self.price_feed, self._owns_price_feed = feed, False
+        if feed is not None:
+            if self.symbol_states: feed.subscribe(list(self.symbol_states))
+            if not feed.running: feed.start()
+
+    def _get_price_feed(self, config):
+        """Crea (una vez) el feed de la config 'price_feed'; None con 'none' o si falló."""
+        if self.price_feed is None and str(config.get('price_feed', 'none')).strip().lower() != 'none':
+            try:
+                feed = create_price_feed(config.get('price_feed'), self.exchange, interval=float(config.get('price_feed_interval', 1)))
+                if feed is not None:
+                    feed.subscribe(parse_symbol_list(config)); feed.start()
+                    self.log_signal.emit(f"📡 Feed de precios '{feed.name}' iniciado.")
+                self.price_feed, self._owns_price_feed = (feed or False), True
+            except Exception as e:
+                self.log_signal.emit(f"⚠️ No se pudo iniciar el feed de precios: {e}. Usando fetch_price por iteración.")
+                self.price_feed = False # No reintentar en cada iteración
+        return self.price_feed or None
+
+    def _price_from_feed(self, symbol, config):
+        """Precio del último tick si no supera 'price_feed_max_age' segundos; None = pedirlo por REST."""
+        feed = self._get_price_feed(config)
+        if feed is None: return None
+        tick = feed.latest(symbol, max_age=float(config.get('price_feed_max_age', 5)))
+        return tick.price if tick is not None else None
+
+    # --- Vigilante de riesgo (SL/TP/TS con cada tick, fuera del bucle) ---
+    def _ensure_risk_watchdog(self, config):
+        """Arranca (una vez) el RiskWatchdog si 'risk_watchdog'; sin feed configurado usa uno 'polling' propio."""
+        if not config.get('risk_watchdog', False) or self.risk_watchdog is not None: return
+        feed = self._get_price_feed(config)
+        if feed is None and self.price_feed is None:
+            feed = self._get_price_feed(dict(config, price_feed='polling'))
+        if feed is None:
+            self.log_signal.emit("⚠️ Vigilante de riesgo sin feed de precios. Desactivado.")
+            self.risk_watchdog = False; return
+        self.risk_watchdog = RiskWatchdog(self, feed, min_interval=float(config.get('risk_watchdog_interval', 0.1))).start()
+        self.log_signal.emit(f"🛡️ Vigilante de riesgo activo (feed '{feed.name}', cada tick).")
+
+    def _shutdown_risk_watchdog(self):
+        if self.risk_watchdog:
+            try: self.risk_watchdog.stop()
+            except Exception as e: self.log_signal.emit(f"⚠️ Error deteniendo el vigilante de riesgo: {e}")
+        self.risk_watchdog = None
+
+    def _shutdown_price_feed(self):
+        if self.price_feed and self._owns_price_feed:
+            try: self.price_feed.stop()
+            except Exception as e: self.log_signal.emit(f"⚠️ Error deteniendo el feed de precios: {e}")
+        self.price_feed = None; self._owns_price_feed = False
+
+    def _shutdown_fetcher(self):
+        if self.fetcher:
+            self.fetcher.shutdown()
+        self.fetcher = None
+
+    # --- Planificación: modo 'interval' (cada loop_interval) o 'candle' (tras cada cierre de vela) ---
+    @staticmethod
+    def _schedule_mode(config):
+        mode = str(config.get('schedule_mode', 'interval')).strip().lower()
+        return mode if mode in SCHEDULE_MODES else 'interval'
+
+    def _is_strategy_phase(self, state, config, now):
+        """En modo 'interval' siempre; en modo 'candle' solo si ya cerró la vela planificada."""
+        if self._schedule_mode(config) != 'candle': return True
+        return state.next_strategy_at is None or now >= state.next_strategy_at
+
+    def _plan_next_strategy_phase(self, state, config, now):
+        """Calcula cuándo toca la próxima fase de estrategia (justo tras el siguiente cierre de vela)."""
+        if self._schedule_mode(config) != 'candle':
+            state.next_strategy_at = None; return
+        timeframe = config.get('timeframe', '15m')
+        close_at = next_candle_close(now, timeframe)
+        if close_at is None:
+            self.log_signal.emit(f"⚠️ Timeframe '{timeframe}' no reconocido para modo vela. Usando loop_interval.")
+            state.next_strategy_at = None; return
+        first_plan = state.next_strategy_at is None
+        state.next_strategy_at = close_at + max(0.0, float(config.get('candle_close_delay', 2)))
+        if first_plan:
+            next_str = datetime.fromtimestamp(state.next_strategy_at, timezone.utc).strftime('%H:%M:%S')
+            self.log_signal.emit(f"🕯️ Modo vela {state.symbol} ({timeframe}): próxima estrategia a las {next_str} UTC.")
+
+    def _next_due_time(self, state, config, filters, iteration_start_time):
+        """
+        Próximo vencimiento del símbolo. En modo 'candle' se duerme hasta el
+        cierre de vela, salvo que haya posición con filtros activos (cadencia
+        de riesgo 'risk_check_interval') que no cubran ya las órdenes de protección.
+        Tras un cierre espera al menos CLOSE_SETTLE_SECONDS (solo este símbolo).
+        """
+        now = time.time()
+        settled = state.last_close_at + CLOSE_SETTLE_SECONDS if state.last_close_at else 0.0
+        if self._schedule_mode(config) != 'candle' or state.next_strategy_at is None:
+            return max(now + 0.1, settled, iteration_start_time + config.get('loop_interval', 10))
+        due = state.next_strategy_at
+        protective = state.protective if state.protective is not None and state.protective.active else None
+        needs_risk = any(filters.get(k, False) and not (protective and protective.covers(k)) for k in ('sl', 'tp', 'ts')) # SL/TP ya en el exchange
+        if needs_risk and (state.position_info or state.position_dirty):
+            due = min(due, iteration_start_time + max(0.5, float(config.get('risk_check_interval', 5))))
+        return max(now + 0.1, settled, due)
+
+    @staticmethod
+    def _latest_emas(df_ohlcv):
+        """Últimos valores de ema_fast/ema_slow del DataFrame (None si no existen)."""
+        latest_ema_fast = None; latest_ema_slow = None
+        if df_ohlcv is not None and not df_ohlcv.empty:
+            if 'ema_fast' in df_ohlcv.columns and not pd.isna(df_ohlcv['ema_fast'].iloc[-1]): latest_ema_fast = df_ohlcv['ema_fast'].iloc[-1]
+            if 'ema_slow' in df_ohlcv.columns and not pd.isna(df_ohlcv['ema_slow'].iloc[-1]): latest_ema_slow = df_ohlcv['ema_slow'].iloc[-1]
+        return latest_ema_fast, latest_ema_slow
 
     # --- Nuevos métodos auxiliares para organizar RUN ---
-    def _load_initial_ts_state(self):
-        """Carga el estado inicial del TS al arrancar el worker."""
-        initial_config = self.get_config_fn()
-        if initial_config:
-            self.current_symbol = initial_config.get('symbol')
-            if self.current_symbol:
-                try:
-                    self.trailing_data = load_ts_state(self.current_symbol)
-                    self.log_signal.emit(f"ℹ️ Estado TS cargado para {self.current_symbol}: {self.trailing_data}")
-                except Exception as e:
-                    self.log_signal.emit(f"⚠️ Error cargando estado TS ({self.current_symbol}): {e}. Usando defaults.")
-                    self.trailing_data = DEFAULT_TS_STATE.copy()
-            else: self.log_signal.emit("⚠️ Símbolo inicial no encontrado para cargar estado TS.")
-        else: self.log_signal.emit("⚠️ Config inicial no disponible para cargar estado TS.")
-
-    def _reload_ts_state_for_new_symbol(self, new_symbol):
-        """Recarga el estado del TS cuando cambia el símbolo."""
-        self.log_signal.emit(f"🔄 Símbolo cambiado a {new_symbol}. Recargando estado TS...")
-        self.current_symbol = new_symbol
+    def _sync_symbols(self, config, running=()):
+        """
+        Alinea estados y planificador con la lista de símbolos de la config.
+        `running`: símbolos con una iteración en curso fuera del planificador (worker asyncio).
+        """
+        symbols = parse_symbol_list(config)
+        if not symbols: return []
+        if symbols[0] != self.primary_symbol:
+            if self.primary_symbol is not None:
+                self.log_signal.emit(f"🔄 Símbolo principal cambiado a {symbols[0]}.")
+            self.primary_symbol = symbols[0]
+
+        added, removed = self.scheduler.sync(symbols, interval=float(config.get('loop_interval', 10)), running=running)
+        if (added or removed) and self.price_feed: self.price_feed.subscribe(symbols)
+        for sym in removed:
+            self.symbol_states.pop(sym, None)
+            self.ohlcv_cache.clear(sym)
+            for key in [k for k in self.indicator_engines if k[0] == sym]: del self.indicator_engines[key]
+            INDICATOR_CACHE.clear(sym)
+            self.log_signal.emit(f"➖ Símbolo {sym} retirado del worker.")
+        for sym in symbols: # También los re-añadidos con su iteración aún en curso (su tarea los re-planifica)
+            if sym in self.symbol_states: continue
+            self._get_symbol_state(sym)
+            if sym != self.primary_symbol:
+                self._apply_leverage_for_symbol(sym, config)
+        if added and len(symbols) > 1:
+            self.log_signal.emit(f"ℹ️ Worker multi-símbolo ({len(symbols)}): {', '.join(symbols)}")
+        return symbols
+
+    def _get_symbol_state(self, symbol):
+        """Devuelve el estado del símbolo, creándolo y cargando su TS la primera vez."""
+        state = self.symbol_states.get(symbol)
+        if state is None:
+            state = SymbolState(symbol)
+            try:
+                state.trailing_data = load_ts_state(symbol)
+                self.log_signal.emit(f"ℹ️ Estado TS cargado para {symbol}: {state.trailing_data}")
+            except Exception as e:
+                self.log_signal.emit(f"⚠️ Error cargando estado TS ({symbol}): {e}. Usando defaults.")
+                state.trailing_data = DEFAULT_TS_STATE.copy()
+            self.symbol_states[symbol] = state
+        return state
+
+    @staticmethod
+    def _symbol_config(config, symbol):
+        """Copia de la config con 'symbol' fijado al símbolo en proceso (la ven estrategias y filtros)."""
+        symbol_config = dict(config)
+        symbol_config['symbol'] = symbol
+        return symbol_config
+
+    def _apply_leverage_for_symbol(self, symbol, config):
+        """La GUI solo ajusta el apalancamiento del símbolo principal; aquí el de los adicionales."""
+        leverage = config.get('leverage')
+        if not leverage: return
         try:
-            self.trailing_data = load_ts_state(self.current_symbol)
-            self.log_signal.emit(f"ℹ️ Estado TS cargado para {self.current_symbol}: {self.trailing_data}")
+            params = {"marginType": str(config.get('margin_mode', 'isolated')).lower()}
+            set_leverage(self.exchange, leverage, symbol, params)
+            self.log_signal.emit(f"✅ set_leverage {leverage}x enviado para {symbol}.")
         except Exception as e:
-            self.log_signal.emit(f"⚠️ Error cargando estado TS ({self.current_symbol}): {e}. Usando defaults.")
-            self.trailing_data = DEFAULT_TS_STATE.copy()
+            self.log_signal.emit(f"⚠️ No se pudo configurar apalancamiento {leverage}x para {symbol}: {e}")
 
-    def _determine_ohlcv_limit(self, config, strategies):
-        """Calcula el número de velas OHLCV necesarias."""
-        rsi_p = int(config.get('rsi_period', 14))
-        ema_f = int(config.get('ema_fast', 15))
-        ema_s = int(config.get('ema_slow', 30))
-        ema_filt_p = None
-        # Comprobar si el filtro es necesario globalmente o por estrategia activa
-        needs_filter = config.get("ema_use_trend_filter", False) # Asume clave global
-        # O podrías iterar 'strategies' y ver si alguna activa necesita filtro
+    def _defer_symbol(self, symbol, wait_time):
+        """Aplaza la próxima iteración de un símbolo (p.ej. tras un error)."""
+        if symbol and self._running and symbol in self.symbol_states:
+            self.scheduler.schedule_in(symbol, wait_time)
 
-        if needs_filter:
-            ema_filt_p = int(config.get('ema_filter_period', 100))
+    def _indicator_requirements(self, config, strategies):
+        """
+        Indicadores y velas que declaran las estrategias activas (STRATEGY_REQUIREMENTS).
+        El símbolo principal añade lo que muestra la GUI (EMAs y RSI de siempre).
+        """
+        reqs = [active_requirements(strategies, config)]
+        if config.get('symbol') in (None, self.primary_symbol): reqs.append(default_requirements(config))
+        return merge_requirements(reqs)
 
-        max_p = max(rsi_p + 1, ema_f, ema_s, ema_filt_p if ema_filt_p else 0)
-        return max_p + 50 # Margen adicional
+    def _determine_ohlcv_limit(self, config, strategies):
+        """Calcula el número de velas OHLCV necesarias: el mayor lookback declarado + margen."""
+        return self._indicator_requirements(config, strategies)['lookback'] + OHLCV_MARGIN
 
     def _calculate_indicators(self, df, config, strategies):
-        """Calcula todos los indicadores necesarios."""
-        # EMAs
-        ema_f = int(config.get('ema_fast', 15))
-        ema_s = int(config.get('ema_slow', 30))
-        ema_filt_p = None
-        needs_filter = config.get("ema_use_trend_filter", False) # Asume clave global
-        if needs_filter: ema_filt_p = int(config.get('ema_filter_period', 100))
-        df = calculate_emas(df, ema_f, ema_s, ema_filt_p)
-
-        # RSI
-        rsi_p = int(config.get('rsi_period', 14))
-        df['rsi'] = calculate_rsi(df['close'], period=rsi_p)
+        """Calcula solo los indicadores que piden las estrategias activas (unión de sus requisitos)."""
+        if df is None or df.empty or 'close' not in df.columns: return df
+        indicators = self._indicator_requirements(config, strategies)['indicators']
+        # Columnas estándar (las del IndicatorEngine) y columnas extra declaradas por la custom
+        standard = {col: spec[1] for col, spec in indicators.items() if col in WORKER_COLUMNS and spec[0] == WORKER_COLUMNS[col][0]}
+        extra = {col: spec for col, spec in indicators.items() if col not in standard}
+        ema_f, ema_s, ema_filt_p, rsi_p = (standard.get(col) for col in ('ema_fast', 'ema_slow', 'ema_filter', 'rsi'))
+
+        # Modo incremental: estado solo de las velas nuevas, re-sembrado en la primera fila de la ventana
+        # (mismos valores que calculate_ema / calculate_rsi sobre este DataFrame, ver IndicatorEngine)
+        if standard and config.get('streaming_indicators', True):
+            key = (config.get('symbol'), config.get('timeframe', '15m'))
+            engine = self.indicator_engines.get(key)
+            if engine is None or not engine.matches(ema_f, ema_s, ema_filt_p, rsi_p):
+                engine = IndicatorEngine(ema_f, ema_s, ema_filt_p, rsi_p)
+                self.indicator_engines[key] = engine
+            df = engine.apply(df)
+            # Registrar las columnas en la caché de indicadores: las estrategias las reutilizan sin recalcular
+            for col, period in standard.items():
+                if col in df.columns: remember_indicator(df, WORKER_COLUMNS[col][0], period, df[col], config)
+        else:
+            extra.update((col, (WORKER_COLUMNS[col][0], period)) for col, period in standard.items())
+
+        # Por lotes, a través de la caché de indicadores (df es propio de esta iteración: vista del CandleBuffer)
+        for col, (name, period) in extra.items():
+            df[col] = cached_indicator(df, name, period, config)
 
         return df
 
-    def _manage_open_position(self, symbol, position_info, current_price, filters, config):
-        """Gestiona Stop Loss, Take Profit y Trailing Stop para una posición abierta."""
-        action_taken = False
-        if not position_info: return False # Salir si no hay posición
+    def _manage_open_position(self, snapshot, filters, config):
+        """Gestiona Stop Loss, Take Profit y Trailing Stop para la posición abierta de la foto."""
+        with self._get_symbol_state(snapshot.symbol).risk_lock: # El RiskWatchdog evalúa el mismo estado TS
+            for reason in self._risk_exit_signals(snapshot, filters, config):
+                if self._execute_close_position(snapshot, reason):
+                    return True # Acción tomada, no evaluar más filtros
+        # Devolver True si se realizó alguna acción (SL, TP o TS), False si no
+        return False
+
+    def _risk_exit_signals(self, snapshot, filters, config, exchange=None, ratchet=True):
+        """
+        Genera, en orden SL -> TP -> TS, las razones de cierre que disparan
+        los filtros activos. Es perezoso: el filtro siguiente solo se evalúa
+        si el cierre anterior no se pudo ejecutar (mismo orden que antes).
+        `exchange`: instancia del hilo que llama (para mover el stop de protección).
+        `ratchet=False`: el llamante mueve el stop de protección (AsyncBotWorker).
+        """
+        if not snapshot.has_position: return # Salir si no hay posición
+        symbol, position_info, current_price = snapshot.symbol, snapshot.position_info, snapshot.price
 
         # Stop Loss
         if filters.get('sl', False):
             sl_result = execute_stop_loss(self.exchange, position_info, current_price, config)
-            # --- CORRECCIÓN AQUÍ ---
             if sl_result is True:
                 # El log detallado ya se imprimió en execute_stop_loss
                 # Log simple en el worker para indicar que detectó la señal
                 self.log_signal.emit(f"⛔ Stop Loss [{config.get('stop_loss', 'N/A')}%] detectado por worker.")
                 # Pasar una razón genérica o basada en el tipo de filtro
-                if self._execute_close_position(symbol, position_info, 'stop-loss'):
-                    return True # Acción tomada, no evaluar más filtros
+                yield 'stop-loss'
 
         # Auto Profit
-        # Verificar si ya se cerró por SL
-        if filters.get('tp', False) and not action_taken:
+        if filters.get('tp', False):
             tp_result = execute_auto_profit(self.exchange, position_info, current_price, config)
-            # --- CORRECCIÓN AQUÍ ---
             if tp_result is True:
                 # El log detallado ya se imprimió en execute_auto_profit
                 self.log_signal.emit(f"✅ Take Profit [{config.get('auto_profit', 'N/A')}%] detectado por worker.")
-                # Pasar una razón genérica
-                if self._execute_close_position(symbol, position_info, 'auto-profit'):
-                    action_taken = True # Marcar acción tomada
-                    # return True # Si esta función debe retornar True inmediatamente
+                yield 'auto-profit'
 
         # Trailing Stop
-        # Verificar si ya se cerró por SL o TP
-        if filters.get('ts', False) and not action_taken:
-            # --- ESTA PARTE ESTABA BIEN ---
+        if filters.get('ts', False):
+            state = self._get_symbol_state(symbol)
             new_ts_data, should_close_ts, ts_reason = execute_trailing_stop(
-                self.exchange, position_info, current_price, self.trailing_data, config
+                self.exchange, position_info, current_price, state.trailing_data, config
             )
-            if new_ts_data != self.trailing_data: # Guardar si el estado cambió
-                self.trailing_data = new_ts_data
+            if new_ts_data != state.trailing_data: # Guardar si el estado cambió
+                state.trailing_data = new_ts_data
                 self._save_current_ts_state(symbol) # Llamar a helper para guardar
+                if ratchet: self._ratchet_protective_stop(state, position_info, config, exchange)
             if should_close_ts:
                 # Usamos ts_reason que sí viene de execute_trailing_stop
                 self.log_signal.emit(f"〽️ Trailing Stop activado: {ts_reason or 'TS'}")
-                if self._execute_close_position(symbol, position_info, ts_reason or 'trailing-stop'):
-                    action_taken = True
-                    # return True # Si esta función debe retornar True inmediatamente
-
-        # Devolver True si se realizó alguna acción (TP o TS), False si no
-        return action_taken
+                yield ts_reason or 'trailing-stop'
+
+    def _evaluate_entry_strategies(self, snapshot, strategies, config):
+        """Evalúa las estrategias de entrada activas sobre las velas de la foto."""
+        for side, reason in self._entry_signals(snapshot, strategies, config):
+            if self._execute_open_position(snapshot, side, config, reason):
+                # Resetear y guardar estado TS al abrir
+                self._reset_and_save_ts_state(snapshot.symbol)
+                return True # Entrada ejecutada, no evaluar más estrategias
+        return False # Ninguna estrategia generó entrada
 
-    def _evaluate_entry_strategies(self, symbol, strategies, df_ohlcv, config, balance, price):
-        """Evalúa las estrategias de entrada activas."""
-        if not strategies: return False
+    def _entry_signals(self, snapshot, strategies, config):
+        """Genera (lado, razón) por cada estrategia activa con señal de entrada, en orden."""
+        if not strategies: return
+        df_ohlcv = snapshot.ohlcv
 
         for strat_name in strategies:
             if not self._running: break # Salir si se detuvo mientras se evaluaban
@@ -300,36 +671,48 @@ class BotWorker(QObject):
             if strategy_func:
                 try:
                     signal = strategy_func(df_ohlcv, position=None, config=config)
-                    if signal and signal.get('action') in ['long', 'short']:
-                        self.log_signal.emit(f"📈 Señal ENTRADA [{strat_name.upper()}]: {signal['action']} - {signal.get('reason', '')}")
-                        if self._execute_open_position(symbol, signal['action'], config, balance, price, signal.get('reason', strat_name)):
-                            # Resetear y guardar estado TS al abrir
-                            self._reset_and_save_ts_state(symbol)
-                            return True # Entrada ejecutada, no evaluar más estrategias
                 except Exception as e_strat:
                     self.log_signal.emit(f"💥 Error ejecutando estrategia {strat_name}: {e_strat}")
                     self.log_signal.emit(traceback.format_exc())
+                    continue
+                if signal and signal.get('action') in ['long', 'short']:
+                    self.log_signal.emit(f"📈 Señal ENTRADA [{strat_name.upper()}]: {signal['action']} - {signal.get('reason', '')}")
+                    yield signal['action'], signal.get('reason', strat_name)
             else:
                  self.log_signal.emit(f"⚠️ Estrategia '{strat_name}' no encontrada en STRATEGY_MAP.")
-        return False # Ninguna estrategia generó entrada
-    
-    
-    def _evaluate_inversion_strategy(self, symbol, position_info, strategies, df_ohlcv, config):
+
+
+    def _evaluate_inversion_strategy(self, snapshot, strategies, config):
         """
         Si la estrategia retorna {'action': 'invertir_posicion', ...}
         cierra la posición actual y abre la contraria en el mismo ciclo.
+        Precio y balance salen de la foto de la iteración (sin volver a pedirlos).
         """
-        if not strategies:
+        inversion = self._inversion_signal(snapshot, strategies, config)
+        if inversion is None:
             return False
+        new_side, reason = inversion
 
-        current_side = position_info.get('side', '').lower()  # 'long' o 'short'
-        if current_side not in ['long','short']:
+        # 1) Cerrar la posición actual
+        close_ok = self._execute_close_position(snapshot, reason)
+        if not close_ok:
             return False
 
-        balance = fetch_balance(self.exchange, 'USDT')
-        current_price = fetch_price(self.exchange, symbol)
-        if not current_price:
-            return False  # no hay precio, no se puede abrir/ cerrar
+        # 2) Abrir la nueva posición
+        return self._execute_open_position(snapshot, new_side, config, reason)
+
+    def _inversion_signal(self, snapshot, strategies, config):
+        """(lado nuevo, razón) de la primera estrategia que pida 'invertir_posicion'; None si ninguna."""
+        if not strategies:
+            return None
+
+        current_side = snapshot.position_side  # 'long' o 'short'
+        if current_side not in ['long','short']:
+            return None
+
+        if not snapshot.price:
+            return None  # no hay precio, no se puede abrir/ cerrar
+        df_ohlcv, position_info = snapshot.ohlcv, snapshot.position_info
 
         for strat_name in strategies:
             if not self._running:
@@ -342,32 +725,19 @@ class BotWorker(QObject):
             try:
                 # Pasamos la posición para que la estrategia sepa que ya hay un LONG/SHORT
                 signal = strategy_func(df_ohlcv, position=position_info, config=config)
-
-                # Chequeamos si la estrategia pide 'invertir_posicion'
-                if signal and signal.get('action') == 'invertir_posicion':
-                    reason = signal.get('reason', 'Invertir Posición')
-                    self.log_signal.emit(f"🔀 Solicitud de Inversión [{strat_name}]: {reason}")
-
-                    # 1) Cerrar la posición actual
-                    close_ok = self._execute_close_position(symbol, position_info, reason)
-                    if not close_ok:
-                        return False
-
-                    # 2) Determinar a qué lado abrimos
-                    #    Si estábamos LONG -> abrimos SHORT, y viceversa
-                    if current_side == 'long':
-                        new_side = 'short'
-                    else:
-                        new_side = 'long'
-
-                    # 3) Abrir la nueva posición
-                    open_ok = self._execute_open_position(symbol, new_side, config, balance, current_price, reason)
-                    return open_ok  # Si va bien, devolvemos True y terminamos
             except Exception as e:
                 self.log_signal.emit(f"💥 Error en _evaluate_inversion_strategy con {strat_name}: {e}")
                 self.log_signal.emit(traceback.format_exc())
+                continue
 
-        return False
+            # Chequeamos si la estrategia pide 'invertir_posicion'
+            if signal and signal.get('action') == 'invertir_posicion':
+                reason = signal.get('reason', 'Invertir Posición')
+                self.log_signal.emit(f"🔀 Solicitud de Inversión [{strat_name}]: {reason}")
+                # Si estábamos LONG -> abrimos SHORT, y viceversa
+                return ('short' if current_side == 'long' else 'long'), reason
+
+        return None
 
 
 
@@ -397,96 +767,219 @@ class BotWorker(QObject):
                  except (ValueError, TypeError): position_data['rsi'] = None
              else: position_data['rsi'] = None
         else: position_data['rsi'] = None
-        self.position_signal.emit(position_data)
+        self._publish_position(position_data, config)
 
-    def _execute_open_position(self, symbol, side, config, balance, price, reason):
-        # ... (inicio igual) ...
+    def _execute_open_position(self, snapshot, side, config, reason):
+        # Tamaño calculado con el balance y el precio de la foto de la iteración
+        try:
+            amount_contracts = self._prepare_open_order(snapshot, side, config, reason)
+            if not amount_contracts: return False
+
+            order_func = open_long_position if side == 'long' else open_short_position
+            with self.metrics.timer('order_open'):
+                order_result = order_func(self.exchange, snapshot.symbol, amount_contracts)
+            return self._on_position_opened(snapshot, side, order_result, amount_contracts, reason, config)
+        except Exception as e: return self._on_open_error(side, e)
+
+    def _prepare_open_order(self, snapshot, side, config, reason):
+        """Calcula el tamaño de la orden de entrada (None si no es válido)."""
+        symbol, balance, price = snapshot.symbol, snapshot.balance, snapshot.price
         self.log_signal.emit(f"🚀 Abrir {side.upper()} {symbol} (Razón: {reason})")
-        
+
         market_info = None
         contract_size = 1.0 # Default
         min_contracts = 0.001 # <---- 1. VALOR POR DEFECTO INICIAL
-        
-        try:
-            # ... (cálculo de amount_contracts igual) ...
-            try: market_info = self.exchange.market(symbol)
-            except: pass
-            if market_info: contract_size = float(market_info.get('contractSize',1.0)); min_contr_info = market_info.get('limits',{}).get('amount',{}).get('min'); min_contr=float(min_contr_info) if min_contr_info else 0.001
-            amount_contracts = calculate_order_size(balance, config.get('trade_pct',1.0), config.get('leverage',10), price, contract_size, min_contracts)
-            if amount_contracts is None or amount_contracts <= 0: self.log_signal.emit(f"📉 Tamaño inválido ({amount_contracts})."); return False
 
-            order_func = open_long_position if side == 'long' else open_short_position
-            order_result = order_func(self.exchange, symbol, amount_contracts)
-
-            if order_result and isinstance(order_result, dict):
-                filled_price = order_result.get('average', order_result.get('price', price))
-                filled_contracts = order_result.get('filled', amount_contracts)
-                self.log_signal.emit(f"✅ ENTRADA {side.upper()} {filled_contracts:.4f} @ ~{filled_price:.4f} ID:{order_result.get('id')}")
-                # --- Enviar a historial DB ---
-                entry = { 'timestamp': datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z"), 'accion': side.upper(), 'precio': filled_price, 'motivo': reason, 'pnl_pct': 0.0, 'unrealizedPnl': 0.0, 'symbol': symbol }
-                self.history_signal.emit(entry) # La GUI lo guardará en DB
-                # -----------------------------
-                self._reset_and_save_ts_state(symbol) # Resetear TS
-                return True
-            else: self.log_signal.emit(f"❌ Falló ejecución entrada {side.upper()}."); return False
-        # ... (manejo de excepciones igual) ...
-        except (ccxt.InsufficientFunds, ccxt.InvalidOrder) as e_ord: self.log_signal.emit(f"❌ Error Orden/Fondos {side.upper()}: {e_ord}"); self.error_signal.emit(f"Error Orden {side.upper()}", f"{e_ord}"); return False
-        except Exception as e: self.log_signal.emit(f"💥 Error apertura {side.upper()}: {e}"); self.log_signal.emit(traceback.format_exc()); self.error_signal.emit(f"Error Abriendo {side.upper()}", f"{e}"); return False
-
-    def _execute_close_position(self, symbol, position_info, reason):
-        self.log_signal.emit(f"🚪 Cerrar {position_info.get('side','')} {symbol} (Razón: {reason})")
+        try: market_info = self.exchange.market(symbol)
+        except: pass
+        if market_info: contract_size = float(market_info.get('contractSize',1.0)); min_contr_info = market_info.get('limits',{}).get('amount',{}).get('min'); min_contr=float(min_contr_info) if min_contr_info else 0.001
+        amount_contracts = calculate_order_size(balance, config.get('trade_pct',1.0), config.get('leverage',10), price, contract_size, min_contracts)
+        if amount_contracts is None or amount_contracts <= 0: self.log_signal.emit(f"📉 Tamaño inválido ({amount_contracts})."); return None
+        return amount_contracts
+
+    @staticmethod
+    def _filled_entry(snapshot, order_result, amount_contracts):
+        """(precio, contratos) llenados según la orden de entrada."""
+        return (order_result.get('average', order_result.get('price', snapshot.price)),
+                order_result.get('filled', amount_contracts))
+
+    def _on_position_opened(self, snapshot, side, order_result, amount_contracts, reason, config=None, protective=True):
+        """
+        Registro tras enviar la orden de entrada (historial, TS, órdenes de
+        protección, posición a releer). `protective=False`: el llamante
+        coloca las órdenes de protección (AsyncBotWorker).
+        """
+        symbol = snapshot.symbol
+        if order_result and isinstance(order_result, dict):
+            filled_price, filled_contracts = self._filled_entry(snapshot, order_result, amount_contracts)
+            self.log_signal.emit(f"✅ ENTRADA {side.upper()} {filled_contracts:.4f} @ ~{filled_price:.4f} ID:{order_result.get('id')}")
+            # --- Enviar a historial DB ---
+            entry = { 'timestamp': datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z"), 'accion': side.upper(), 'precio': filled_price, 'motivo': reason, 'pnl_pct': 0.0, 'unrealizedPnl': 0.0, 'symbol': symbol }
+            self.history_signal.emit(entry) # La GUI lo guardará en DB
+            # -----------------------------
+            self._reset_and_save_ts_state(symbol) # Resetear TS
+            self._get_symbol_state(symbol).position_dirty = True # Re-leer posición en el próximo chequeo
+            if protective: self._place_protective_orders(symbol, side, filled_price or snapshot.price, filled_contracts or amount_contracts, config)
+            return True
+        else: self.log_signal.emit(f"❌ Falló ejecución entrada {side.upper()}."); return False
+
+    def _on_open_error(self, side, e):
+        if isinstance(e, (ccxt.InsufficientFunds, ccxt.InvalidOrder)): self.log_signal.emit(f"❌ Error Orden/Fondos {side.upper()}: {e}"); self.error_signal.emit(f"Error Orden {side.upper()}", f"{e}"); return False
+        self.log_signal.emit(f"💥 Error apertura {side.upper()}: {e}"); self.log_signal.emit(traceback.format_exc()); self.error_signal.emit(f"Error Abriendo {side.upper()}", f"{e}"); return False
+
+    def _execute_close_position(self, snapshot, reason):
+        symbol, position_info = snapshot.symbol, snapshot.position_info
+        state = self._get_symbol_state(symbol)
+        with state.risk_lock:
+            if state.position_predates_close(snapshot.fetched_at):
+                self.log_signal.emit(f"ℹ️ Cierre ({reason}) omitido: {symbol} ya se cerró tras esta foto."); return False
+            self.log_signal.emit(f"🚪 Cerrar {position_info.get('side','')} {symbol} (Razón: {reason})")
+            try:
+                with self.metrics.timer('order_close'):
+                    order_result = close_position(self.exchange, symbol, position_info)
+                closed = self._on_position_closed(snapshot, order_result, reason)
+            except Exception as e: return self._on_close_error(symbol, reason, e)
+        return closed # La espera tras el cierre la hace el planificador (_next_due_time), sin bloquear otros símbolos
+
+    def _on_position_closed(self, snapshot, order_result, reason, exchange=None, protective=True):
+        """
+        Registro tras enviar la orden de cierre (historial con el PNL previo,
+        reset TS, cancelar protección). `protective=False`: el llamante
+        cancela las órdenes de protección (AsyncBotWorker).
+        """
+        symbol, position_info = snapshot.symbol, snapshot.position_info
         last_pnl_pct = position_info.get('pnl_pct', 0.0)
         last_unrealized_pnl = position_info.get('unrealizedPnl') # PNL USDT ANTES de cerrar
+        if order_result and isinstance(order_result, dict):
+            close_price = order_result.get('average') or order_result.get('price') or snapshot.price # Sin precio de la orden: el de la foto
+            self.log_signal.emit(f"✅ CIERRE ({reason}) @ ~{close_price:.4f} ID:{order_result.get('id')}")
+
+            action_hist = 'CLOSE'; reason_upper = reason.upper()
+            if 'STOP-LOSS' in reason_upper or 'SL' in reason_upper: action_hist = 'SL'
+            elif 'AUTO-PROFIT' in reason_upper or 'TP' in reason_upper: action_hist = 'TP'
+            elif 'TRAILING-STOP' in reason_upper or 'TS' in reason_upper: action_hist = 'TS'
+
+            self._emit_close_history(symbol, action_hist, close_price, reason, last_pnl_pct, last_unrealized_pnl)
+            self._reset_and_save_ts_state(symbol) # Resetear TS al cerrar
+            state = self._get_symbol_state(symbol)
+            state.position_dirty = True; state.last_close_at = time.time()
+            if protective: self._cancel_protective_orders(state, exchange)
+            return True
+        else:
+            self.log_signal.emit(f"❌ Falló cierre ({reason}). ¿Ya cerrada?")
+            self._reset_and_save_ts_state(symbol) # Resetear TS si falla pero pudo cerrar
+            return False
+
+    def _emit_close_history(self, symbol, action, price, reason, pnl_pct, unrealized_pnl):
+        """Envía el cierre al historial (la GUI lo guarda en DB; el daemon lo registra)."""
+        entry = { 'timestamp': datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z"), 'accion': action, 'precio': price, 'motivo': reason, 'pnl_pct': pnl_pct, 'unrealizedPnl': unrealized_pnl, 'symbol': symbol }
+        self.history_signal.emit(entry)
 
+    def _on_close_error(self, symbol, reason, e):
+        self.log_signal.emit(f"💥 Error cierre ({reason}): {e}"); self.log_signal.emit(traceback.format_exc()); self.error_signal.emit(f"Error Cerrando ({reason})", f"{e}")
+        self._reset_and_save_ts_state(symbol) # Resetear TS en error
+        return False
+
+    # --- Órdenes de protección en el exchange (SL/TP reduce-only, 'protective_orders') ---
+    def _protective_for(self, symbol, config):
+        """(estado, config, filtros) si la opción 'protective_orders' está activa; (estado, None, None) si no."""
+        state = self._get_symbol_state(symbol)
+        if config is None: config = state.risk_context[0] if state.risk_context else (self.get_config_fn() or {})
+        if not config.get('protective_orders', False): return state, None, None
+        if state.protective is None: state.protective = ProtectiveOrders(symbol)
+        filters = state.risk_context[1] if state.risk_context else (self.get_active_filters_fn() or {}) # Los de la iteración en curso
+        return state, config, filters
+
+    def _log_protective_placed(self, symbol, placed, filters):
+        if placed: self.log_signal.emit(f"🛡️ Protección en exchange {symbol}: " + ", ".join(f"{kind.upper()} @ {price:.4f}" for kind, price in placed))
+        elif filters.get('sl', False) or filters.get('tp', False): self.log_signal.emit(f"⚠️ No se colocó ninguna orden de protección para {symbol}. SL/TP siguen por sondeo.")
+
+    def _place_protective_orders(self, symbol, side, entry_price, amount, config=None):
+        """Tras la entrada: envía stop-market / take-profit-market reduce-only de los filtros SL / TP activos (si la opción está activa)."""
+        state, config, filters = self._protective_for(symbol, config)
+        if config is None: return
         try:
-            order_result = close_position(self.exchange, symbol, position_info)
-            if order_result and isinstance(order_result, dict):
-                close_price = order_result.get('average', order_result.get('price', fetch_price(self.exchange, symbol)))
-                self.log_signal.emit(f"✅ CIERRE ({reason}) @ ~{close_price:.4f} ID:{order_result.get('id')}")
-
-                action_hist = 'CLOSE'; reason_upper = reason.upper()
-                if 'STOP-LOSS' in reason_upper or 'SL' in reason_upper: action_hist = 'SL'
-                elif 'AUTO-PROFIT' in reason_upper or 'TP' in reason_upper: action_hist = 'TP'
-                elif 'TRAILING-STOP' in reason_upper or 'TS' in reason_upper: action_hist = 'TS'
-
-                # --- Enviar a historial DB ---
-                entry = { 'timestamp': datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z"), 'accion': action_hist, 'precio': close_price, 'motivo': reason, 'pnl_pct': last_pnl_pct, 'unrealizedPnl': last_unrealized_pnl, 'symbol': symbol }
-                self.history_signal.emit(entry) # La GUI lo guardará en DB
-                # -----------------------------
-                self._reset_and_save_ts_state(symbol) # Resetear TS al cerrar
-                time.sleep(2)
-                return True
-            else:
-                self.log_signal.emit(f"❌ Falló cierre ({reason}). ¿Ya cerrada?")
-                self._reset_and_save_ts_state(symbol) # Resetear TS si falla pero pudo cerrar
-                return False
-        # ... (manejo de excepciones igual) ...
+            self._log_protective_placed(symbol, state.protective.place(self.exchange, side, entry_price, amount, config, filters), filters)
+        except Exception as e:
+            self.log_signal.emit(f"💥 Error colocando órdenes de protección {symbol}: {e}"); traceback.print_exc()
+
+    def _ratchet_protective_stop(self, state, position_info, config, exchange=None):
+        """Mueve el stop de protección al nivel del Trailing Stop cuando este avanza."""
+        if state.protective is None or not state.protective.side: return
+        try:
+            new_price = state.protective.ratchet(exchange or self.exchange, state.trailing_data, position_info, config)
+            if new_price: self.log_signal.emit(f"🛡️ Stop de protección {state.symbol} movido a {new_price:.4f} (Trailing Stop).")
         except Exception as e:
-             self.log_signal.emit(f"💥 Error cierre ({reason}): {e}"); self.log_signal.emit(traceback.format_exc()); self.error_signal.emit(f"Error Cerrando ({reason})", f"{e}")
-             self._reset_and_save_ts_state(symbol) # Resetear TS en error
-             return False
+            self.log_signal.emit(f"⚠️ Error moviendo el stop de protección {state.symbol}: {e}")
+
+    def _cancel_protective_orders(self, state, exchange=None):
+        """Cancela las órdenes de protección que queden vivas (la posición ya se cerró)."""
+        if state.protective is None or not state.protective.active: return
+        try:
+            cancelled = state.protective.cancel(exchange or self.exchange)
+            self.log_signal.emit(f"ℹ️ {cancelled} orden(es) de protección canceladas para {state.symbol}.")
+        except Exception as e:
+            self.log_signal.emit(f"⚠️ Error cancelando órdenes de protección {state.symbol}: {e}")
+
+    def _protection_triggered(self, state, snapshot):
+        """True (y lo registra) si la posición desapareció sin cierre del bot con órdenes de protección vivas."""
+        protective = state.protective
+        if protective is None or not protective.active or snapshot.has_position: return False
+        if protective.placed_at and time.time() - protective.placed_at < RECONCILE_GRACE: return False # La posición aún puede no aparecer
+        self.log_signal.emit(f"🛡️ Posición {state.symbol} cerrada en el exchange por una orden de protección.")
+        return True
+
+    def _record_protective_close(self, state, snapshot, kind):
+        """Historial del cierre hecho por la orden `kind` ('sl' | 'tp' | None si no se sabe) con el último PNL conocido."""
+        protective = state.protective
+        if kind == 'sl': action, price = ('TS' if state.trailing_data.get('active') else 'SL'), protective.sl_price # Stop movido por el TS
+        elif kind == 'tp': action, price = 'TP', protective.tp_price
+        else: action, price = 'CLOSE', None
+        position = protective.last_position or {}
+        reason = f"Orden de protección {kind.upper()} (exchange)" if kind else "Orden de protección (exchange)"
+        self._emit_close_history(state.symbol, action, price or snapshot.price, reason, position.get('pnl_pct', 0.0), position.get('unrealizedPnl'))
+
+    def _reconcile_protective_orders(self, state, snapshot):
+        """
+        Si la posición desapareció sin cierre del bot, la cerró una orden de
+        protección en el exchange: se registra en el historial, se cancela la
+        otra y se resetea el TS.
+        """
+        if not self._protection_triggered(state, snapshot): return
+        with state.risk_lock:
+            self._record_protective_close(state, snapshot, state.protective.filled_kind(fetch_open_order_ids(self.exchange, state.symbol)))
+            self._cancel_protective_orders(state)
+            self._reset_and_save_ts_state(state.symbol)
 
-    # --- Nuevos helpers para TS state ---
+    # --- Nuevos helpers para TS state (por símbolo) ---
     def _save_current_ts_state(self, symbol):
-        """Guarda el estado actual de self.trailing_data."""
+        """Guarda el estado TS actual del símbolo."""
         try:
-            save_ts_state(symbol, self.trailing_data)
+            save_ts_state(symbol, self._get_symbol_state(symbol).trailing_data)
         except Exception as e:
             self.log_signal.emit(f"⚠️ Error al guardar estado TS para {symbol}: {e}")
 
     def _reset_and_save_ts_state(self, symbol):
-        """Resetea self.trailing_data a default y lo guarda."""
-        if self.trailing_data != DEFAULT_TS_STATE:
+        """Resetea el estado TS del símbolo a default y lo guarda."""
+        state = self._get_symbol_state(symbol)
+        if state.trailing_data != DEFAULT_TS_STATE:
              self.log_signal.emit(f"ℹ️ Reseteando estado Trailing Stop para {symbol}.")
-             self.trailing_data = DEFAULT_TS_STATE.copy() # <-- Esta línea ahora funcionará
+             state.trailing_data = DEFAULT_TS_STATE.copy()
              self._save_current_ts_state(symbol)
     # ---------------------------------
 
-    # --- Métodos de manejo de errores (sin cambios) ---
-    def _handle_ccxt_error(self, error_type, exception, wait_time): self.log_signal.emit(f"❌ Error {error_type}: {exception}. Reintentando {wait_time}s..."); self._interruptible_sleep(wait_time)
+    # --- Métodos de manejo de errores ---
+    # Con `symbol` se aplaza solo ese símbolo en el planificador (los demás siguen operando).
+    def _handle_ccxt_error(self, error_type, exception, wait_time, symbol=None):
+        self.log_signal.emit(f"❌ Error {error_type}{f' [{symbol}]' if symbol else ''}: {exception}. Reintentando {wait_time}s...")
+        if symbol: self._defer_symbol(symbol, wait_time)
+        else: self._interruptible_sleep(wait_time)
     def _handle_fatal_error(self, error_type, exception): msg = f"Error CRÍTICO {error_type}: {exception}. Deteniendo."; self.log_signal.emit(f"❌ {msg}"); self.error_signal.emit(f"Error Crítico - {error_type}", f"{exception}"); self._running = False
     def _handle_recoverable_error(self, error_type, exception, wait_time): self.log_signal.emit(f"⚠️ Error {error_type}: {exception}. Esperando {wait_time}s..."); self.error_signal.emit(f"Error - {error_type}", f"{exception}"); self._interruptible_sleep(wait_time)
-    def _handle_unexpected_error(self, exception, wait_time): self.log_signal.emit(f"💥 Error INESPERADO: {exception}"); self.log_signal.emit(traceback.format_exc()); self._interruptible_sleep(wait_time)
+    def _handle_unexpected_error(self, exception, wait_time, symbol=None):
+        self.log_signal.emit(f"💥 Error INESPERADO{f' [{symbol}]' if symbol else ''}: {exception}"); self.log_signal.emit(traceback.format_exc())
+        if symbol: self._defer_symbol(symbol, wait_time)
+        else: self._interruptible_sleep(wait_time)
 
     def stop(self):
         print("--- DEBUG: worker.stop() EJECUTADO ---") # <-- AÑADIR
@@ -0,0 +1,229 @@
+# daemon.py
+# -*- coding: utf-8 -*-
+"""
+Punto de entrada headless (sin PyQt ni pantalla) para servidores.
+
+Ejecuta el mismo bucle de trading que la GUI (BotWorker / AsyncBotWorker)
+leyendo la configuración de los JSON existentes (config_bot.json y
+api_credentials.json), con callbacks en lugar de señales Qt y logs a archivo.
+
+Ejemplo:
+    python daemon.py --strategies ema,rsi --filters sl,tp,ts --log-file ~/bot1.log
+    python daemon.py --sim --sim-latency 0.05 --strategies ema --console   # Sin red (exchange simulado)
+"""
+import os
+os.environ.setdefault('BOT_HEADLESS', '1') # Antes de importar core: señales por callbacks, sin Qt
+
+import argparse
+import logging
+import logging.handlers
+import signal
+import sys
+import threading
+import traceback
+
+import ccxt
+
+from core.exchange_utils import initialize_exchange, set_leverage
+from core.request_scheduler import attach_request_scheduler
+from core.worker import BotWorker
+from utils.config_manager import DEFAULT_CONFIG_PATH, load_config, build_bot_params
+from utils.api_config_manager import API_CONFIG_PATH, load_api_config
+from utils import db_manager
+
+DEFAULT_LOG_DIR = os.path.expanduser("~/Documents/BOT_TRADING/logs")
+VALID_FILTERS = ("sl", "tp", "ts")
+
+logger = logging.getLogger("bot_daemon")
+
+
+class _LoggerWriter:
+    """
+    Redirige print() de los módulos (stdout/stderr) al log. Lo que escriba
+    el propio logging mientras registra una línea (p.ej. handleError de un
+    handler que falla) va a `fallback` (el stderr real): sin esto, stderr ->
+    logging -> stderr sería una recursión infinita.
+    """
+    _local = threading.local() # Re-entrada por hilo (compartida por stdout y stderr)
+
+    def __init__(self, log_fn, fallback=None):
+        self.log_fn = log_fn
+        self.fallback = fallback or sys.__stderr__
+        self._buffer = ""
+
+    def _fallback_write(self, text):
+        try: self.fallback.write(text)
+        except Exception: pass
+
+    def write(self, text):
+        if getattr(self._local, 'busy', False): self._fallback_write(text); return
+        self._local.busy = True
+        try:
+            self._buffer += text
+            while "\n" in self._buffer:
+                line, self._buffer = self._buffer.split("\n", 1)
+                if not line.strip(): continue
+                try: self.log_fn(line.rstrip())
+                except Exception: self._fallback_write(line + "\n") # Un print() no debe fallar porque falle el log
+        finally:
+            self._local.busy = False
+
+    def flush(self):
+        if getattr(self._local, 'busy', False): return
+        line, self._buffer = self._buffer, ""
+        if line.strip(): self.write(line + "\n")
+
+
+class ConfigProvider:
+    """
+    get_config_fn del worker: parámetros validados del JSON, recargando el
+    archivo si cambia (como al editar parámetros en la GUI con el bot corriendo).
+    """
+    def __init__(self, config_path, worker_mode=None, metrics_file=None):
+        self.config_path = config_path
+        self.worker_mode = worker_mode
+        self.metrics_file = metrics_file
+        self._mtime = None
+        self._params = None
+
+    def __call__(self):
+        try: mtime = os.path.getmtime(self.config_path)
+        except OSError: mtime = None
+        if self._params is None or mtime != self._mtime:
+            try:
+                params = build_bot_params(load_config(logger.debug, self.config_path))
+                if self.worker_mode: params['worker_mode'] = self.worker_mode
+                if self.metrics_file: params['metrics_file'] = self.metrics_file
+                if self._params is not None: logger.info("🔄 Configuración recargada desde %s", self.config_path)
+                self._params, self._mtime = params, mtime
+            except (ValueError, TypeError) as e:
+                logger.error("❌ Config inválida en %s: %s (se mantiene la anterior)", self.config_path, e)
+        return self._params
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bot de trading en modo headless (sin GUI).")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, help="Ruta de config_bot.json")
+    parser.add_argument("--api-config", default=API_CONFIG_PATH, help="Ruta de api_credentials.json")
+    parser.add_argument("--strategies", default="", help="Estrategias activas separadas por comas (claves de STRATEGY_MAP)")
+    parser.add_argument("--filters", default="", help="Filtros activos separados por comas: sl,tp,ts")
+    parser.add_argument("--worker", choices=("thread", "async"), default=None, help="Sobrescribe 'worker_mode' de la config")
+    parser.add_argument("--metrics-file", default=None, help="Sobrescribe 'metrics_file' (latencias p50/p95/p99 en JSON o Prometheus)")
+    parser.add_argument("--sim", action="store_true", help="Exchange simulado en proceso (core.sim_exchange): sin credenciales ni red")
+    parser.add_argument("--sim-latency", type=float, default=0.0, help="Latencia simulada por llamada en segundos (con --sim)")
+    parser.add_argument("--sim-candle-seconds", type=float, default=1.0, help="Segundos reales por vela simulada (con --sim)")
+    parser.add_argument("--sim-seed", type=int, default=0, help="Semilla de precios y fallos simulados (con --sim)")
+    parser.add_argument("--name", default="bot", help="Nombre del bot (archivo de log por defecto)")
+    parser.add_argument("--log-file", default=None, help="Archivo de log (por defecto ~/Documents/BOT_TRADING/logs/<name>.log)")
+    parser.add_argument("--log-level", default="INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    parser.add_argument("--console", action="store_true", help="Además del archivo, mostrar el log por consola")
+    parser.add_argument("--no-history-db", action="store_true", help="No guardar operaciones en la base de datos SQLite")
+    return parser.parse_args(argv)
+
+
+def setup_logging(args):
+    log_file = os.path.expanduser(args.log_file or os.path.join(DEFAULT_LOG_DIR, f"{args.name}.log"))
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+    formatter = logging.Formatter("[%(asctime)s] %(levelname)s %(message)s", "%Y-%m-%d %H:%M:%S")
+    handlers = [logging.handlers.RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8")]
+    if args.console: handlers.append(logging.StreamHandler(sys.__stdout__))
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, args.log_level))
+    for handler in handlers:
+        handler.setFormatter(formatter); root.addHandler(handler)
+    # Los módulos del bot usan print(): a nivel DEBUG para no inundar el log
+    sys.stdout = _LoggerWriter(logging.getLogger("bot_daemon.stdout").debug)
+    sys.stderr = _LoggerWriter(logging.getLogger("bot_daemon.stderr").warning)
+    return log_file
+
+
+def parse_list(text):
+    return [item.strip() for item in str(text or "").split(",") if item.strip()]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    log_file = setup_logging(args)
+    logger.info("Iniciando bot headless '%s' (log: %s)", args.name, log_file)
+
+    strategies = parse_list(args.strategies)
+    filters = {key: key in parse_list(args.filters.lower()) for key in VALID_FILTERS}
+    unknown = [f for f in parse_list(args.filters.lower()) if f not in VALID_FILTERS]
+    if unknown: logger.warning("⚠️ Filtros desconocidos ignorados: %s", ", ".join(unknown))
+    if not strategies: logger.warning("⚠️ Sin estrategias activas: solo se gestionarán posiciones (SL/TP/TS).")
+
+    get_config = ConfigProvider(args.config, args.worker, args.metrics_file)
+    bot_params = get_config()
+    if bot_params is None: logger.error("❌ Cancelado: parámetros inválidos."); return 2
+
+    if args.sim:
+        from core.scheduler import parse_symbol_list
+        from core.sim_exchange import SimBook, SimExchange
+        book = SimBook(symbols=parse_symbol_list(bot_params), timeframe=bot_params.get('timeframe', '15m'),
+                       candle_seconds=args.sim_candle_seconds, latency=args.sim_latency, seed=args.sim_seed)
+        exchange = SimExchange(book=book)
+        logger.info("🧪 Exchange simulado: %s (latencia %.3fs, %.1fs por vela).", ", ".join(book.symbols()), args.sim_latency, args.sim_candle_seconds)
+    else:
+        api_config = load_api_config(args.api_config)
+        if not api_config.get("api_key") or not api_config.get("secret_key"):
+            logger.error("❌ Cancelado: faltan credenciales API en %s.", args.api_config); return 2
+
+        try:
+            exchange = initialize_exchange(
+                api_key=api_config['api_key'], secret_key=api_config['secret_key'],
+                exchange_name=api_config['exchange_name'], default_type=api_config['default_type'],
+                password=api_config.get('password'), is_sandbox=api_config.get('is_sandbox', False),
+                markets_cache=bot_params.get('markets_cache', True), markets_cache_ttl=bot_params.get('markets_cache_ttl', 12))
+        except Exception as e:
+            logger.error("❌ Error inicializando exchange: %s", e); return 1
+
+    if bot_params.get('request_scheduler', True):
+        scheduler = attach_request_scheduler(exchange, rate=bot_params.get('rate_limit_per_sec') or None, burst=bot_params.get('rate_limit_burst', 20))
+        logger.info("✅ Cola de peticiones con prioridad: %.1f peso/s (ráfaga %.0f).", scheduler.rate, scheduler.burst)
+
+    # Apalancamiento del símbolo principal (los adicionales los ajusta el worker)
+    try:
+        leverage, symbol = bot_params.get('leverage'), bot_params.get('symbol')
+        if leverage and symbol:
+            set_leverage(exchange, leverage, symbol, {"marginType": str(bot_params.get('margin_mode', 'isolated')).lower()})
+            logger.info("✅ set_leverage %sx enviado para %s.", leverage, symbol)
+    except ccxt.ExchangeError as e:
+        logger.warning("⚠️ No se pudo configurar apalancamiento: %s. Se continúa con el actual.", e)
+
+    worker_class = BotWorker
+    if bot_params.get('worker_mode') == 'async':
+        from core.async_worker import AsyncBotWorker
+        worker_class = AsyncBotWorker
+    worker = worker_class(exchange, lambda: list(strategies), lambda: dict(filters), get_config)
+
+    # --- Callbacks en lugar de slots Qt ---
+    fatal = []
+    worker.log_signal.connect(logger.info)
+    worker.error_signal.connect(lambda title, msg: (logger.error("%s: %s", title, msg), fatal.append(title) if "Crítico" in title else None))
+    worker.price_signal.connect(lambda price: logger.debug("Precio %s: %s", worker.primary_symbol, price))
+    worker.position_signal.connect(lambda data: logger.debug("Posición: %s", {k: data.get(k) for k in ('side', 'contracts', 'entry_price', 'pnl_pct', 'usdt')}))
+    worker.ui_update_signal.connect(lambda delta: logger.debug("Delta GUI #%s %s: %s", delta.get('seq'), delta.get('symbol'), sorted(k for k in delta if k not in ('seq', 'symbol'))))
+    if not args.no_history_db and db_manager.init_db():
+        worker.history_signal.connect(db_manager.save_history_entry)
+    worker.history_signal.connect(lambda entry: logger.info("📒 %s %s @ %s (%s)", entry.get('accion'), entry.get('symbol'), entry.get('precio'), entry.get('motivo')))
+
+    def _request_stop(signum, frame):
+        logger.info("Señal %s recibida: deteniendo bot...", signum); worker.stop()
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
+    try:
+        worker.run() # Bloquea hasta stop() o error fatal
+    except Exception as e:
+        logger.error("💥 Error no controlado en el worker: %s\n%s", e, traceback.format_exc()); return 1
+    finally:
+        if args.sim: logger.info("🧪 Resumen simulación: %s", exchange.book.stats())
+        try:
+            if hasattr(exchange, 'close'): exchange.close()
+        except Exception: pass
+        logger.info("🛑 Bot headless '%s' detenido.", args.name)
+    return 1 if fatal else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,6 +20,25 @@ from .rsi_improved import strategy_rsi_contrarian_improved
 from .ema_pullback import strategy_ema_pullback_entry
 from .rsi_contrarian_original import strategy_rsi_contrarian_original
 from .ema_cross_original import strategy_ema_cross_original
+# Formas por lotes (arrays de señales para todo el DataFrame, ver batch.py)
+from .bmsb_ontime import strategy_bmsb_ontime_batch
+from .bmsb_close import strategy_bmsb_close_batch
+from .bmsb_invert import strategy_bmsb_close_inverted_batch
+from .rsi_improved import strategy_rsi_contrarian_improved_batch
+from .ema_pullback import strategy_ema_pullback_entry_batch
+from .rsi_contrarian_original import strategy_rsi_contrarian_original_batch
+from .ema_cross_original import strategy_ema_cross_original_batch
+# Requisitos declarativos (indicadores y velas que necesita cada estrategia, ver requirements.py)
+from .bmsb_ontime import strategy_bmsb_ontime_requirements
+from .bmsb_close import strategy_bmsb_close_requirements
+from .bmsb_invert import strategy_bmsb_close_inverted_requirements
+from .rsi_improved import strategy_rsi_contrarian_improved_requirements
+from .ema_pullback import strategy_ema_pullback_entry_requirements
+from .rsi_contrarian_original import strategy_rsi_contrarian_original_requirements
+from .ema_cross_original import strategy_ema_cross_original_requirements
+from .batch import BatchSignals
+from .requirements import requirements, worker_columns, default_requirements, merge_requirements
+from .indicator_cache import cached_indicator
 # ---------------------------------------------------------------------
 
 # --- Definir el Mapa de Estrategias INICIAL (sin 'custom' todavía) ---
@@ -36,6 +55,31 @@ STRATEGY_MAP = {
     "ema_cross": strategy_ema_cross_original,
     # La estrategia 'custom' se añadirá dinámicamente si existe
 }
+
+# --- Mapa de formas por lotes (mismas claves; las usa el backtest) ---
+# Deben coincidir vela a vela con la función de STRATEGY_MAP.
+BATCH_STRATEGY_MAP = {
+    "rsi": strategy_rsi_contrarian_improved_batch,
+    "ema": strategy_ema_pullback_entry_batch,
+    "bmsb_ontime": strategy_bmsb_ontime_batch,
+    "bmsb_close": strategy_bmsb_close_batch,
+    "bmsb_invert": strategy_bmsb_close_inverted_batch,
+    "rsi_original": strategy_rsi_contrarian_original_batch,
+    "ema_cross": strategy_ema_cross_original_batch,
+    # 'custom' solo si custom_strategy.py define strategy_custom_batch(df, config)
+}
+
+# --- Mapa de requisitos (mismas claves; los usa el worker para calcular solo lo necesario) ---
+STRATEGY_REQUIREMENTS = {
+    "rsi": strategy_rsi_contrarian_improved_requirements,
+    "ema": strategy_ema_pullback_entry_requirements,
+    "bmsb_ontime": strategy_bmsb_ontime_requirements,
+    "bmsb_close": strategy_bmsb_close_requirements,
+    "bmsb_invert": strategy_bmsb_close_inverted_requirements,
+    "rsi_original": strategy_rsi_contrarian_original_requirements,
+    "ema_cross": strategy_ema_cross_original_requirements,
+    # 'custom': strategy_custom_requirements(config) si existe; si no, default_requirements
+}
 # -------------------------------------------------------------------
 
 # --- NUEVA FUNCIÓN PARA CARGAR Y AÑADIR LA ESTRATEGIA CUSTOM ---
@@ -43,6 +87,11 @@ def load_dynamic_custom_strategy():
     """
     Carga el código desde custom_strategy.py, lo ejecuta para obtener
     la función strategy_custom y la añade a STRATEGY_MAP si es válida.
+    El código tiene disponible `cached_indicator(df, 'ema'|'rsi', periodo, config)`
+    para pedir indicadores a la caché compartida en vez de recalcularlos, y
+    puede declarar `strategy_custom_requirements(config)` (ver requirements.py;
+    `requirements` y `worker_columns` también están disponibles). Sin esa
+    función se calculan los indicadores de siempre (default_requirements).
     """
     print("Debug [Strategies]: Intentando cargar estrategia personalizada...")
     # Usamos partial para pasar el logger (print en este caso)
@@ -53,7 +102,8 @@ def load_dynamic_custom_strategy():
     code_str = load_custom_strategy(log_callback=print) # load_custom_strategy ya loguea
 
     if code_str:
-        namespace = {}
+        namespace = {'cached_indicator': cached_indicator, # Caché de indicadores compartida con el worker
+                     'requirements': requirements, 'worker_columns': worker_columns}
         try:
             # ¡Punto crítico! Ejecuta el código cargado desde el archivo.
             # Aceptamos el riesgo para uso individual como comentamos.
@@ -65,30 +115,51 @@ def load_dynamic_custom_strategy():
                 # Añadir la función encontrada al mapa global
                 STRATEGY_MAP["custom"] = custom_fn
                 print("✅ Estrategia personalizada 'custom' cargada y añadida a STRATEGY_MAP.")
+                custom_batch_fn = namespace.get('strategy_custom_batch') # Opcional
+                if custom_batch_fn and callable(custom_batch_fn): BATCH_STRATEGY_MAP["custom"] = custom_batch_fn
+                else: BATCH_STRATEGY_MAP.pop("custom", None)
+                custom_req_fn = namespace.get('strategy_custom_requirements') # Opcional
+                if custom_req_fn and callable(custom_req_fn): STRATEGY_REQUIREMENTS["custom"] = custom_req_fn
+                else: STRATEGY_REQUIREMENTS.pop("custom", None)
             else:
                 # Si el archivo existe pero no define la función correctamente
                 print("❌ Error: Archivo custom_strategy.py no define la función `strategy_custom(df, position, config)` correctamente.")
                 # Eliminar 'custom' del mapa si existía de una carga anterior fallida
                 if "custom" in STRATEGY_MAP:
-                    del STRATEGY_MAP["custom"]
+                    del STRATEGY_MAP["custom"]; BATCH_STRATEGY_MAP.pop("custom", None); STRATEGY_REQUIREMENTS.pop("custom", None)
 
         except SyntaxError as se:
             print(f"❌ Error de Sintaxis en custom_strategy.py: {se}")
             traceback.print_exc()
-            if "custom" in STRATEGY_MAP: del STRATEGY_MAP["custom"]
+            if "custom" in STRATEGY_MAP: del STRATEGY_MAP["custom"]; BATCH_STRATEGY_MAP.pop("custom", None); STRATEGY_REQUIREMENTS.pop("custom", None)
         except Exception as e:
             # Otros errores durante la ejecución del código cargado (NameError, etc.)
             print(f"❌ Error ejecutando el código de custom_strategy.py: {e}")
             traceback.print_exc()
-            if "custom" in STRATEGY_MAP: del STRATEGY_MAP["custom"]
+            if "custom" in STRATEGY_MAP: del STRATEGY_MAP["custom"]; BATCH_STRATEGY_MAP.pop("custom", None); STRATEGY_REQUIREMENTS.pop("custom", None)
     else:
         # Si no se encontró el archivo custom_strategy.py
         print("ℹ️ No se encontró archivo custom_strategy.py o estaba vacío.")
         # Asegurarse de que 'custom' no esté en el mapa si el archivo no existe
         if "custom" in STRATEGY_MAP:
-            del STRATEGY_MAP["custom"]
+            del STRATEGY_MAP["custom"]; BATCH_STRATEGY_MAP.pop("custom", None); STRATEGY_REQUIREMENTS.pop("custom", None)
 # --- FIN NUEVA FUNCIÓN ---
 
+def get_strategy_requirements(name, config):
+    """Requisitos declarados por la estrategia `name` (default_requirements si no declara o falla)."""
+    req_fn = STRATEGY_REQUIREMENTS.get(name)
+    if req_fn is None: return default_requirements(config)
+    try:
+        req = req_fn(config) or {}
+        return requirements(req.get('indicators'), req.get('lookback', 1)) # Normaliza (p.ej. la custom) y valida los indicadores
+    except Exception as e:
+        print(f"⚠️ Requisitos de la estrategia '{name}' inválidos ({e}). Se usan los de por defecto.")
+        return default_requirements(config)
+
+def active_requirements(strategies, config):
+    """Unión de los requisitos de las estrategias `strategies` (nombres de STRATEGY_MAP)."""
+    return merge_requirements([get_strategy_requirements(name, config) for name in (strategies or [])])
+
 def get_available_strategies():
     """Retorna una lista de los nombres de las estrategias disponibles (incluye 'custom' si se cargó)."""
     # Asegurarse de intentar cargarla antes de devolver las disponibles? Opcional.
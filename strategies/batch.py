@@ -0,0 +1,48 @@
+# strategies/batch.py
+import numpy as np
+from collections import namedtuple
+
+# --- Forma por lotes de las estrategias ---
+# Cada estrategia integrada tiene, además de su función por vela (la que usa
+# el worker en vivo), una versión `*_batch(df, config)` que evalúa TODO el
+# DataFrame en una pasada NumPy. El elemento i de cada array es lo que la
+# función por vela devolvería con df.iloc[:i+1]:
+#   long / short:           {'action': 'long' | 'short'} sin posición
+#   exit_long / exit_short: {'action': 'close'} estando en long / short
+#   invert_long / invert_short: {'action': 'invertir_posicion'} en long / short
+
+BatchSignals = namedtuple('BatchSignals', ['long', 'short', 'exit_long', 'exit_short', 'invert_long', 'invert_short'])
+
+
+def empty_batch(n):
+    """Sin señales en ninguna vela."""
+    return BatchSignals(*(np.zeros(n, dtype=bool) for _ in BatchSignals._fields))
+
+
+def column(df, name):
+    """Columna como array float (pd.NA -> NaN)."""
+    return df[name].to_numpy(dtype=float, na_value=np.nan, copy=True)
+
+
+def previous(values):
+    """Valor de la vela anterior (NaN en la primera)."""
+    out = np.empty_like(values, dtype=float); out[:1] = np.nan; out[1:] = values[:-1]
+    return out
+
+
+def not_na(*arrays):
+    """True donde ninguno de los arrays es NaN."""
+    valid = np.ones(len(arrays[0]), dtype=bool)
+    for values in arrays: valid &= ~np.isnan(values)
+    return valid
+
+
+def rsi_thresholds(config):
+    """('rsi_threshold' 'Alto / Bajo') -> (alto, bajo); 70/30 si el formato no es válido."""
+    try:
+        parts = str(config.get("rsi_threshold", "70 / 30")).replace(' ', '').split('/')
+        upper, lower = float(parts[0]), float(parts[1])
+        if upper <= lower: raise ValueError("Umbral sup > inf")
+        return upper, lower
+    except Exception:
+        return 70.0, 30.0
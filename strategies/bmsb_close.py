@@ -1,6 +1,9 @@
 # src/strategies/bmsb_close.py
 import pandas as pd
 
+from .batch import empty_batch
+from .requirements import requirements
+
 def strategy_bmsb_close(df, position, config):
     """Estrategia simple: Cerrar Long si la última vela cerró bajista."""
     if df is None or df.empty: return None
@@ -9,4 +12,14 @@ def strategy_bmsb_close(df, position, config):
     if position and position.get('side') == 'long' and last_candle['close'] < last_candle['open']:
          # return {'action': 'close', 'reason': 'BMSB Close: Cierre < Apertura'}
          pass # Desactivado por defecto
-    return None
\ No newline at end of file
+    return None
+
+
+def strategy_bmsb_close_batch(df, config):
+    """Forma por lotes de strategy_bmsb_close: sin señales (cierre ('close') desactivado)."""
+    return empty_batch(0 if df is None else len(df))
+
+
+def strategy_bmsb_close_requirements(config):
+    """Sin indicadores: solo la vela actual."""
+    return requirements(lookback=1)
@@ -1,6 +1,9 @@
 # src/strategies/bmsb_invert.py
 import pandas as pd
 
+from .batch import empty_batch
+from .requirements import requirements
+
 def strategy_bmsb_close_inverted(df, position, config):
     """Estrategia: Si hay señal opuesta a la posición actual, cerrar e invertir."""
     if df is None or df.empty: return None
@@ -24,4 +27,14 @@ def strategy_bmsb_close_inverted(df, position, config):
         # return {'action': signal, 'reason': reason + " (Entrada)"}
         pass # Desactivado por defecto para no interferir con otras estrategias de entrada
 
-    return None
\ No newline at end of file
+    return None
+
+
+def strategy_bmsb_close_inverted_batch(df, config):
+    """Forma por lotes de strategy_bmsb_close_inverted: sin señales (devuelve 'long'/'short' con posición, que el worker no usa para invertir)."""
+    return empty_batch(0 if df is None else len(df))
+
+
+def strategy_bmsb_close_inverted_requirements(config):
+    """Sin indicadores: solo la vela actual."""
+    return requirements(lookback=1)
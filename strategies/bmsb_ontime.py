@@ -1,6 +1,9 @@
 # src/strategies/bmsb_ontime.py
 import pandas as pd
 
+from .batch import empty_batch
+from .requirements import requirements
+
 def strategy_bmsb_ontime(df, position, config):
     """Estrategia simple: Entrar Long si la última vela cerró alcista."""
     if df is None or df.empty: return None
@@ -9,4 +12,14 @@ def strategy_bmsb_ontime(df, position, config):
     if not position and last_candle['close'] > last_candle['open']:
          # return {'action': 'long', 'reason': 'BMSB Ontime: Cierre > Apertura'}
          pass # Desactivado por defecto - Descomentar para activar
-    return None
\ No newline at end of file
+    return None
+
+
+def strategy_bmsb_ontime_batch(df, config):
+    """Forma por lotes de strategy_bmsb_ontime: sin señales (entrada desactivada)."""
+    return empty_batch(0 if df is None else len(df))
+
+
+def strategy_bmsb_ontime_requirements(config):
+    """Sin indicadores: solo la vela actual."""
+    return requirements(lookback=1)
@@ -1,7 +1,11 @@
 # ema_cross_original.py
+import numpy as np
 import pandas as pd
 import traceback
 
+from .batch import BatchSignals, empty_batch, column, previous, not_na
+from .requirements import requirements, worker_columns
+
 def strategy_ema_cross_original(df, position, config):
     """
     Versión original de EMA Cross,
@@ -74,3 +78,23 @@ def strategy_ema_cross_original(df, position, config):
         return None
 
     return None
+
+
+def strategy_ema_cross_original_batch(df, config):
+    """Forma por lotes de strategy_ema_cross_original: cruces de EMA para todas las velas."""
+    n = 0 if df is None else len(df)
+    if n < 2 or 'ema_fast' not in df.columns or 'ema_slow' not in df.columns:
+        return empty_batch(n)
+    fast, slow = column(df, 'ema_fast'), column(df, 'ema_slow')
+    fast_prev, slow_prev = previous(fast), previous(slow)
+    valid = not_na(fast, slow, fast_prev, slow_prev)
+    with np.errstate(invalid='ignore'):
+        crossed_up = valid & (fast_prev <= slow_prev) & (fast > slow)
+        crossed_down = valid & (fast_prev >= slow_prev) & (fast < slow)
+    false = np.zeros(n, dtype=bool)
+    return BatchSignals(crossed_up, crossed_down & ~crossed_up, false, false.copy(), crossed_down.copy(), crossed_up.copy())
+
+
+def strategy_ema_cross_original_requirements(config):
+    """EMAs rápida y lenta; cruce entre la vela previa y la actual."""
+    return requirements(worker_columns(config, 'ema_fast', 'ema_slow'), lookback=2)
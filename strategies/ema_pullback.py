@@ -1,6 +1,10 @@
 # src/strategies/ema_pullback.py
+import numpy as np
 import pandas as pd
 
+from .batch import BatchSignals, empty_batch, column, not_na
+from .requirements import requirements, worker_columns
+
 def strategy_ema_pullback_entry(df, position, config):
     """
     Estrategia EMA Cross con Entrada en Pullback + posibilidad de inversión.
@@ -100,3 +104,29 @@ def strategy_ema_pullback_entry(df, position, config):
 
     # Si nada coincide
     return None
+
+
+def strategy_ema_pullback_entry_batch(df, config):
+    """Forma por lotes de strategy_ema_pullback_entry: setups de pullback (entrada e inversión) para todas las velas."""
+    n = 0 if df is None else len(df)
+    use_trend_filter = config.get("ema_use_trend_filter", False)
+    required_cols = ['ema_fast', 'ema_slow', 'close', 'low', 'high', 'open'] + (['ema_filter'] if use_trend_filter else [])
+    if n < 1 or any(col not in df.columns for col in required_cols):
+        return empty_batch(n)
+    cols = {col: column(df, col) for col in required_cols}
+    valid = not_na(*cols.values())
+    ema_fast, ema_slow, close, open_ = cols['ema_fast'], cols['ema_slow'], cols['close'], cols['open']
+    trend_ok_long = trend_ok_short = np.ones(n, dtype=bool)
+    if use_trend_filter: trend_ok_long, trend_ok_short = close > cols['ema_filter'], close < cols['ema_filter']
+    with np.errstate(invalid='ignore'):
+        long_setup = valid & (ema_fast > ema_slow) & (cols['low'] <= ema_fast) & (close > open_) & trend_ok_long
+        short_setup = valid & (ema_fast < ema_slow) & (cols['high'] >= ema_fast) & (close < open_) & trend_ok_short
+    # Entrada: LONG tiene prioridad. Inversión: en LONG con setup SHORT y en SHORT con setup LONG.
+    false = np.zeros(n, dtype=bool)
+    return BatchSignals(long_setup, short_setup & ~long_setup, false, false.copy(), short_setup.copy(), long_setup.copy())
+
+
+def strategy_ema_pullback_entry_requirements(config):
+    """EMAs rápida y lenta (y filtro si 'ema_use_trend_filter'); solo la última vela."""
+    columns = ['ema_fast', 'ema_slow'] + (['ema_filter'] if config.get("ema_use_trend_filter", False) else [])
+    return requirements(worker_columns(config, *columns), lookback=1)
@@ -0,0 +1,109 @@
+# strategies/indicator_cache.py
+import threading
+from collections import OrderedDict
+
+from .indicators import calculate_ema, calculate_rsi
+
+# --- Caché de indicadores por estado de velas y parámetros ---
+# El worker y las estrategias piden los indicadores con `cached_indicator`
+# en vez de recalcularlos: cada (símbolo, timeframe, última vela cerrada,
+# indicador, parámetros) se calcula una sola vez y el resto de consumidores
+# (otras estrategias, la gestión de la posición, el backtest por lotes)
+# reutilizan la misma serie.
+# La vela en curso (última fila) cambia en cada iteración y las estrategias
+# leen su valor, así que la clave incluye además su timestamp y su cierre
+# (y el cierre de la última cerrada, por si el exchange la corrige): el
+# resultado es siempre el mismo que recalcular sobre ese DataFrame.
+# Las columnas que registra el worker con `remember_indicator` valen lo
+# mismo que calcularlas aquí (IndicatorEngine re-siembra en la ventana).
+# Desalojo LRU por número de entradas y por valores totales guardados (las
+# series de un backtest pueden tener millones de filas).
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_VALUES = 5_000_000 # ~40 MB de float64
+
+# Indicador -> función(serie de cierres, periodo) (mismas funciones que indicators.py)
+INDICATORS = {
+    'ema': calculate_ema,
+    'rsi': calculate_rsi,
+}
+
+
+def candle_key(df):
+    """Huella del estado de las velas: (filas, primera, última cerrada y su cierre, vela en curso y su cierre)."""
+    n = len(df)
+    index, close = df.index, df['close']
+    last_closed = (index[-2], float(close.iloc[-2])) if n > 1 else (None, None)
+    return (n, index[0]) + last_closed + (index[-1], float(close.iloc[-1]))
+
+
+class IndicatorCache:
+    """LRU de series de indicadores. Seguro entre hilos (el cálculo va fuera del lock)."""
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_values=DEFAULT_MAX_VALUES):
+        self.max_entries = max(1, int(max_entries))
+        self.max_values = max(1, int(max_values))
+        self._entries = OrderedDict() # clave -> pd.Series
+        self._values = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def key(df, name, params, symbol=None, timeframe=None):
+        return (symbol, timeframe, name, tuple(params)) + candle_key(df)
+
+    def lookup(self, key):
+        with self._lock:
+            series = self._entries.get(key)
+            if series is None: self.stats['misses'] += 1
+            else: self._entries.move_to_end(key); self.stats['hits'] += 1
+            return series
+
+    def store(self, key, series):
+        """Guarda una serie ya calculada (p.ej. una columna del worker). Las mayores que max_values no se guardan."""
+        if series is None or len(series) > self.max_values: return series
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None: self._values -= len(old)
+            self._entries[key] = series; self._values += len(series)
+            while len(self._entries) > self.max_entries or self._values > self.max_values:
+                _, evicted = self._entries.popitem(last=False)
+                self._values -= len(evicted); self.stats['evictions'] += 1
+        return series
+
+    def get(self, df, name, *params, symbol=None, timeframe=None):
+        """Serie del indicador `name` con `params` sobre df['close'] (calculada o de la caché)."""
+        if df is None or df.empty or 'close' not in df.columns: return None
+        key = self.key(df, name, params, symbol, timeframe)
+        series = self.lookup(key)
+        if series is None:
+            series = self.store(key, INDICATORS[name](df['close'], *params))
+        return series
+
+    def clear(self, symbol=None):
+        """Vacía la caché (de un símbolo o entera)."""
+        with self._lock:
+            for key in [k for k in self._entries if symbol is None or k[0] == symbol]:
+                self._values -= len(self._entries.pop(key))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+INDICATOR_CACHE = IndicatorCache() # Compartida por el worker y las estrategias
+
+
+def cached_indicator(df, name, period, config=None, cache=None):
+    """
+    Indicador `name` ('ema', 'rsi') de `period` velas sobre df, a través de
+    la caché. `config` aporta 'symbol' y 'timeframe' para la clave.
+    """
+    config = config or {}
+    return (cache or INDICATOR_CACHE).get(df, name, int(period), symbol=config.get('symbol'), timeframe=config.get('timeframe'))
+
+
+def remember_indicator(df, name, period, series, config=None, cache=None):
+    """Registra una serie ya calculada (columna del worker/backtest) para que las estrategias la reutilicen."""
+    if df is None or df.empty or 'close' not in df.columns or series is None: return series
+    config = config or {}
+    cache = cache or INDICATOR_CACHE
+    return cache.store(cache.key(df, name, (int(period),), config.get('symbol'), config.get('timeframe')), series)
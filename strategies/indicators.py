@@ -2,37 +2,29 @@
 import pandas as pd
 import traceback
 
-def calculate_emas(df: pd.DataFrame, fast_period: int, slow_period: int, filter_period: int = None):
+def calculate_emas(df: pd.DataFrame, fast_period: int, slow_period: int, filter_period: int = None, copy: bool = True):
     """
     Calcula EMAs rápida, lenta y opcionalmente de filtro.
     Modifica el DataFrame añadiendo las columnas: 'ema_fast', 'ema_slow', 'ema_filter'.
-    Retorna el DataFrame modificado.
+    Retorna el DataFrame modificado. Con copy=False se añaden sobre el propio
+    `df` (p.ej. la vista del CandleBuffer, que ya es un objeto propio).
     """
     if df is None or df.empty or 'close' not in df.columns:
         print("Error en calculate_emas: DataFrame inválido o sin 'close'.")
         return df # O retornar None
 
-    df_out = df.copy() # Trabajar sobre una copia para evitar SettingWithCopyWarning
+    df_out = df.copy() if copy else df # Trabajar sobre una copia para evitar SettingWithCopyWarning
 
     try:
         # EMA Rápida
-        if len(df_out) >= fast_period:
-            df_out['ema_fast'] = df_out['close'].ewm(span=fast_period, adjust=False).mean()
-        else:
-            df_out['ema_fast'] = pd.NA
+        df_out['ema_fast'] = calculate_ema(df_out['close'], fast_period)
 
         # EMA Lenta
-        if len(df_out) >= slow_period:
-            df_out['ema_slow'] = df_out['close'].ewm(span=slow_period, adjust=False).mean()
-        else:
-            df_out['ema_slow'] = pd.NA
+        df_out['ema_slow'] = calculate_ema(df_out['close'], slow_period)
 
         # EMA Filtro (Opcional)
         if filter_period is not None:
-            if len(df_out) >= filter_period:
-                df_out['ema_filter'] = df_out['close'].ewm(span=filter_period, adjust=False).mean()
-            else:
-                df_out['ema_filter'] = pd.NA
+            df_out['ema_filter'] = calculate_ema(df_out['close'], filter_period)
         # Asegurar que la columna exista si no se calculó pero podría necesitarse?
         # elif 'ema_filter' not in df_out.columns:
         #      df_out['ema_filter'] = pd.NA # Opcional: crearla con NA
@@ -47,6 +39,12 @@ def calculate_emas(df: pd.DataFrame, fast_period: int, slow_period: int, filter_
 
     return df_out
 
+def calculate_ema(prices_series: pd.Series, period: int):
+    """EMA (ewm span=period, adjust=False) de una serie; NA si hay menos de `period` valores."""
+    if len(prices_series) < period:
+        return pd.Series([pd.NA] * len(prices_series), index=prices_series.index)
+    return prices_series.ewm(span=period, adjust=False).mean()
+
 def calculate_rsi(prices_series: pd.Series, period: int = 14):
     """Calcula el RSI para una serie de precios de pandas."""
     if not isinstance(prices_series, pd.Series) or prices_series.isnull().all() or len(prices_series) < period + 1:
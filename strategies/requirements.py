@@ -0,0 +1,58 @@
+# strategies/requirements.py
+
+# --- Requisitos declarativos de las estrategias ---
+# Cada estrategia de STRATEGY_MAP declara, con una función
+# `*_requirements(config)`, qué columnas de indicadores lee y cuántas velas
+# necesita. El worker calcula solo la unión de lo que piden las estrategias
+# activas y descarga las velas justas (el mayor lookback + margen).
+# Formato: {'indicators': {columna: (indicador, periodo)}, 'lookback': velas}
+# con indicador 'ema' o 'rsi' (ver indicator_cache.INDICATORS).
+
+# Velas para que el indicador tenga valor (mismos mínimos que indicators.py)
+WARMUP = {
+    'ema': lambda period: period,     # calculate_ema: NA con menos de `period` velas
+    'rsi': lambda period: period + 1, # calculate_rsi: NA con menos de `period + 1` velas
+}
+
+# Columnas que calcula el worker y la clave de config de su periodo
+WORKER_COLUMNS = {
+    'ema_fast': ('ema', 'ema_fast', 15),
+    'ema_slow': ('ema', 'ema_slow', 30),
+    'ema_filter': ('ema', 'ema_filter_period', 100),
+    'rsi': ('rsi', 'rsi_period', 14),
+}
+
+
+def worker_columns(config, *columns):
+    """{columna: (indicador, periodo)} de las columnas estándar del worker con los periodos de `config`."""
+    out = {}
+    for col in columns:
+        name, key, default = WORKER_COLUMNS[col]
+        out[col] = (name, int(config.get(key, default)))
+    return out
+
+
+def requirements(indicators=None, lookback=1):
+    """Requisitos normalizados: el lookback cubre como mínimo el calentamiento de cada indicador."""
+    indicators = {col: (name, int(period)) for col, (name, period) in (indicators or {}).items() if period}
+    warmups = [WARMUP[name](period) for name, period in indicators.values()]
+    return {'indicators': indicators, 'lookback': max([max(1, int(lookback))] + warmups)}
+
+
+def default_requirements(config):
+    """Lo que calculaba siempre el worker: EMAs rápida/lenta, RSI y EMA filtro si 'ema_use_trend_filter'."""
+    columns = ['ema_fast', 'ema_slow'] + (['ema_filter'] if config.get("ema_use_trend_filter", False) else []) + ['rsi']
+    return requirements(worker_columns(config, *columns), lookback=2)
+
+
+def merge_requirements(reqs):
+    """Unión de varios requisitos (mayor lookback). Si dos piden la misma columna con otro indicador/periodo gana el último."""
+    indicators, lookback = {}, 1
+    for req in reqs:
+        if not req: continue
+        for col, spec in req.get('indicators', {}).items():
+            if col in indicators and indicators[col] != spec:
+                print(f"⚠️ Requisitos: la columna '{col}' se pide como {indicators[col]} y como {spec}. Se usa {spec}.")
+            indicators[col] = spec
+        lookback = max(lookback, int(req.get('lookback', 1)))
+    return {'indicators': indicators, 'lookback': lookback}
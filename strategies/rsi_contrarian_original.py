@@ -1,19 +1,22 @@
 # src/strategies/rsi_contrarian_original.py
+import numpy as np
 import pandas as pd
 import traceback
-# Importar la función de cálculo desde el módulo de indicadores
-from strategies.indicators import calculate_rsi # O from .indicators import ... (prueba . primero)
+# RSI a través de la caché de indicadores (reutiliza la columna 'rsi' del worker si el periodo coincide)
+from .indicator_cache import cached_indicator
+from .batch import BatchSignals, empty_batch, rsi_thresholds
+from .requirements import requirements, worker_columns
 
 def strategy_rsi_contrarian_original(df, position, config): # Renombrada para claridad
     """
     Versión original de RSI Contrarian.
     Entrar contra tendencia en niveles extremos de RSI.
-    Calcula RSI internamente (o usa el importado).
+    RSI propio con config['rsi_period'], pedido a la caché de indicadores.
     """
     if df is None or df.empty or 'close' not in df.columns: return None
 
-    # Usar la función importada
-    rsi_series = calculate_rsi(df['close'], period=int(config.get('rsi_period', 14)))
+    # Calculado una sola vez por estado de velas (el worker ya lo registra al calcular sus indicadores)
+    rsi_series = cached_indicator(df, 'rsi', int(config.get('rsi_period', 14)), config)
     if rsi_series.isnull().all(): # Comprobar si todos son NA
         return None
     rsi_value = rsi_series.iloc[-1]
@@ -40,4 +43,25 @@ def strategy_rsi_contrarian_original(df, position, config): # Renombrada para cl
     # Lógica de Salida (Opcional)
     # ...
 
-    return None
\ No newline at end of file
+    return None
+
+
+def strategy_rsi_contrarian_original_batch(df, config):
+    """Forma por lotes de strategy_rsi_contrarian_original: RSI propio fuera de umbrales para todas las velas."""
+    n = 0 if df is None else len(df)
+    if n < 1 or 'close' not in df.columns:
+        return empty_batch(n)
+    period = int(config.get('rsi_period', 14))
+    rsi = pd.to_numeric(cached_indicator(df, 'rsi', period, config), errors='coerce').to_numpy(dtype=float, na_value=np.nan, copy=True)
+    rsi[:period] = np.nan # Con menos de period+1 velas calculate_rsi devuelve NA
+    upper_threshold, lower_threshold = rsi_thresholds(config)
+    with np.errstate(invalid='ignore'):
+        go_long = rsi < lower_threshold
+        go_short = (rsi > upper_threshold) & ~go_long
+    false = np.zeros(n, dtype=bool)
+    return BatchSignals(go_long, go_short, false, false.copy(), false.copy(), false.copy())
+
+
+def strategy_rsi_contrarian_original_requirements(config):
+    """RSI de 'rsi_period' (la columna del worker le llega por la caché de indicadores)."""
+    return requirements(worker_columns(config, 'rsi'), lookback=1)
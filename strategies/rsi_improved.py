@@ -1,7 +1,11 @@
 # src/strategies/rsi_improved.py
+import numpy as np
 import pandas as pd
 import traceback
 
+from .batch import BatchSignals, empty_batch, column, previous, not_na, rsi_thresholds
+from .requirements import requirements, worker_columns
+
 def strategy_rsi_contrarian_improved(df, position, config):
     """
     Estrategia RSI Contrarian Mejorada.
@@ -53,4 +57,31 @@ def strategy_rsi_contrarian_improved(df, position, config):
 
     # Lógica de salida opcional aquí...
 
-    return None
\ No newline at end of file
+    return None
+
+
+def strategy_rsi_contrarian_improved_batch(df, config):
+    """Forma por lotes de strategy_rsi_contrarian_improved: cruces del RSI hacia dentro de los umbrales."""
+    n = 0 if df is None else len(df)
+    required_cols = ['rsi', 'close']
+    use_trend_filter = config.get("rsi_use_trend_filter", False)
+    if use_trend_filter: required_cols.append('ema_filter')
+    if n < 2 or any(col not in df.columns for col in required_cols):
+        return empty_batch(n)
+    upper_threshold, lower_threshold = rsi_thresholds(config)
+    cols = {col: column(df, col) for col in required_cols}
+    valid = not_na(*cols.values(), *(previous(v) for v in cols.values())) # Sin NA en las dos últimas filas
+    rsi, rsi_prev, close = cols['rsi'], previous(cols['rsi']), cols['close']
+    trend_ok_long = trend_ok_short = np.ones(n, dtype=bool)
+    if use_trend_filter: trend_ok_long, trend_ok_short = close > cols['ema_filter'], close < cols['ema_filter']
+    with np.errstate(invalid='ignore'):
+        go_long = valid & (rsi_prev < lower_threshold) & (rsi >= lower_threshold) & trend_ok_long
+        go_short = valid & (rsi_prev > upper_threshold) & (rsi <= upper_threshold) & trend_ok_short & ~go_long
+    false = np.zeros(n, dtype=bool)
+    return BatchSignals(go_long, go_short, false, false.copy(), false.copy(), false.copy())
+
+
+def strategy_rsi_contrarian_improved_requirements(config):
+    """RSI (y EMA filtro si 'rsi_use_trend_filter'); cruce entre la vela previa y la actual."""
+    columns = ['rsi'] + (['ema_filter'] if config.get("rsi_use_trend_filter", False) else [])
+    return requirements(worker_columns(config, *columns), lookback=2)
@@ -0,0 +1,222 @@
+# strategies/streaming_indicators.py
+import numpy as np
+import pandas as pd
+
+# --- Indicadores incrementales ---
+# Mantienen el estado de la recursión de EMA y RSI (Wilder) y solo procesan
+# las velas nuevas: cuando cierra una vela se "confirma" su estado y la vela
+# en curso se recalcula con `peek` sin tocar el estado confirmado.
+# Usan la misma recursión que indicators.py (ewm adjust=False), pero el
+# estado arrastra velas anteriores a la ventana descargada, mientras que
+# calculate_ema / calculate_rsi se re-siembran en la primera vela de cada
+# ventana. IndicatorEngine corrige esa diferencia de forma exacta: en una
+# recursión lineal y = (1-a)·y + a·x la diferencia entre dos siembras decae
+# como (1-a)^k, así que el valor de la ventana es
+#     y_ventana[k] = y_continuo[k] + (1-a)^k · (semilla - y_continuo[0])
+# (semilla = primer cierre para la EMA, 0 para las medias de ganancias y
+# pérdidas del RSI). Con eso da los mismos valores que la versión por lotes
+# sobre el mismo DataFrame (salvo redondeo de coma flotante).
+#
+# Las columnas ya re-sembradas se guardan: mientras la ventana empieza en la
+# misma vela solo se calculan las filas nuevas y la vela en curso (O(1) por
+# iteración). Cuando cierra una vela y la ventana se desplaza, cambia la
+# semilla y la corrección (1-a)^k de TODAS las filas, así que se reescala en
+# una pasada vectorizada: O(ventana) una vez por vela cerrada, no en cada
+# iteración. Copiar las columnas al DataFrame de la iteración es una memcpy.
+
+
+class StreamingEMA:
+    """EMA con alpha = 2/(period+1), equivalente a close.ewm(span=period, adjust=False)."""
+    def __init__(self, period):
+        self.period = int(period)
+        self.alpha = 2.0 / (self.period + 1)
+        self.value = None # EMA de la última vela cerrada
+        self.count = 0
+
+    def peek(self, price):
+        """Valor con `price` como vela en curso, sin modificar el estado."""
+        if self.value is None: return float(price)
+        return self.value + self.alpha * (float(price) - self.value)
+
+    def update(self, price):
+        """Confirma una vela cerrada y devuelve la EMA resultante."""
+        self.value = self.peek(price); self.count += 1
+        return self.value
+
+
+class StreamingRSI:
+    """
+    RSI de Wilder (alpha = 1/period), equivalente a calculate_rsi: medias
+    ewm(com=period-1, adjust=False) de ganancias/pérdidas y 100 mientras no
+    hay `period` velas o si la pérdida media es 0.
+    """
+    def __init__(self, period=14):
+        self.period = int(period)
+        self.alpha = 1.0 / self.period
+        self.avg_gain = None; self.avg_loss = None
+        self.prev_close = None
+        self.count = 0
+
+    def _step(self, price):
+        price = float(price)
+        if self.prev_close is None: gain = loss = 0.0 # Primera vela: diff() es NaN -> 0
+        else:
+            delta = price - self.prev_close
+            gain = delta if delta > 0 else 0.0; loss = -delta if delta < 0 else 0.0
+        if self.avg_gain is None: return gain, loss
+        return (self.avg_gain + self.alpha * (gain - self.avg_gain),
+                self.avg_loss + self.alpha * (loss - self.avg_loss))
+
+    def _value(self, avg_gain, avg_loss, count):
+        if count < self.period or not avg_loss: return 100.0
+        rsi = 100.0 - (100.0 / (1.0 + avg_gain / avg_loss))
+        return min(100.0, max(0.0, rsi))
+
+    def peek(self, price):
+        avg_gain, avg_loss = self._step(price)
+        return self._value(avg_gain, avg_loss, self.count + 1)
+
+    def update(self, price):
+        self.avg_gain, self.avg_loss = self._step(price)
+        self.prev_close = float(price); self.count += 1
+        return self._value(self.avg_gain, self.avg_loss, self.count)
+
+
+def _periods(*periods):
+    return tuple(int(p) if p else None for p in periods)
+
+
+class IndicatorEngine:
+    """
+    Motor incremental de 'ema_fast', 'ema_slow', 'ema_filter' y 'rsi' para
+    UN (símbolo, timeframe); un periodo None desactiva esa columna (solo se
+    calcula lo que piden las estrategias activas). `apply(df)` añade las
+    columnas al DataFrame procesando solo las velas cerradas nuevas y la vela
+    en curso (la última fila), y las re-siembra en la primera fila del
+    DataFrame (mismos valores que calculate_ema / calculate_rsi sobre él).
+    Si el DataFrame no encaja con lo ya procesado (hueco, recarga, cambio de
+    periodos) se re-siembra el estado con una pasada completa.
+    """
+    COLUMNS = ('ema_fast', 'ema_slow', 'ema_filter', 'rsi')
+
+    def __init__(self, fast_period, slow_period, filter_period=None, rsi_period=14, max_history=1000):
+        self.params = _periods(fast_period, slow_period, filter_period, rsi_period)
+        self.max_history = max(1, int(max_history))
+        self._reset()
+
+    def _reset(self):
+        fast, slow, filt, rsi_p = self.params
+        self.emas = {}
+        if fast: self.emas['ema_fast'] = StreamingEMA(fast)
+        if slow: self.emas['ema_slow'] = StreamingEMA(slow)
+        if filt: self.emas['ema_filter'] = StreamingEMA(filt)
+        self.rsi = StreamingRSI(rsi_p) if rsi_p else None
+        self.columns = list(self.emas) + (['rsi'] if self.rsi else [])
+        # Estado continuo de velas cerradas (EMAs + medias de ganancia/pérdida del RSI) en un buffer numpy
+        # (se compacta al llenarse: coste amortizado O(1))
+        self._width = len(self.emas) + (2 if self.rsi else 0)
+        self._decay = np.array([1.0 - ema.alpha for ema in self.emas.values()] + ([1.0 - self.rsi.alpha] * 2 if self.rsi else []))
+        self._values = np.empty((2 * self.max_history, self._width), dtype=float)
+        self._size = 0
+        self._dropped = 0 # Filas descartadas al compactar (posición absoluta = índice + _dropped)
+        self.last_closed_ts = None
+        self._allocate_window()
+
+    def _allocate_window(self):
+        """Columnas re-sembradas de la ventana, alineadas con _values (+1 fila para la vela en curso)."""
+        self._window = np.empty((len(self._values) + 1, self._width), dtype=float)
+        self._rsi = np.empty(len(self._values) + 1, dtype=float)
+        self._window_start = None # Posición absoluta de la primera fila de la ventana re-sembrada
+        self._window_end = 0 # Filas cerradas de la ventana ya calculadas (índice en _values)
+        self._offset = None # semilla - estado continuo en la primera fila
+        self._scale = None # Escala de ganancias/pérdidas para anular el residuo de redondeo
+
+    def _grow(self, rows):
+        """Amplía el histórico para ventanas de `rows` velas cerradas (conserva el estado)."""
+        values = np.empty((2 * rows, self._width), dtype=float)
+        values[:self._size] = self._values[:self._size]
+        window, rsi = self._window, self._rsi
+        self._values, self.max_history = values, rows
+        self._window = np.empty((len(values) + 1, self._width), dtype=float); self._window[:self._size] = window[:self._size]
+        self._rsi = np.empty(len(values) + 1, dtype=float); self._rsi[:self._size] = rsi[:self._size]
+
+    def matches(self, fast_period, slow_period, filter_period=None, rsi_period=14):
+        return self.params == _periods(fast_period, slow_period, filter_period, rsi_period)
+
+    def _commit(self, ts, price):
+        if self._size == len(self._values): # Lleno: conservar solo las últimas max_history
+            keep = slice(self._size - self.max_history, self._size)
+            self._values[:self.max_history] = self._values[keep]
+            self._window[:self.max_history] = self._window[keep]; self._rsi[:self.max_history] = self._rsi[keep]
+            shift = self._size - self.max_history
+            self._dropped += shift; self._size = self.max_history
+            self._window_end = max(0, self._window_end - shift)
+        row = [ema.update(price) for ema in self.emas.values()]
+        if self.rsi:
+            self.rsi.update(price); row += [self.rsi.avg_gain, self.rsi.avg_loss]
+        self._values[self._size] = row
+        self._size += 1; self.last_closed_ts = ts
+
+    def _peek(self, price):
+        row = [ema.peek(price) for ema in self.emas.values()]
+        if self.rsi: row += list(self.rsi._step(price))
+        return row
+
+    def _new_closed_rows(self, index):
+        """Posición de la primera vela cerrada sin procesar, o None si hay que re-sembrar."""
+        if self.last_closed_ts is None: return None
+        # Buscar desde el final: en régimen estable la última procesada es la penúltima fila
+        for pos in range(len(index) - 2, -1, -1):
+            ts = index[pos]
+            if ts == self.last_closed_ts: return pos + 1
+            if ts < self.last_closed_ts: return None
+        return None
+
+    def _reseed_rows(self, begin, end, first):
+        """Re-siembra las filas [begin, end) de _window (índices de _values; `first` = índice de la primera fila de la ventana)."""
+        steps = np.arange(begin - first, end - first)
+        rows = self._values[begin:end] if end <= self._size else np.vstack([self._values[begin:self._size], self._window[self._size:end]])
+        self._window[begin:end] = rows + self._decay ** steps[:, None] * self._offset
+        if not self.rsi: return
+        # Anular el residuo de redondeo de la corrección donde la versión por lotes da 0 exacto
+        self._scale = np.maximum(self._scale, np.nanmax(np.abs(rows[:, -2:]), axis=0)) if len(rows) else self._scale
+        averages = self._window[begin:end, -2:]
+        averages[np.abs(averages) <= 1e-12 * self._scale] = 0.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100.0 - 100.0 / (1.0 + averages[:, 0] / averages[:, 1])
+        rsi[steps < self.rsi.period - 1] = np.nan # min_periods=period de calculate_rsi
+        self._rsi[begin:end] = np.clip(np.where(np.isnan(rsi), 100.0, rsi), 0.0, 100.0)
+
+    def apply(self, df):
+        """Añade/actualiza las columnas de indicadores en `df` (in-place) y lo devuelve."""
+        if df is None or df.empty or 'close' not in df.columns: return df
+        closes = df['close'].to_numpy(dtype=float)
+        index = df.index
+        n = len(df)
+
+        if n - 1 > self.max_history: self._grow(n - 1) # El histórico debe cubrir la ventana entera
+        start = self._new_closed_rows(index)
+        if start is None or self._size < start: # El histórico no cubre las filas anteriores
+            self._reset(); start = 0
+        for pos in range(start, n - 1): # Velas cerradas nuevas
+            self._commit(index[pos], closes[pos])
+
+        # Ventana: histórico confirmado (alineado con las n-1 primeras filas) + vela en curso en la fila _size
+        first, live = self._size - (n - 1), self._size
+        self._window[live] = self._peek(closes[-1]) # Estado continuo de la vela en curso (se re-siembra abajo)
+        if self._window_start != self._dropped + first: # Ventana nueva o desplazada: re-sembrar todas sus filas
+            seed = np.array([closes[0]] * len(self.emas) + ([0.0, 0.0] if self.rsi else []))
+            self._offset = seed - (self._values[first] if n > 1 else self._window[live])
+            self._window_start, self._window_end = self._dropped + first, first
+            self._scale = np.zeros(2)
+        self._reseed_rows(self._window_end, live + 1, first) # Solo velas cerradas nuevas + vela en curso
+        self._window_end = live
+
+        for j, (col, ema) in enumerate(self.emas.items()):
+            if n < ema.period:
+                df[col] = pd.NA; continue # Igual que calculate_ema con pocas velas
+            df[col] = self._window[first:live + 1, j].copy()
+        if self.rsi:
+            if n < self.rsi.period + 1: df['rsi'] = pd.NA # Igual que calculate_rsi con pocas velas
+            else: df['rsi'] = self._rsi[first:live + 1].copy()
+        return df
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import time
+
+os.environ.setdefault('BOT_HEADLESS', '1') # Antes de importar core: señales por callbacks, sin Qt
+
+import pytest
+
+from core.async_worker import AsyncBotWorker
+from core.market_snapshot import MarketSnapshot
+from core.protective_orders import ProtectiveOrders, RECONCILE_GRACE
+from core.sim_exchange import AsyncSimExchange, SimBook, SimExchange
+from core.worker import BotWorker
+import utils.state_manager as state_manager
+
+# Órdenes de protección (SL/TP reduce-only) contra el exchange simulado:
+# colocar, mover el stop con el Trailing Stop, cancelar tras el cierre y
+# reconciliar cuando una de ellas cierra la posición en el exchange, con la
+# instancia síncrona (BotWorker) y con la asyncio (AsyncBotWorker).
+
+SYMBOL = 'BTC/USDT:USDT'
+CONFIG = {'symbol': SYMBOL, 'timeframe': '1m', 'leverage': 10, 'trade_pct': 10, 'stop_loss': 5, 'auto_profit': 10,
+          'trailing_trigger': 2, 'trailing_stop': 50, 'protective_orders': True}
+FILTERS = {'sl': True, 'tp': True, 'ts': True}
+
+
+def _book():
+    """Velas planas a 100 y una vela siguiente que baja hasta 95 (cruza el stop de un long)."""
+    rows = [[60_000 * i, 100.0, 100.0, 100.0, 100.0, 1.0] for i in range(3)]
+    rows.append([60_000 * 3, 100.0, 100.0, 95.0, 96.0, 1.0])
+    return SimBook(symbols=[SYMBOL], paths={SYMBOL: rows}, history=3, fee_rate=0.0)
+
+
+def _snapshot(position=None, price=100.0):
+    return MarketSnapshot.from_market_data(SYMBOL, '1m', {'price': price, 'ohlcv': None, 'balance': 1000.0, 'position': position},
+                                           fetched_at=time.time())
+
+
+def _orders(book):
+    return {o['info']['kind']: o for o in book.fetch_open_orders(SYMBOL)}
+
+
+@pytest.fixture(autouse=True)
+def ts_state_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(state_manager, 'TS_STATE_FILE_PATH', str(tmp_path / 'trailing_stop_state.json'))
+
+
+def test_place_ratchet_cancel():
+    book = _book(); exchange = SimExchange(book=book)
+    exchange.create_order(SYMBOL, 'market', 'buy', 2.0)
+    protective = ProtectiveOrders(SYMBOL)
+
+    assert protective.place(exchange, 'long', 100.0, 2.0, CONFIG, FILTERS) == [('sl', 99.5), ('tp', 101.0)]
+    orders = _orders(book)
+    assert orders['stop']['triggerPrice'] == 99.5 and orders['take_profit']['triggerPrice'] == 101.0
+    assert all(o['side'] == 'sell' and o['reduceOnly'] for o in orders.values())
+
+    trailing = {'active': True, 'peak_pnl_pct': 0.05, 'target_pnl_pct': 0.025}
+    assert protective.ratchet(exchange, trailing, None, CONFIG) == pytest.approx(100.25)
+    assert _orders(book)['stop']['triggerPrice'] == 100.25 and len(book.open_orders) == 2 # El stop anterior se canceló
+    assert protective.ratchet(exchange, trailing, None, CONFIG) is None # Sin mejora no se reemplaza
+
+    assert protective.cancel(exchange) == 2
+    assert not book.open_orders and not protective.active
+
+
+def test_place_only_active_filters():
+    book = _book(); exchange = SimExchange(book=book)
+    exchange.create_order(SYMBOL, 'market', 'buy', 2.0)
+    protective = ProtectiveOrders(SYMBOL)
+
+    assert protective.place(exchange, 'long', 100.0, 2.0, CONFIG, {'sl': False, 'tp': True, 'ts': True}) == [('tp', 101.0)]
+    assert list(_orders(book)) == ['take_profit'] and not protective.covers('sl')
+    protective.cancel(exchange)
+
+    assert protective.place(exchange, 'long', 100.0, 2.0, CONFIG, {'sl': False, 'tp': False, 'ts': True}) == []
+    assert not book.open_orders and not protective.active
+    trailing = {'active': True, 'peak_pnl_pct': 0.05, 'target_pnl_pct': 0.025}
+    assert protective.ratchet(exchange, trailing, None, CONFIG) == pytest.approx(100.25) # El TS coloca su propio stop
+    assert list(_orders(book)) == ['stop']
+
+
+def test_reconcile_after_stop_fills():
+    book = _book(); exchange = SimExchange(book=book)
+    worker = BotWorker(exchange, lambda: [], lambda: FILTERS, lambda: dict(CONFIG))
+    state = worker._get_symbol_state(SYMBOL)
+    history = []; worker.history_signal.connect(history.append)
+    order = exchange.create_order(SYMBOL, 'market', 'buy', 2.0)
+    assert worker._on_position_opened(_snapshot(), 'long', order, 2.0, 'test', CONFIG)
+    assert len(book.open_orders) == 2
+    worker._store_snapshot(state, _snapshot({'side': 'long', 'entry_price': 100.0, 'pnl_pct': -3.0, 'unrealizedPnl': -0.6}, price=99.7))
+
+    book.advance(1) # La vela cruza 99.5: el stop cierra la posición en el exchange
+    assert not book.positions and list(_orders(book)) == ['take_profit']
+
+    state.protective.placed_at -= RECONCILE_GRACE
+    worker._reconcile_protective_orders(state, _snapshot(price=96.0))
+    assert not book.open_orders and not state.protective.active
+    assert [(e['accion'], e['precio'], e['pnl_pct'], e['unrealizedPnl']) for e in history[1:]] == [('SL', 99.5, -3.0, -0.6)]
+
+
+def test_async_worker_uses_async_exchange():
+    book, other = _book(), _book()
+    worker = AsyncBotWorker(SimExchange(book=other), lambda: [], lambda: FILTERS, lambda: dict(CONFIG)) # El síncrono no debe usarse
+    state = worker._get_symbol_state(SYMBOL)
+    history = []; worker.history_signal.connect(history.append)
+
+    async def scenario():
+        worker.async_exchange = AsyncSimExchange(book=book)
+        try:
+            assert await worker._execute_open_position_async(_snapshot(), 'long', CONFIG, 'test')
+            assert set(_orders(book)) == {'stop', 'take_profit'}
+
+            position = dict(book.position_list()[0], side='long', entry_price=100.0, leverage=10, pnl_pct=0.05)
+            assert not await worker._manage_open_position_async(_snapshot(position, price=100.5), FILTERS, CONFIG)
+            assert _orders(book)['stop']['triggerPrice'] == 100.25 and len(book.open_orders) == 2
+
+            assert await worker._execute_close_position_async(_snapshot(position, price=100.5), 'manual')
+            assert not book.open_orders and not book.positions
+
+            state.last_close_at = None
+            assert await worker._execute_open_position_async(_snapshot(), 'long', CONFIG, 'test')
+            book.advance(1)
+            state.protective.placed_at -= RECONCILE_GRACE
+            await worker._reconcile_protective_orders_async(state, _snapshot(price=96.0))
+            assert not book.open_orders and not state.protective.active
+            assert history[-1]['accion'] == 'SL' and history[-1]['precio'] == 99.5
+        finally:
+            await worker.async_exchange.close()
+
+    asyncio.run(scenario())
+    assert 'create_order' not in other.calls and 'cancel_order' not in other.calls
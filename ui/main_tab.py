@@ -20,6 +20,8 @@ import mplfinance as mpf
 import matplotlib.pyplot as plt
 #import matplotlib.dates as mdates
 from collections import OrderedDict # Para leyenda manual
+from core.scheduler import SCHEDULE_MODES
+from core.ui_updates import apply_ohlcv_delta
 # --- Fin Importaciones ---
 
 # --- Clase MainTab (Contenido del Panel Principal UI) ---
@@ -63,6 +65,7 @@ class MainTab(QWidget):
         # --- NUEVO: Guardar último DataFrame ---
         self.latest_df_ohlcv = None
         # ------------------------------------
+        self._position_view = {} # Último estado de posición completo (los deltas solo traen campos cambiados)
 
         self.init_ui()
         print("Debug [MainTab]: __init__ completado.")
@@ -108,6 +111,22 @@ class MainTab(QWidget):
             ("Auto Profit (%)", "auto_profit"), ("Trailing Trig.(%)", "trailing_trigger"),
             ("Trailing Dist.(%)", "trailing_stop"),
             ("Umbrales RSI", "rsi_threshold"), ("Intervalo Loop(s)", "loop_interval"),
+            ("Símbolos Extra", "symbols"), # Lista separada por comas, operada por el mismo worker
+            ("Modo Planif.", "schedule_mode"), ("Retardo Vela(s)", "candle_close_delay"),
+            ("Chequeo Riesgo(s)", "risk_check_interval"),
+            ("Descarga Paralela", "parallel_fetch"), ("Hilos Descarga", "fetch_workers"),
+            ("Modo Worker", "worker_mode"), ("Caché Velas", "ohlcv_cache"),
+            ("Indicadores Incr.", "streaming_indicators"),
+            ("Archivo Métricas", "metrics_file"), ("Formato Métricas", "metrics_format"),
+            ("Métricas cada N", "metrics_every"),
+            ("GUI por Deltas", "ui_coalesce"), ("GUI Máx. FPS", "ui_max_fps"),
+            ("Caché Mercados", "markets_cache"), ("TTL Mercados(h)", "markets_cache_ttl"),
+            ("Cola Prioridad", "request_scheduler"), ("Peso/s (0=auto)", "rate_limit_per_sec"),
+            ("Ráfaga Peso", "rate_limit_burst"),
+            ("Feed Precios", "price_feed"), ("Feed Intervalo(s)", "price_feed_interval"),
+            ("Feed Edad Máx.(s)", "price_feed_max_age"),
+            ("Vigilante Riesgo", "risk_watchdog"), ("Vigilante Int.(s)", "risk_watchdog_interval"),
+            ("SL/TP en Exchange", "protective_orders"), ("Disparo SL/TP", "protective_orders_working_type"),
             # --- Nuevos Parámetros EMA Pullback ---
             ("EMA Rápida", "ema_fast"),
             ("EMA Lenta", "ema_slow"),
@@ -347,9 +366,24 @@ class MainTab(QWidget):
                 # --- Validaciones específicas (añadir si es necesario para nuevas claves) ---
                 if key == "leverage" and not (1 <= new_val <= 125): raise ValueError("Apalanc. 1-125")
                 if key == "symbol" and ("/" not in new_val or len(new_val) < 3): raise ValueError("Símbolo: XXX/YYY")
+                if key == "symbols" and any("/" not in s for s in [p.strip() for p in new_val.split(',')] if s): raise ValueError("Símbolos: XXX/YYY, ZZZ/YYY")
                 if key == "inversion" and new_val <= 0: raise ValueError("Inversión > 0")
                 if key in ["trade_pct","stop_loss","auto_profit","trailing_trigger","trailing_stop", "ema_fast", "ema_slow", "ema_filter_period"] and new_val<0: raise ValueError("Valor >= 0") # Añadidas EMAs
                 if key == "loop_interval" and new_val < 1: raise ValueError("Intervalo >= 1s")
+                if key == "schedule_mode" and new_val.lower() not in SCHEDULE_MODES: raise ValueError("Modo: " + " o ".join(f"'{m}'" for m in SCHEDULE_MODES))
+                if key in ["candle_close_delay", "risk_check_interval"] and new_val < 0: raise ValueError("Valor >= 0")
+                if key == "fetch_workers" and not (1 <= new_val <= 16): raise ValueError("Hilos 1-16")
+                if key == "worker_mode" and new_val.lower() not in ("thread", "async"): raise ValueError("Modo: 'thread' o 'async'")
+                if key == "metrics_format" and new_val.lower() not in ("json", "prometheus"): raise ValueError("Formato: 'json' o 'prometheus'")
+                if key == "metrics_every" and new_val < 1: raise ValueError("Cada N >= 1")
+                if key == "ui_max_fps" and not (0 < new_val <= 60): raise ValueError("FPS entre 0 y 60")
+                if key == "markets_cache_ttl" and new_val < 0: raise ValueError("TTL >= 0 horas")
+                if key == "rate_limit_per_sec" and new_val < 0: raise ValueError("Peso/s >= 0 (0 = auto)")
+                if key == "rate_limit_burst" and new_val < 1: raise ValueError("Ráfaga >= 1")
+                if key == "price_feed" and new_val.lower() not in ("none", "polling", "stream"): raise ValueError("Feed: none, polling o stream")
+                if key in ["price_feed_interval", "price_feed_max_age"] and new_val <= 0: raise ValueError("Valor > 0")
+                if key == "risk_watchdog_interval" and new_val < 0: raise ValueError("Valor >= 0")
+                if key == "protective_orders_working_type" and new_val.strip().upper() not in ("", "MARK_PRICE", "CONTRACT_PRICE"): raise ValueError("Disparo: vacío, MARK_PRICE o CONTRACT_PRICE")
                 if key == "rsi_threshold":
                     parts = new_val.replace(' ','').split('/')
                     if len(parts)!=2 or not parts[0].isdigit() or not parts[1].isdigit() or float(parts[0])<=float(parts[1]):
@@ -397,7 +431,17 @@ class MainTab(QWidget):
             "inversion": "Inversión", "trade_pct": "% Comercio", "stop_loss": "Stop Loss (%)",
             "auto_profit": "Auto Profit (%)", "trailing_trigger": "Trailing Trig.(%)",
             "trailing_stop": "Trailing Dist.(%)", "rsi_threshold": "Umbrales RSI",
-            "loop_interval": "Intervalo Loop(s)",
+            "loop_interval": "Intervalo Loop(s)", "symbols": "Símbolos Extra",
+            "schedule_mode": "Modo Planif.", "candle_close_delay": "Retardo Vela(s)", "risk_check_interval": "Chequeo Riesgo(s)",
+            "parallel_fetch": "Descarga Paralela", "fetch_workers": "Hilos Descarga",
+            "worker_mode": "Modo Worker", "ohlcv_cache": "Caché Velas", "streaming_indicators": "Indicadores Incr.",
+            "metrics_file": "Archivo Métricas", "metrics_format": "Formato Métricas", "metrics_every": "Métricas cada N",
+            "ui_coalesce": "GUI por Deltas", "ui_max_fps": "GUI Máx. FPS",
+            "markets_cache": "Caché Mercados", "markets_cache_ttl": "TTL Mercados(h)",
+            "request_scheduler": "Cola Prioridad", "rate_limit_per_sec": "Peso/s (0=auto)", "rate_limit_burst": "Ráfaga Peso",
+            "price_feed": "Feed Precios", "price_feed_interval": "Feed Intervalo(s)", "price_feed_max_age": "Feed Edad Máx.(s)",
+            "risk_watchdog": "Vigilante Riesgo", "risk_watchdog_interval": "Vigilante Int.(s)",
+            "protective_orders": "SL/TP en Exchange", "protective_orders_working_type": "Disparo SL/TP",
             # --- Nuevos Labels ---
             "ema_fast": "EMA Rápida",
             "ema_slow": "EMA Lenta",
@@ -472,8 +516,8 @@ class MainTab(QWidget):
         """Actualiza gráfica EMBEBIDA: SOLO Velas y Volumen."""
 
         # --- NUEVO: Guardar los datos recibidos ---
-        if df_ohlcv is not None and not df_ohlcv.empty:
-            self.latest_df_ohlcv = df_ohlcv.copy() # Guardar una copia
+        if df_ohlcv is not None and not df_ohlcv.empty and df_ohlcv is not self.latest_df_ohlcv:
+            self.latest_df_ohlcv = df_ohlcv # Sin copia: las velas del worker son una vista de solo lectura del CandleBuffer
         # ----------------------------------------
 
         # --- Validaciones (Igual que antes) ---
@@ -494,11 +538,10 @@ class MainTab(QWidget):
              print("Error [Chart]: Índice del DataFrame no es DatetimeIndex."); return
 
         # --- Preparación DataFrame (Igual que antes) ---
-        df_plot = df_ohlcv.copy()
         required_chart_cols = {'open', 'high', 'low', 'close', 'volume'}
-        rename_map = {col.lower(): col.capitalize() for col in required_chart_cols if col.lower() in df_plot.columns}
+        rename_map = {col.lower(): col.capitalize() for col in required_chart_cols if col.lower() in df_ohlcv.columns}
         try:
-            df_plot.rename(columns=rename_map, inplace=True)
+            df_plot = df_ohlcv.rename(columns=rename_map) # Sin copia previa (copy-on-write de pandas)
             final_cols = {'Open', 'High', 'Low', 'Close'}
             if not final_cols.issubset(df_plot.columns):
                 missing = final_cols - set(df_plot.columns); print(f"Error [Chart]: Faltan columnas OHLC ({missing})."); return
@@ -557,6 +600,23 @@ class MainTab(QWidget):
             
             
 
+    # --- Deltas agrupados del worker (ui_update_signal) ---
+    def apply_ui_update(self, delta):
+        """Aplica solo lo que cambió: precio, campos de posición y velas nuevas/actualizadas."""
+        if not isinstance(delta, dict): return
+        try:
+            if delta.get('reset'): self._position_view = {}
+            if 'price' in delta: self.update_price_display(delta['price'])
+            if 'ohlcv' in delta:
+                self.latest_df_ohlcv = apply_ohlcv_delta(self.latest_df_ohlcv, delta['ohlcv'], delta.get('ohlcv_length'), delta.get('ohlcv_reset', False))
+                self.update_ohlcv_chart(self.latest_df_ohlcv)
+            if 'position' in delta:
+                self._position_view.update(delta['position'])
+                self.update_position_data(self._position_view)
+        except Exception as e:
+            print(f"ERROR [apply_ui_update]: {e}")
+            print(traceback.format_exc())
+
     # --- *** NUEVO: Manejador de Clic en el Gráfico *** ---
     def on_chart_click(self, event):
         """Se llama cuando se hace clic en el canvas del gráfico."""
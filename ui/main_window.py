@@ -39,12 +39,15 @@ except ImportError:
 
 # Añadir '' a todas las importaciones de otros sub-paquetes
 from core.worker import BotWorker
+from core.async_worker import AsyncBotWorker
+from core.request_scheduler import attach_request_scheduler, detach_request_scheduler
 from core.exchange_utils import (
     initialize_exchange, fetch_price, open_long_position, open_short_position,
-    close_position, calculate_order_size, fetch_balance, get_position_status
+    close_position, calculate_order_size, fetch_balance, get_position_status, set_leverage
 )
 from utils.config_manager import load_config as load_bot_config
 from utils.config_manager import save_config as save_bot_config_file
+from utils.config_manager import build_bot_params
 from utils.api_config_manager import load_api_config, save_api_config as save_api_config_file
 # --- FIN CORRECCIONES IMPORTACIONES ---
 
@@ -274,20 +277,7 @@ class TradingBotGUI(QWidget):
     def get_bot_config(self):
         """Obtiene y valida config del bot (Sin cambios lógicos, incluye EMAs)."""
         try:
-            cfg = self.config
-            validated_config = {
-                "symbol": str(cfg.get("symbol", "BTC/USDT")), "leverage": int(cfg.get("leverage", 10)),
-                "timeframe": str(cfg.get("timeframe", "15m")), "inversion": float(cfg.get("inversion", 0.0)),
-                "trade_pct": float(cfg.get("trade_pct", 0.0)), "stop_loss": float(cfg.get("stop_loss", 0.0)),
-                "auto_profit": float(cfg.get("auto_profit", 0.0)), "trailing_trigger": float(cfg.get("trailing_trigger", 0.0)),
-                "trailing_stop": float(cfg.get("trailing_stop", 0.0)), "rsi_threshold": str(cfg.get("rsi_threshold", "70 / 30")),
-                "loop_interval": int(cfg.get("loop_interval", 10)),
-                "ema_fast": int(cfg.get("ema_fast", 15)), "ema_slow": int(cfg.get("ema_slow", 30)),
-                "ema_filter_period": int(cfg.get("ema_filter_period", 100)), "ema_use_trend_filter": bool(cfg.get("ema_use_trend_filter", False)),
-            }
-            if validated_config["leverage"] <= 0: validated_config["leverage"] = 1
-            if validated_config["loop_interval"] < 1: validated_config["loop_interval"] = 1
-            return validated_config
+            return build_bot_params(self.config)
         except (ValueError, TypeError) as e: err_msg = f"Error convirtiendo params bot: {e}"; self.append_log(f"❌ {err_msg}"); self.critical_error_signal.emit("Error Config Bot", err_msg); return None
 
     @staticmethod
@@ -552,7 +542,7 @@ class TradingBotGUI(QWidget):
             # Si vas con modo aislado, param = {"marginType": "isolated"}
             # Si no usas margin_mode, puedes omitirlo. Depende de tu caso real.
             params = {}
-            self.exchange.set_leverage(new_leverage, symbol, params)
+            set_leverage(self.exchange, new_leverage, symbol, params)
             self.append_log(f"✅ Apalancamiento {new_leverage}x aplicado para {symbol}.")
 
         except Exception as e:
@@ -592,13 +582,16 @@ class TradingBotGUI(QWidget):
                 exchange_name=self.api_config['exchange_name'],
                 default_type=self.api_config['default_type'],
                 password=self.api_config.get('password'),
-                is_sandbox=self.api_config.get('is_sandbox', False)
+                is_sandbox=self.api_config.get('is_sandbox', False),
+                markets_cache=bot_params.get('markets_cache', True),
+                markets_cache_ttl=bot_params.get('markets_cache_ttl', 12)
             )
             if self.exchange is None: raise ValueError("initialize_exchange devolvió None.")
         except Exception as e:
             # ... (código de error de conexión) ...
              err = f"Error inicializando exchange: {e}"; self.append_log(f"❌ {err}"); traceback.print_exc(); self.critical_error_signal.emit("Error de Conexión", err); self.exchange = None; self._reset_start_stop_buttons(); return
         self.append_log(f"✅ Conexión establecida con {self.api_config['exchange_name']}.")
+        self._setup_request_scheduler(bot_params)
 
         # Configurar Apalancamiento (tu código existente aquí)
         try:
@@ -609,7 +602,7 @@ class TradingBotGUI(QWidget):
             if leverage_to_set is not None and symbol_to_set is not None and self.exchange:
                 self.append_log(f"ℹ️ Intentando configurar apalancamiento a {leverage_to_set}x para {symbol_to_set} (modo {margin_mode})...")
                 params = {"marginType": margin_mode.lower()} # Simplificado para Binance/Bybit etc. Ajustar si es necesario para Gate.io cross
-                response = self.exchange.set_leverage(leverage_to_set, symbol_to_set, params)
+                response = set_leverage(self.exchange, leverage_to_set, symbol_to_set, params)
                 self.append_log(f"✅ set_leverage para {symbol_to_set}: {margin_mode} {leverage_to_set}x enviado.")
         except ccxt.ExchangeError as e:
              err_msg = f"Error del Exchange al configurar apalancamiento para {symbol_to_set} a {leverage_to_set}x: {e}"
@@ -625,7 +618,9 @@ class TradingBotGUI(QWidget):
         # Crear Worker y Thread
         self.append_log("ℹ️ Creando worker...");
         try:
-            self.worker = BotWorker(
+            worker_class = AsyncBotWorker if bot_params.get('worker_mode') == 'async' else BotWorker
+            self.append_log(f"ℹ️ Tipo de worker: {worker_class.__name__}.")
+            self.worker = worker_class(
                 exchange=self.exchange,
                 get_active_strategies_fn=self.main_panel.get_active_strategies,
                 get_active_filters_fn=self.main_panel.get_active_filters,
@@ -656,6 +651,7 @@ class TradingBotGUI(QWidget):
                 self.worker.position_signal.connect(self.main_panel.update_position_data)
                 # --- >>> NUEVA CONEXIÓN <<< ---
                 self.worker.ohlcv_signal.connect(self.main_panel.update_ohlcv_chart) # Conectar a nuevo slot
+                self.worker.ui_update_signal.connect(self.main_panel.apply_ui_update) # Deltas con 'ui_coalesce'
                 # -----------------------------
             else:
                 raise RuntimeError("MainPanel no disponible para conectar señales.")
@@ -680,6 +676,16 @@ class TradingBotGUI(QWidget):
     # --- FIN FUNCIÓN start_bot() MODIFICADA ---
     
 
+    def _setup_request_scheduler(self, bot_params):
+        """Cola con prioridad compartida por worker y órdenes manuales (o el throttle de ccxt si está desactivada)."""
+        try:
+            if bot_params.get('request_scheduler', True):
+                scheduler = attach_request_scheduler(self.exchange, rate=bot_params.get('rate_limit_per_sec') or None, burst=bot_params.get('rate_limit_burst', 20))
+                self.append_log(f"✅ Cola de peticiones con prioridad: {scheduler.rate:.1f} peso/s (ráfaga {scheduler.burst:.0f}).")
+            else: detach_request_scheduler(self.exchange)
+        except Exception as e:
+            self.append_log(f"⚠️ No se pudo activar la cola de peticiones: {e}. Se usa el throttle de ccxt.")
+
     def _reset_start_stop_buttons(self):
          if self.main_panel:
              try: self.main_panel.start_btn.setEnabled(True); self.main_panel.stop_btn.setEnabled(False)
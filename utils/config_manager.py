@@ -20,6 +20,32 @@ DEFAULT_CONFIG = {
     "trailing_trigger": 25,
     "rsi_threshold": "85 / 25",
     "loop_interval": 2, # Intervalo del bucle del worker en segundos
+    "symbols": "", # Símbolos ADICIONALES separados por comas (el worker los opera junto a 'symbol')
+    "schedule_mode": "interval", # "interval" (cada loop_interval) o "candle" (estrategia tras cada cierre de vela)
+    "candle_close_delay": 2, # Segundos de espera tras el cierre de vela (modo "candle")
+    "risk_check_interval": 5, # Segundos entre chequeos SL/TP/TS entre velas (modo "candle")
+    "parallel_fetch": True, # Descargar precio/velas/balance/posición a la vez (un clon de exchange por hilo)
+    "fetch_workers": 4, # Tamaño máximo del pool de hilos de descarga
+    "ohlcv_cache": True, # Velas incrementales: solo se piden las nuevas (fetch_ohlcv since=...)
+    "streaming_indicators": True, # EMA/RSI incrementales: entre cierres solo la vela en curso; re-siembra vectorizada de la ventana una vez por vela cerrada (en vez de ewm completo)
+    "worker_mode": "thread", # "thread" = BotWorker (bloqueante) | "async" = AsyncBotWorker (asyncio, ccxt.async_support)
+    "metrics_file": "", # Archivo de métricas de latencia (p50/p95/p99 por etapa y llamada); vacío = no exportar
+    "metrics_format": "json", # "json" o "prometheus" (formato de texto de Prometheus)
+    "metrics_every": 20, # Exportar las métricas cada N iteraciones del worker
+    "ui_coalesce": True, # GUI: enviar solo lo que cambió (deltas) en vez del DataFrame completo en cada iteración
+    "ui_max_fps": 4, # GUI: máximo de actualizaciones por segundo (con ui_coalesce)
+    "markets_cache": True, # Mercados del exchange desde caché en disco (arranque sin load_markets)
+    "markets_cache_ttl": 12, # Horas de validez del caché de mercados (caducado: se usa y se refresca en segundo plano)
+    "request_scheduler": True, # Cola de peticiones con prioridad (órdenes > posición/precio > velas/balance) compartida GUI/worker
+    "rate_limit_per_sec": 0, # Peso por segundo del planificador (0 = derivado de rateLimit de ccxt)
+    "rate_limit_burst": 20, # Peso máximo en ráfaga del planificador
+    "price_feed": "none", # "none" (fetch_price por iteración) | "polling" (hilo REST) | "stream" (websocket ccxt.pro)
+    "price_feed_interval": 1, # Segundos entre consultas del feed "polling"
+    "price_feed_max_age": 5, # Segundos: un tick más viejo se ignora y se pide el precio por REST
+    "risk_watchdog": False, # SL/TP/TS con cada tick del feed de precios, fuera del bucle de estrategia
+    "risk_watchdog_interval": 0.1, # Segundos mínimos entre evaluaciones del vigilante por símbolo
+    "protective_orders": False, # Tras la entrada, SL/TP como órdenes reduce-only en el exchange (el TS mueve el stop)
+    "protective_orders_working_type": "", # Precio de disparo: "" (el del exchange) | "MARK_PRICE" | "CONTRACT_PRICE" (Binance)
 
     # --- NUEVAS VARIABLES PARA EMA PULLBACK ---
     "ema_fast": 5,            # Periodo EMA Rápida (Usado por la estrategia)
@@ -137,6 +163,44 @@ def save_config(config_data, log_callback=print, config_path=DEFAULT_CONFIG_PATH
         
         
 
+def build_bot_params(cfg):
+    """
+    Convierte y valida la config cargada a los parámetros que recibe el worker
+    (mismo dict para la GUI y para el daemon headless).
+    Lanza ValueError/TypeError si algún valor no se puede convertir.
+    """
+    validated_config = {
+        "symbol": str(cfg.get("symbol", "BTC/USDT")), "leverage": int(cfg.get("leverage", 10)),
+        "timeframe": str(cfg.get("timeframe", "15m")), "inversion": float(cfg.get("inversion", 0.0)),
+        "trade_pct": float(cfg.get("trade_pct", 0.0)), "stop_loss": float(cfg.get("stop_loss", 0.0)),
+        "auto_profit": float(cfg.get("auto_profit", 0.0)), "trailing_trigger": float(cfg.get("trailing_trigger", 0.0)),
+        "trailing_stop": float(cfg.get("trailing_stop", 0.0)), "rsi_threshold": str(cfg.get("rsi_threshold", "70 / 30")),
+        "loop_interval": int(cfg.get("loop_interval", 10)), "symbols": str(cfg.get("symbols", "")),
+        "schedule_mode": str(cfg.get("schedule_mode", "interval")), "candle_close_delay": float(cfg.get("candle_close_delay", 2)),
+        "risk_check_interval": float(cfg.get("risk_check_interval", 5)),
+        "parallel_fetch": bool(cfg.get("parallel_fetch", True)), "fetch_workers": int(cfg.get("fetch_workers", 4)),
+        "worker_mode": str(cfg.get("worker_mode", "thread")).strip().lower(),
+        "ohlcv_cache": bool(cfg.get("ohlcv_cache", True)), "streaming_indicators": bool(cfg.get("streaming_indicators", True)),
+        "metrics_file": str(cfg.get("metrics_file", "")), "metrics_format": str(cfg.get("metrics_format", "json")).strip().lower(),
+        "metrics_every": int(cfg.get("metrics_every", 20)),
+        "ui_coalesce": bool(cfg.get("ui_coalesce", True)), "ui_max_fps": float(cfg.get("ui_max_fps", 4)),
+        "markets_cache": bool(cfg.get("markets_cache", True)), "markets_cache_ttl": float(cfg.get("markets_cache_ttl", 12)),
+        "request_scheduler": bool(cfg.get("request_scheduler", True)), "rate_limit_per_sec": float(cfg.get("rate_limit_per_sec", 0)),
+        "rate_limit_burst": float(cfg.get("rate_limit_burst", 20)),
+        "price_feed": str(cfg.get("price_feed", "none")).strip().lower(), "price_feed_interval": float(cfg.get("price_feed_interval", 1)),
+        "price_feed_max_age": float(cfg.get("price_feed_max_age", 5)),
+        "risk_watchdog": bool(cfg.get("risk_watchdog", False)), "risk_watchdog_interval": float(cfg.get("risk_watchdog_interval", 0.1)),
+        "protective_orders": bool(cfg.get("protective_orders", False)),
+        "protective_orders_working_type": str(cfg.get("protective_orders_working_type", "") or "").strip().upper(),
+        "ema_fast": int(cfg.get("ema_fast", 15)), "ema_slow": int(cfg.get("ema_slow", 30)),
+        "ema_filter_period": int(cfg.get("ema_filter_period", 100)), "ema_use_trend_filter": bool(cfg.get("ema_use_trend_filter", False)),
+    }
+    if validated_config["leverage"] <= 0: validated_config["leverage"] = 1
+    if validated_config["loop_interval"] < 1: validated_config["loop_interval"] = 1
+    if validated_config["metrics_every"] < 1: validated_config["metrics_every"] = 1
+    return validated_config
+
+
 CUSTOM_STRATEGY_PATH = os.path.expanduser("~/Documents/BOT_TRADING/custom_strategy.py")
 
 def save_custom_strategy(code_str, log_callback=print):